@@ -34,7 +34,7 @@ if __name__ == "__main__":
     parser.add_argument("--video-root", required=True, help="Path to your video directory.")
     args = parser.parse_args()
     os.environ['VIDEO_ROOT_PATH'] = args.video_root
-    app = create_app()
+    app = create_app(start_background=False)
     with app.app_context():
         initialize_database()
 
@@ -47,7 +47,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
     
     os.environ['VIDEO_ROOT_PATH'] = args.video_root
-    app = create_app()
+    app = create_app(start_background=False)
     
     with app.app_context():
         if initialize_database():
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Database migration to add the ExerciseVideoMatch table
+Run this script to add the exercise_video_matches table (materialized
+exercise-to-video matches) to an existing database
+"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.main import create_app
+from src.models import db, ExerciseVideoMatch
+from src.services.exercise_video_matches import materialize_matches
+
+def migrate():
+    """Add ExerciseVideoMatch table to database and fill it"""
+    app = create_app(start_background=False)
+    
+    with app.app_context():
+        # Create the exercise_video_matches table
+        db.create_all()
+        print("✓ Database migration complete - exercise_video_matches table created")
+        
+        result = materialize_matches(force=True)
+        print(f"✓ Materialized video matches: {result}")
+        print(f"✓ {ExerciseVideoMatch.query.count()} exercise video match rows")
+
+if __name__ == '__main__':
+    migrate()
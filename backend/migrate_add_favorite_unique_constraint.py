@@ -14,7 +14,7 @@ from src.models import db
 
 def migrate_database():
     """Add unique constraint to video_favorites table."""
-    app = create_app()
+    app = create_app(start_background=False)
     
     with app.app_context():
         # Get database path
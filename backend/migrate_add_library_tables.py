@@ -3,7 +3,7 @@
 from src.main import create_app
 from src.models import db
 
-app = create_app()
+app = create_app(start_background=False)
 
 with app.app_context():
     # Create new tables
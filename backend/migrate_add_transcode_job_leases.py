@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Migration script to turn transcode_jobs into a shared job queue
+Adds: worker_id, heartbeat_at, lease_expires_at, attempts
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.main import create_app
+
+def migrate_database():
+    """Add lease columns to TranscodeJob table if they don't exist."""
+    app = create_app(start_background=False)
+    
+    with app.app_context():
+        # Get database path
+        database_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        
+        print(f"📊 Checking database: {database_path}")
+        
+        # Connect directly to SQLite to check columns
+        conn = sqlite3.connect(database_path)
+        cursor = conn.cursor()
+        
+        # Get table info
+        cursor.execute("PRAGMA table_info(transcode_jobs)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        print(f"Current columns: {columns}")
+        
+        new_columns = [
+            ('worker_id', 'VARCHAR(200)', None),
+            ('heartbeat_at', 'DATETIME', None),
+            ('lease_expires_at', 'DATETIME', None),
+            ('attempts', 'INTEGER', '0'),
+        ]
+        
+        for column_name, column_type, default_value in new_columns:
+            if column_name not in columns:
+                print(f"➕ Adding {column_name} column...")
+                if default_value is None:
+                    cursor.execute(f"ALTER TABLE transcode_jobs ADD COLUMN {column_name} {column_type}")
+                else:
+                    cursor.execute(f"ALTER TABLE transcode_jobs ADD COLUMN {column_name} {column_type} DEFAULT {default_value}")
+                conn.commit()
+                print(f"✅ Added {column_name} column")
+            else:
+                print(f"✓ {column_name} column already exists")
+        
+        conn.close()
+        print("🎉 Migration complete!")
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Migration script to add priority lanes to the transcode job queue
+Adds: priority column and a (status, priority, created_at) claim index
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.main import create_app
+
+def migrate_database():
+    """Add priority column to TranscodeJob table if it doesn't exist."""
+    app = create_app(start_background=False)
+    
+    with app.app_context():
+        # Get database path
+        database_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        
+        print(f"📊 Checking database: {database_path}")
+        
+        # Connect directly to SQLite to check columns
+        conn = sqlite3.connect(database_path)
+        cursor = conn.cursor()
+        
+        # Get table info
+        cursor.execute("PRAGMA table_info(transcode_jobs)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if 'priority' not in columns:
+            print("➕ Adding priority column...")
+            cursor.execute("ALTER TABLE transcode_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 1")
+            conn.commit()
+            print("✅ Added priority column")
+        else:
+            print("✓ priority column already exists")
+        
+        # The claim index supersedes the (status, created_at) index
+        cursor.execute("DROP INDEX IF EXISTS ix_transcode_jobs_status_created")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ix_transcode_jobs_claim
+            ON transcode_jobs(status, priority, created_at)
+        """)
+        conn.commit()
+        print("✓ Claim index present")
+        
+        conn.close()
+        print("🎉 Migration complete!")
+
+if __name__ == "__main__":
+    migrate_database()
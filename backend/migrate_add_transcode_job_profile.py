@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Migration script to add encode profiles to TranscodeJob table
+Adds: profile
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.main import create_app
+
+def migrate_database():
+    """Add profile column to TranscodeJob table if it doesn't exist."""
+    app = create_app(start_background=False)
+    
+    with app.app_context():
+        # Get database path
+        database_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        
+        print(f"📊 Checking database: {database_path}")
+        
+        # Connect directly to SQLite to check columns
+        conn = sqlite3.connect(database_path)
+        cursor = conn.cursor()
+        
+        # Get table info
+        cursor.execute("PRAGMA table_info(transcode_jobs)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if 'profile' not in columns:
+            print("➕ Adding profile column...")
+            cursor.execute("ALTER TABLE transcode_jobs ADD COLUMN profile VARCHAR(20) DEFAULT 'source'")
+            conn.commit()
+            print("✅ Added profile column")
+        else:
+            print("✓ profile column already exists")
+        
+        conn.close()
+        print("🎉 Migration complete!")
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Migration script to add retry backoff to TranscodeJob table
+Adds: next_attempt_at
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.main import create_app
+
+def migrate_database():
+    """Add next_attempt_at column to TranscodeJob table if it doesn't exist."""
+    app = create_app(start_background=False)
+    
+    with app.app_context():
+        # Get database path
+        database_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        
+        print(f"📊 Checking database: {database_path}")
+        
+        # Connect directly to SQLite to check columns
+        conn = sqlite3.connect(database_path)
+        cursor = conn.cursor()
+        
+        # Get table info
+        cursor.execute("PRAGMA table_info(transcode_jobs)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if 'next_attempt_at' not in columns:
+            print("➕ Adding next_attempt_at column...")
+            cursor.execute("ALTER TABLE transcode_jobs ADD COLUMN next_attempt_at DATETIME")
+            conn.commit()
+            print("✅ Added next_attempt_at column")
+        else:
+            print("✓ next_attempt_at column already exists")
+        
+        conn.close()
+        print("🎉 Migration complete!")
+
+if __name__ == "__main__":
+    migrate_database()
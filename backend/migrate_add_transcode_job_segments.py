@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Migration script to add HLS segment jobs to TranscodeJob table
+Adds: segment_index
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.main import create_app
+
+def migrate_database():
+    """Add segment_index column to TranscodeJob table if it doesn't exist."""
+    app = create_app(start_background=False)
+    
+    with app.app_context():
+        # Get database path
+        database_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        
+        print(f"📊 Checking database: {database_path}")
+        
+        # Connect directly to SQLite to check columns
+        conn = sqlite3.connect(database_path)
+        cursor = conn.cursor()
+        
+        # Get table info
+        cursor.execute("PRAGMA table_info(transcode_jobs)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if 'segment_index' not in columns:
+            print("➕ Adding segment_index column...")
+            cursor.execute("ALTER TABLE transcode_jobs ADD COLUMN segment_index INTEGER")
+            conn.commit()
+            print("✅ Added segment_index column")
+        else:
+            print("✓ segment_index column already exists")
+        
+        conn.close()
+        print("🎉 Migration complete!")
+
+if __name__ == "__main__":
+    migrate_database()
@@ -14,7 +14,7 @@ from src.models import db, TranscodeJob
 
 def migrate():
     """Add TranscodeJob table to database"""
-    app = create_app()
+    app = create_app(start_background=False)
     
     with app.app_context():
         # Create the transcode_jobs table
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Migration script to add probed metadata columns to Video table
+Adds: duration_seconds, resolution, codec, file_size
+"""
+
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.main import create_app
+
+def migrate_database():
+    """Add metadata columns to Video table if they don't exist."""
+    app = create_app(start_background=False)
+    
+    with app.app_context():
+        # Get database path
+        database_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        
+        print(f"📊 Checking database: {database_path}")
+        
+        # Connect directly to SQLite to check columns
+        conn = sqlite3.connect(database_path)
+        cursor = conn.cursor()
+        
+        # Get table info
+        cursor.execute("PRAGMA table_info(videos)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        print(f"Current columns: {columns}")
+        
+        new_columns = [
+            ('duration_seconds', 'INTEGER'),
+            ('resolution', 'VARCHAR(20)'),
+            ('codec', 'VARCHAR(20)'),
+            ('file_size', 'BIGINT'),
+        ]
+        
+        for column_name, column_type in new_columns:
+            if column_name not in columns:
+                print(f"➕ Adding {column_name} column...")
+                cursor.execute(f"ALTER TABLE videos ADD COLUMN {column_name} {column_type}")
+                conn.commit()
+                print(f"✅ Added {column_name} column")
+            else:
+                print(f"✓ {column_name} column already exists")
+        
+        conn.close()
+        print("🎉 Migration complete!")
+
+if __name__ == "__main__":
+    migrate_database()
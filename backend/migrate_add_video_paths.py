@@ -13,7 +13,7 @@ from src.main import create_app
 
 def migrate_database():
     """Add video_path columns to Exercise table if they don't exist."""
-    app = create_app()
+    app = create_app(start_background=False)
     
     with app.app_context():
         # Get database path
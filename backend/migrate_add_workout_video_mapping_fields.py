@@ -15,7 +15,7 @@ from src.models import db
 
 def migrate_database():
     """Add metadata fields to WorkoutVideoMapping table if they don't exist."""
-    app = create_app()
+    app = create_app(start_background=False)
     
     with app.app_context():
         # Get database path
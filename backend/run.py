@@ -21,7 +21,8 @@ if not os.environ.get('VIDEO_ROOT_PATH'):
     print("⚠️  WARNING: VIDEO_ROOT_PATH not set. Please set it in .env file or environment variables.")
     print("   Example: VIDEO_ROOT_PATH=/path/to/your/videos")
 
-app = create_app()
+# --init-db drops and recreates every table, so no background workers for it
+app = create_app(start_background='--init-db' not in sys.argv)
 
 def initialize_database():
     with app.app_context():
@@ -21,6 +21,38 @@ echo ""
 echo "Running migration: migrate_add_favorite_unique_constraint.py"
 $PYTHON_CMD migrate_add_favorite_unique_constraint.py
 
+echo ""
+echo "Running migration: migrate_add_video_metadata.py"
+$PYTHON_CMD migrate_add_video_metadata.py
+
+echo ""
+echo "Running migration: migrate_add_transcode_job_leases.py"
+$PYTHON_CMD migrate_add_transcode_job_leases.py
+
+echo ""
+echo "Running migration: migrate_add_transcode_job_priority.py"
+$PYTHON_CMD migrate_add_transcode_job_priority.py
+
+echo ""
+echo "Running migration: migrate_add_transcode_job_progress.py"
+$PYTHON_CMD migrate_add_transcode_job_progress.py
+
+echo ""
+echo "Running migration: migrate_add_transcode_job_segments.py"
+$PYTHON_CMD migrate_add_transcode_job_segments.py
+
+echo ""
+echo "Running migration: migrate_add_transcode_job_retry.py"
+$PYTHON_CMD migrate_add_transcode_job_retry.py
+
+echo ""
+echo "Running migration: migrate_add_transcode_job_profile.py"
+$PYTHON_CMD migrate_add_transcode_job_profile.py
+
+echo ""
+echo "Running migration: migrate_add_exercise_video_matches.py"
+$PYTHON_CMD migrate_add_exercise_video_matches.py
+
 echo ""
 echo "✅ All migrations complete!"
 
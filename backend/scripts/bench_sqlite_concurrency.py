@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the SQLite connection tuning.
+Runs the same mixed workload twice against a fresh database file, once with
+SQLite's defaults (rollback journal) and once with the pragmas create_app
+applies (src/utils/sqlite_tuning.py):
+  - writer threads: daily check-ins (look up today's row, insert or update it)
+    and transcode-worker style progress commits
+  - reader threads: per-user history aggregates and queue listings
+and reports throughput, latency and "database is locked" failures for each
+(two check-ins racing to insert the same day count as conflicts, not locks).
+
+Usage: python scripts/bench_sqlite_concurrency.py [--writers 4] [--readers 8] [--seconds 10]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from src.utils.sqlite_tuning import configure_sqlite_engine, sqlite_settings
+
+USERS = 50
+JOBS = 20
+
+SCHEMA = [
+    """CREATE TABLE daily_metrics (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, day TEXT NOT NULL,
+        energy INTEGER, mood INTEGER, notes TEXT, UNIQUE (user_id, day))""",
+    "CREATE TABLE transcode_jobs (id INTEGER PRIMARY KEY, status TEXT, progress INTEGER, heartbeat_at REAL)",
+]
+
+
+def setup(path):
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        start = date.today() - timedelta(days=365)
+        conn.execute(text("INSERT INTO daily_metrics (user_id, day, energy, mood, notes) VALUES (:u, :d, 3, 3, 'seed')"),
+                     [{'u': user, 'd': (start + timedelta(days=day)).isoformat()}
+                      for user in range(USERS) for day in range(365)])
+        conn.execute(text("INSERT INTO transcode_jobs (id, status, progress, heartbeat_at) VALUES (:i, 'processing', 0, 0)"),
+                     [{'i': job} for job in range(JOBS)])
+    engine.dispose()
+
+
+def check_in(conn, rng):
+    """Look up today's metrics row, then insert or update it (read then write, like the route)"""
+    params = {'u': rng.randrange(USERS), 'd': (date.today() + timedelta(days=rng.randrange(30))).isoformat(),
+              'e': rng.randint(1, 5)}
+    row = conn.execute(text("SELECT id FROM daily_metrics WHERE user_id = :u AND day = :d"), params).first()
+    if row:
+        conn.execute(text("UPDATE daily_metrics SET energy = :e WHERE id = :id"), dict(params, id=row[0]))
+    else:
+        conn.execute(text("INSERT INTO daily_metrics (user_id, day, energy, mood) VALUES (:u, :d, :e, 3)"), params)
+
+
+def job_progress(conn, rng):
+    conn.execute(text("UPDATE transcode_jobs SET progress = :p, heartbeat_at = :t WHERE id = :i"),
+                 {'p': rng.randrange(100), 't': time.time(), 'i': rng.randrange(JOBS)})
+
+
+def history(conn, rng):
+    conn.execute(text("SELECT COUNT(*), AVG(energy), MAX(day) FROM daily_metrics WHERE user_id = :u"),
+                 {'u': rng.randrange(USERS)}).all()
+
+
+def queue(conn, rng):
+    conn.execute(text("SELECT id, progress FROM transcode_jobs WHERE status = 'processing' "
+                      "ORDER BY heartbeat_at LIMIT 10")).all()
+
+
+def run(label, path, tuned, writers, readers, seconds):
+    setup(path)
+    engine = create_engine(f'sqlite:///{path}', pool_size=writers + readers, max_overflow=0)
+    if tuned:
+        configure_sqlite_engine(engine)
+    settings = sqlite_settings(engine)
+
+    results = {'write': [], 'read': []}
+    failures = {'write': 0, 'read': 0}
+    conflicts = {'write': 0, 'read': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(kind, operations, seed):
+        rng = random.Random(seed)
+        latencies, failed, conflicted = [], 0, 0
+        while time.perf_counter() < deadline:
+            operation = rng.choice(operations)
+            start = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    operation(conn, rng)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except IntegrityError:
+                conflicted += 1
+            except OperationalError:
+                failed += 1
+        with lock:
+            results[kind].extend(latencies)
+            failures[kind] += failed
+            conflicts[kind] += conflicted
+
+    threads = [threading.Thread(target=worker, args=('write', [check_in, job_progress], i)) for i in range(writers)]
+    threads += [threading.Thread(target=worker, args=('read', [history, queue], 100 + i)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    print(f"\n{label}: journal_mode={settings['journal_mode']} synchronous={settings['synchronous']} "
+          f"busy_timeout={settings['busy_timeout']}")
+    print(f"{'':<7} {'ops/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'locked':>7} {'conflicts':>9}")
+    for kind in ('write', 'read'):
+        samples = sorted(results[kind])
+        if not samples:
+            print(f"{kind:<7} {0:>8} {'-':>9} {'-':>9} {'-':>9} {failures[kind]:>7} {conflicts[kind]:>9}")
+            continue
+        pick = lambda q: samples[max(round(len(samples) * q) - 1, 0)]
+        print(f"{kind:<7} {len(samples) / seconds:>8.0f} {statistics.median(samples):>7.2f}ms "
+              f"{pick(0.95):>7.2f}ms {pick(0.99):>7.2f}ms {failures[kind]:>7} {conflicts[kind]:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SQLite under concurrent reads and writes')
+    parser.add_argument('--writers', type=int, default=4, help='Writer threads')
+    parser.add_argument('--readers', type=int, default=8, help='Reader threads')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run('default pragmas', os.path.join(tmp, 'default.db'), False, args.writers, args.readers, args.seconds)
+        run('tuned pragmas', os.path.join(tmp, 'tuned.db'), True, args.writers, args.readers, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
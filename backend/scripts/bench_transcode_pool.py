@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Transcode worker pool benchmark.
+Generates a synthetic batch of MPEG-4 clips with ffmpeg's test sources, then
+drains it through the transcode pool with 1, 2 and 4 workers, sampling queue
+depth once per second and reporting throughput in jobs/hour.
+
+Usage: python scripts/bench_transcode_pool.py [--jobs 8] [--clip-seconds 20] [--workers 1,2,4]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+
+from src.models import db
+from src.utils import transcode_manager
+from src.utils.transcode_manager import create_or_get_job, enqueue_job, get_queue_stats, start_worker, stop_worker
+
+
+def make_clips(directory, count, seconds):
+    """Render count synthetic 720p MPEG-4/MP3 clips that need a full H.264 encode"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'synthetic_{i:02d}.avi')
+        subprocess.run([
+            'ffmpeg', '-v', 'error',
+            '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+            '-f', 'lavfi', '-i', f'sine=frequency={220 + i * 20}:duration={seconds}',
+            '-c:v', 'mpeg4', '-q:v', '4', '-c:a', 'libmp3lame',
+            '-y', path
+        ], check=True)
+        paths.append(path)
+    return paths
+
+
+def run_batch(clips, workers, work_dir):
+    """Drain the batch through a pool of the given size and return elapsed seconds"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(work_dir, f'bench_{workers}.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        for clip in clips:
+            output_path = os.path.join(work_dir, f'{workers}w_{os.path.basename(clip)}.mp4')
+            job, should_enqueue = create_or_get_job(clip, output_path)
+            if should_enqueue:
+                enqueue_job(job.id)
+
+    started = time.perf_counter()
+    start_worker(app, num_workers=workers)
+    print(f"\n{workers} worker(s), {transcode_manager.ffmpeg_threads_per_job(workers)} ffmpeg threads each")
+    while True:
+        stats = get_queue_stats()
+        done = stats['completed'] + stats['failed']
+        print(f"  t={time.perf_counter() - started:6.1f}s  queue={stats['queue_depth']:3d}  "
+              f"active={stats['active_jobs']}  done={done}/{len(clips)}")
+        if done >= len(clips):
+            break
+        time.sleep(1.0)
+    elapsed = time.perf_counter() - started
+    stop_worker()
+    if stats['failed']:
+        print(f"  ⚠️  {stats['failed']} job(s) failed")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark transcode throughput by worker count')
+    parser.add_argument('--jobs', type=int, default=8, help='Clips in the synthetic batch')
+    parser.add_argument('--clip-seconds', type=int, default=20, help='Length of each clip')
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts to test')
+    args = parser.parse_args()
+
+    if not shutil.which('ffmpeg'):
+        print("❌ ffmpeg not found on PATH")
+        sys.exit(1)
+
+    work_dir = tempfile.mkdtemp(prefix='transcode_bench_')
+    try:
+        print(f"Rendering {args.jobs} synthetic {args.clip_seconds}s clips...")
+        clips = make_clips(work_dir, args.jobs, args.clip_seconds)
+
+        results = []
+        for workers in [int(w) for w in args.workers.split(',')]:
+            elapsed = run_batch(clips, workers, work_dir)
+            results.append((workers, elapsed))
+
+        print(f"\n{'workers':>8} {'seconds':>10} {'jobs/hour':>10}")
+        for workers, elapsed in results:
+            print(f"{workers:>8} {elapsed:>10.1f} {args.jobs * 3600 / elapsed:>10.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for exercise-to-video matching.
+Enhances a 15-exercise AI trainer workout with the legacy matcher (three
+SequenceMatcher ratios per video per exercise, strings lowercased on every
+comparison) and with VideoMatcher's bounded best-first rescoring, one
+find_matching_videos call per exercise and one match_many batch, over the
+real index and synthetic libraries grown from it. Both must return the same
+matches; any difference is reported.
+
+Usage: python scripts/bench_video_matcher.py [--sizes 10000] [--repeat 5]
+"""
+import os
+import sys
+import copy
+import time
+import argparse
+import statistics
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.video_index import VideoSearchIndex, load_video_index, VIDEO_INDEX_PATH
+from src.services.video_matcher import VideoMatcher
+from bench_video_search import synthesize
+
+WORKOUT = {
+    'warmup': [
+        {'name': '8 Brocades Sequence', 'category_hint': 'Breath Work, Tai Chi & Qi Gong'},
+        {'name': 'Jumping Jacks'},
+        {'name': 'Arm Circles'},
+    ],
+    'main': [
+        {'name': 'Pushups'},
+        {'name': 'Jab Cross Combination', 'category_hint': 'Boxing Training'},
+        {'name': 'Slip and Counter', 'category_hint': 'Boxing Training'},
+        {'name': 'Squats'},
+        {'name': 'Plank'},
+        {'name': 'Burpees', 'category_hint': 'Cardio'},
+        {'name': 'Pull Ups'},
+        {'name': 'Bridge Progression', 'category_hint': 'Strength Training'},
+        {'name': 'Front Kick'},
+    ],
+    'cooldown': [
+        {'name': 'Sun Salutation', 'category_hint': 'Yoga'},
+        {'name': 'Standing Meditation'},
+        {'name': 'Deep Breathing', 'category_hint': 'Breath Work, Tai Chi & Qi Gong'},
+    ],
+}
+
+
+def legacy_find(videos, exercise_name, category_hint=None, max_results=3):
+    """The pre-rescoring matcher: every ratio for every candidate"""
+    def similarity(a, b):
+        return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+    if category_hint:
+        videos = [video for video in videos if video.get('category') == category_hint]
+    keywords = exercise_name.lower().split()
+    matches = []
+    for video in videos:
+        best = max(similarity(exercise_name, video.get('filename') or ''),
+                   similarity(exercise_name, video.get('searchable') or ''),
+                   similarity(exercise_name, video.get('subcategory') or ''))
+        text = (video.get('filename', '') + ' ' + video.get('searchable', '')).lower()
+        score = min(best + sum(1 for kw in keywords if kw in text) * 0.1, 1.0)
+        if score > 0.3:
+            matches.append((score, video))
+    matches.sort(key=lambda match: match[0], reverse=True)
+    return [(video['id'], round(score, 2)) for score, video in matches[:max_results]]
+
+
+def workout_exercises():
+    return [exercise for section in ('warmup', 'main', 'cooldown') for exercise in WORKOUT[section]]
+
+
+def time_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench(label, videos, repeat):
+    matcher = VideoMatcher.__new__(VideoMatcher)
+    matcher.video_index_path = None
+    matcher._own_index = VideoSearchIndex(videos)
+    matcher._features = None
+    matcher.match_cache = None  # in-memory indexes aren't cached anyway; time the matcher itself
+
+    start = time.perf_counter()
+    matcher.match_features(matcher.index).columns()
+    prepare_ms = (time.perf_counter() - start) * 1000
+
+    exercises = workout_exercises()
+    mismatches = 0
+    for exercise in exercises:
+        expected = legacy_find(videos, exercise['name'], exercise.get('category_hint'))
+        actual = [(match['id'], match['match_score'])
+                  for match in matcher.find_matching_videos(exercise['name'], exercise.get('category_hint'))]
+        if actual != expected:
+            mismatches += 1
+            print(f"  ❌ {exercise['name']}: legacy {expected} != matcher {actual}")
+
+    legacy_ms = time_ms(lambda: [legacy_find(videos, e['name'], e.get('category_hint')) for e in exercises],
+                        max(repeat // 2, 1))
+    loop_ms = time_ms(lambda: [matcher.find_matching_videos(e['name'], e.get('category_hint')) for e in exercises],
+                      repeat)
+    batch_ms = time_ms(lambda: matcher.enhance_workout_with_videos(copy.deepcopy(WORKOUT)), repeat)
+    print(f"{label:<16} {len(videos):>7} {prepare_ms:>9.0f}ms {legacy_ms:>10.0f}ms {loop_ms:>10.1f}ms "
+          f"{batch_ms:>10.1f}ms {legacy_ms / batch_ms:>7.0f}x  {'identical' if not mismatches else f'{mismatches} differ'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark exercise-to-video matching')
+    parser.add_argument('--index', default=VIDEO_INDEX_PATH, help='video_index.json to grow the library from')
+    parser.add_argument('--sizes', default='10000', help='Synthetic library sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per workout')
+    args = parser.parse_args()
+
+    videos = load_video_index(args.index).get('videos', [])
+    if not videos:
+        print(f"❌ No videos in {args.index}")
+        sys.exit(1)
+
+    print(f"15-exercise workout, median of {args.repeat} runs")
+    print(f"{'library':<16} {'videos':>7} {'prepare':>11} {'legacy':>12} {'per-exercise':>12} "
+          f"{'match_many':>12} {'speedup':>8}")
+    bench('real index', videos, args.repeat)
+    for size in [int(size) for size in args.sizes.split(',') if size]:
+        bench(f'synthetic {size}', synthesize(videos, size), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
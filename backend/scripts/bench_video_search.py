@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for video library search.
+Compares the legacy per-request scan (parse video_index.json, then
+`query in searchable` over every entry) with the shared inverted index, over
+the real index and synthetic libraries grown from it to 1k, 10k and 100k entries.
+
+Usage: python scripts/bench_video_search.py [--sizes 1000,10000,100000] [--repeat 20]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services.video_index import VideoSearchIndex, load_video_index, VIDEO_INDEX_PATH
+
+QUERIES = ['boxing', 'tai chi', 'dodge punch', 'brocades', 'yoga flow', 'pun', 'slip a punch', 'xyzzy']
+SERIES_WORDS = ['Beginner', 'Advanced', 'Session', 'Drill', 'Workout', 'Routine', 'Class', 'Follow Along']
+
+
+def synthesize(videos, size, seed=42):
+    """Grow the real entries into a library of `size`, varying names and folders"""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(size):
+        base = videos[i % len(videos)]
+        stem, ext = os.path.splitext(base['filename'])
+        filename = f"{stem} {rng.choice(SERIES_WORDS)} {i}{ext}"
+        folder = os.path.dirname(base['path'])
+        path = f"{folder}/Series {i // 50}/{filename}" if folder else filename
+        entries.append({
+            'id': f'{i:012x}',
+            'filename': filename,
+            'path': path,
+            'category': base['category'],
+            'subcategory': f'Series {i // 50}',
+            'searchable': f"{filename.lower()} {path.lower()} {(base['category'] or '').lower()}"
+        })
+    return entries
+
+
+def legacy_search(index_path, query):
+    """The pre-index request path: parse the JSON and substring-scan every entry"""
+    with open(index_path, 'r') as f:
+        videos = json.load(f).get('videos', [])
+    return [video for video in videos if query in video.get('searchable', '').lower()][:100]
+
+
+def time_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(round(len(samples) * 0.95) - 1, 0)]
+
+
+def bench(label, videos, index_path, repeat):
+    start = time.perf_counter()
+    index = VideoSearchIndex(videos)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"\n{label}: {len(videos)} videos, {len(index.vocabulary)} tokens, index built in {build_ms:.0f} ms")
+    print(f"{'query':<14} {'hits':>7} {'legacy p50':>11} {'legacy p95':>11} {'index p50':>10} {'index p95':>10}")
+    for query in QUERIES:
+        total, _ = index.search(query, limit=100)
+        legacy_p50, legacy_p95 = time_ms(lambda: legacy_search(index_path, query), max(repeat // 4, 3))
+        index_p50, index_p95 = time_ms(lambda: index.search(query, limit=100), repeat)
+        print(f"{query:<14} {total:>7} {legacy_p50:>9.2f}ms {legacy_p95:>9.2f}ms "
+              f"{index_p50:>8.3f}ms {index_p95:>8.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark video library search')
+    parser.add_argument('--index', default=VIDEO_INDEX_PATH, help='video_index.json to grow the library from')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Synthetic library sizes')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+    args = parser.parse_args()
+
+    videos = load_video_index(args.index).get('videos', [])
+    if not videos:
+        print(f"❌ No videos in {args.index}")
+        sys.exit(1)
+
+    bench('real index', videos, args.index, args.repeat)
+
+    for size in [int(size) for size in args.sizes.split(',') if size]:
+        synthetic = synthesize(videos, size)
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'videos': synthetic}, f)
+            path = f.name
+        try:
+            bench(f'synthetic {size}', synthetic, path, args.repeat)
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,29 @@
 #!/usr/bin/env python3
 """
-Parse video_library.txt and create a searchable JSON index.
-Outputs to backend/data/video_index.json
+Build the searchable video index (backend/src/data/video_index.json plus the
+compact video_index.db the server loads first).
+
+With VIDEO_ROOT_PATH (or --root) the library is scanned incrementally:
+directories whose mtime hasn't changed since the last run are not relisted
+and the index is only rewritten when files were added, removed or renamed.
+--from-list parses the static video_library.txt at the repo root instead.
+
+Usage: python scripts/index_videos.py [--root PATH] [--full] [--force] [--sync-db] [--from-list]
 """
 import os
-import json
-import hashlib
+import sys
+import argparse
 from pathlib import Path
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+
+from src.services.video_index import (
+    VIDEO_INDEX_PATH, VIDEO_INDEX_DB_PATH, category_for_path, video_entry, video_key, write_video_index
+)
+from src.services.library_indexer import LibraryScanRefused, update_library_index
+
 def parse_video_library(video_library_path):
     """Parse video_library.txt and return structured data."""
     videos = []
@@ -35,44 +51,11 @@ def parse_video_library(video_library_path):
             if not path:
                 continue
             
-            # Extract filename
-            filename = os.path.basename(path)
-            
-            # Parse category and subcategory from path
-            parts = path.split('/')
-            category = None
-            subcategory = None
-            
-            # Remove leading ! from category names
-            if len(parts) > 0:
-                category = parts[0].lstrip('!')
-                categories_set.add(category)
+            # Subcategory and searchable text are derived by video_entry
+            category = category_for_path(path)
+            categories_set.add(category)
             
-            if len(parts) > 1:
-                subcategory = parts[1].lstrip('!')
-            
-            # Create searchable text
-            searchable_parts = [filename.lower(), path.lower()]
-            if category:
-                searchable_parts.append(category.lower())
-            if subcategory:
-                searchable_parts.append(subcategory.lower())
-            
-            searchable = ' '.join(searchable_parts)
-            
-            # Create unique ID from path hash
-            path_hash = hashlib.md5(path.encode()).hexdigest()[:12]
-            
-            video_entry = {
-                'id': path_hash,
-                'filename': filename,
-                'path': path,
-                'category': category,
-                'subcategory': subcategory,
-                'searchable': searchable
-            }
-            
-            videos.append(video_entry)
+            videos.append(video_entry(video_key(path), path, category))
     
     # Sort categories
     categories = sorted(list(categories_set))
@@ -82,36 +65,79 @@ def parse_video_library(video_library_path):
         'categories': categories
     }
 
-def main():
-    """Main function to generate video index."""
-    # Get paths
-    script_dir = Path(__file__).parent
-    repo_root = script_dir.parent.parent
-    data_dir = repo_root / 'backend' / 'src' / 'data'
-    output_file = data_dir / 'video_index.json'
-    
-    # Ensure data directory exists
-    data_dir.mkdir(parents=True, exist_ok=True)
-    
+def index_from_list():
+    """Rebuild the whole index from video_library.txt"""
     print(f"Parsing video_library.txt...")
     index_data = parse_video_library(None)  # Path is determined inside function
     
     print(f"Found {len(index_data['videos'])} videos")
     print(f"Found {len(index_data['categories'])} categories")
     
-    # Write to JSON file
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, indent=2, ensure_ascii=False)
+    # Written through temp files renamed into place, so running servers
+    # reloading the index never read a half-written file
+    write_video_index(index_data)
+    return index_data['categories']
+
+def index_from_root(root, full=False, sync_db=False, force=False):
+    """Incrementally rescan the library and update the index (and Video table)"""
+    print(f"Scanning {root}{' (full relist)' if full else ''}...")
+    if sync_db:
+        from src.main import create_app
+        with create_app(start_background=False).app_context():
+            result = update_library_index(root, full=full, force=force, sync_db=True)
+    else:
+        result = update_library_index(root, full=full, force=force)
+    stats = result['stats']
+    print(f"Found {stats['videos']} videos in {stats['elapsed_ms']:.0f} ms "
+          f"({stats['dirs_listed']} directories listed, {stats['dirs_reused']} unchanged)")
+    print(f"Added {stats['added']}, removed {stats['removed']}, renamed {stats['renamed']}")
+    if not stats['index_written']:
+        print("Index is up to date")
+    
+    if sync_db:
+        print(f"Video table: inserted {stats['inserted']}, updated {stats['updated']}, "
+              f"deleted {stats['deleted']}, missing {stats['missing']}")
+    
+    return sorted({category_for_path(path) for path in result['files']})
+
+def main():
+    """Main function to generate video index."""
+    load_dotenv()
+    
+    parser = argparse.ArgumentParser(description='Build the searchable video index')
+    parser.add_argument('--root', default=os.environ.get('VIDEO_ROOT_PATH'), help='Video library root')
+    parser.add_argument('--full', action='store_true', help='Relist every directory, ignoring the saved scan state')
+    parser.add_argument('--force', action='store_true',
+                        help='Apply the scan even if it removes all or most indexed videos')
+    parser.add_argument('--sync-db', action='store_true', help='Also add, repoint and drop Video rows')
+    parser.add_argument('--from-list', action='store_true', help='Parse video_library.txt instead of scanning')
+    args = parser.parse_args()
     
-    print(f"Video index written to: {output_file}")
+    # Ensure data directory exists
+    Path(VIDEO_INDEX_PATH).parent.mkdir(parents=True, exist_ok=True)
+    
+    if args.from_list:
+        categories = index_from_list()
+    elif args.root and os.path.isdir(args.root):
+        try:
+            categories = index_from_root(args.root, args.full, args.sync_db, args.force)
+        except LibraryScanRefused as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    else:
+        print("❌ VIDEO_ROOT_PATH is not configured or does not exist (use --root, or --from-list for video_library.txt).")
+        sys.exit(1)
+    
+    if os.path.exists(VIDEO_INDEX_DB_PATH):
+        print(f"Video index: {VIDEO_INDEX_PATH} and {VIDEO_INDEX_DB_PATH} "
+              f"({os.path.getsize(VIDEO_INDEX_DB_PATH) // 1024} KB vs {os.path.getsize(VIDEO_INDEX_PATH) // 1024} KB JSON)")
     
     # Print sample categories
     print("\nSample categories:")
-    for cat in index_data['categories'][:10]:
+    for cat in categories[:10]:
         print(f"  - {cat}")
-    if len(index_data['categories']) > 10:
-        print(f"  ... and {len(index_data['categories']) - 10} more")
+    if len(categories) > 10:
+        print(f"  ... and {len(categories) - 10} more")
 
 if __name__ == '__main__':
     main()
-
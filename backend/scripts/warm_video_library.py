@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Bulk probe / warm-up for the video library.
+Walks VIDEO_ROOT_PATH, runs ffprobe on every video through a bounded process
+pool, and fills the persistent probe cache plus the Video table (duration,
+resolution, codec, size) in batched writes. Files whose probe cache entry is
+still valid are skipped, so an interrupted run resumes where it stopped.
+
+Usage: python scripts/warm_video_library.py [--root PATH] [--workers N] [--batch-size 200] [--force]
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dotenv import load_dotenv
+
+from src.utils.video_transcoder import run_ffprobe, get_cached_probe, store_probe_results
+
+SUPPORTED_FORMATS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm')
+
+
+def walk_videos(root):
+    """Yield (absolute path, stat) for every supported video under root"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(SUPPORTED_FORMATS):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                yield path, os.stat(path)
+            except OSError as e:
+                print(f"⚠️  Skipping {path}: {e}")
+
+
+def probe_job(path):
+    """Process pool entry point"""
+    return path, run_ffprobe(path)
+
+
+class VideoTableWriter:
+    """Batches Video rows and writes them with bulk insert/update mappings"""
+
+    def __init__(self, app, root, batch_size):
+        from src.models import db, Video
+
+        self.app = app
+        self.db = db
+        self.Video = Video
+        self.root = root
+        self.batch_size = batch_size
+        self.pending = []
+        with app.app_context():
+            self.existing = dict(db.session.query(Video.file_path, Video.id).all())
+
+    def add(self, path, stat_result, info):
+        self.pending.append((path, stat_result, info))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        inserts, updates = [], []
+        for path, stat_result, info in self.pending:
+            relative_path = os.path.relpath(path, self.root)
+            row = {
+                'duration_seconds': int(round(info.get('duration') or 0)) or None,
+                'resolution': info.get('resolution'),
+                'codec': info.get('codec'),
+                'file_size': stat_result.st_size
+            }
+            video_id = self.existing.get(relative_path)
+            if video_id:
+                row['id'] = video_id
+                updates.append(row)
+            else:
+                filename = os.path.basename(path)
+                row.update({
+                    'title': os.path.splitext(filename)[0],
+                    'file_path': relative_path,
+                    'filename': filename
+                })
+                inserts.append(row)
+        with self.app.app_context():
+            if inserts:
+                self.db.session.bulk_insert_mappings(self.Video, inserts)
+            if updates:
+                self.db.session.bulk_update_mappings(self.Video, updates)
+            self.db.session.commit()
+            if inserts:
+                paths = [row['file_path'] for row in inserts]
+                self.existing.update(
+                    self.db.session.query(self.Video.file_path, self.Video.id)
+                    .filter(self.Video.file_path.in_(paths)).all()
+                )
+        self.pending = []
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Probe every library video and warm the metadata caches')
+    parser.add_argument('--root', default=os.environ.get('VIDEO_ROOT_PATH'), help='Video library root')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Concurrent ffprobe processes')
+    parser.add_argument('--batch-size', type=int, default=200, help='Rows per cache/database write')
+    parser.add_argument('--force', action='store_true', help='Re-probe files that are already cached')
+    parser.add_argument('--no-db', action='store_true', help='Only fill the probe cache, skip the Video table')
+    args = parser.parse_args()
+
+    if not args.root or not os.path.isdir(args.root):
+        print("❌ VIDEO_ROOT_PATH is not configured or does not exist.")
+        sys.exit(1)
+
+    writer = None
+    if not args.no_db:
+        from src.main import create_app
+        writer = VideoTableWriter(create_app(start_background=False), args.root, args.batch_size)
+
+    print(f"🚀 Warming video library at {args.root} with {args.workers} workers...")
+    started = time.perf_counter()
+    probed = skipped = failed = 0
+    cache_batch = []
+    stats = {}
+
+    def record(path, info):
+        nonlocal probed, failed
+        if info is None:
+            failed += 1
+            return
+        probed += 1
+        stat_result = stats.pop(path)
+        cache_batch.append((path, stat_result.st_size, stat_result.st_mtime_ns, info))
+        if len(cache_batch) >= args.batch_size:
+            store_probe_results(cache_batch)
+            cache_batch.clear()
+        if writer:
+            writer.add(path, stat_result, info)
+        done = probed + failed
+        if done % 100 == 0:
+            rate = done / (time.perf_counter() - started)
+            print(f"   {done} probed ({skipped} cached) - {rate:.1f} files/sec")
+
+    max_in_flight = args.workers * 4
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        in_flight = set()
+        for path, stat_result in walk_videos(args.root):
+            if not args.force:
+                info = get_cached_probe(path, stat_result)
+                if info is not None:
+                    skipped += 1
+                    if writer:
+                        writer.add(path, stat_result, info)
+                    continue
+            stats[path] = stat_result
+            in_flight.add(pool.submit(probe_job, path))
+            if len(in_flight) >= max_in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(*future.result())
+        for future in wait(in_flight).done:
+            record(*future.result())
+
+    store_probe_results(cache_batch)
+    if writer:
+        writer.flush()
+
+    elapsed = time.perf_counter() - started
+    rate = probed / elapsed if elapsed else 0.0
+    print(f"🎉 Done in {elapsed:.1f}s: {probed} probed, {skipped} already cached, {failed} failed "
+          f"({rate:.1f} files/sec)")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from flask import current_app
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from ..models import db, VideoCategory, Exercise, WorkoutTemplate, Video, WorkoutVideoMapping
+from ..services.video_matcher import get_video_matcher
 
 def create_video_categories():
     """Create video categories based on the user's library structure."""
@@ -348,17 +349,23 @@ def create_exercise_video_mappings():
     ]
     
     created_mappings = []
+    exercises = {exercise.name: exercise for exercise in Exercise.query.all()}
+    already_mapped = {exercise_id for (exercise_id,) in db.session.query(WorkoutVideoMapping.exercise_id).distinct()}
+    
+    # Look up every curated video in one query
+    curated_paths = [path for mapping_data in mappings_data for path in mapping_data['video_paths']]
+    videos_by_path = {video.file_path: video for video in Video.query.filter(Video.file_path.in_(curated_paths))}
     
     for mapping_data in mappings_data:
         # Find the exercise
-        exercise = Exercise.query.filter_by(name=mapping_data['exercise_name']).first()
+        exercise = exercises.get(mapping_data['exercise_name'])
         if not exercise:
             print(f"Exercise '{mapping_data['exercise_name']}' not found, skipping mappings")
             continue
         
         for i, video_path in enumerate(mapping_data['video_paths']):
             # Find the video by file path
-            video = Video.query.filter_by(file_path=video_path).first()
+            video = videos_by_path.get(video_path)
             if not video:
                 print(f"Video '{video_path}' not found, skipping mapping")
                 continue
@@ -374,6 +381,34 @@ def create_exercise_video_mappings():
             
             db.session.add(mapping)
             created_mappings.append(mapping)
+            already_mapped.add(exercise.id)
+    
+    # Every other exercise is matched against the video index by name, all in one pass
+    unmapped = [exercise for exercise in exercises.values() if exercise.id not in already_mapped]
+    if unmapped:
+        all_matches = get_video_matcher().match_many([exercise.name for exercise in unmapped], max_results=3)
+        matched_paths = list({match['path'] for matches in all_matches for match in matches})
+        for start in range(0, len(matched_paths), 500):
+            videos_by_path.update(
+                (video.file_path, video)
+                for video in Video.query.filter(Video.file_path.in_(matched_paths[start:start + 500]))
+            )
+        
+        for exercise, matches in zip(unmapped, all_matches):
+            matched = [(videos_by_path[match['path']], match['match_score'])
+                       for match in matches if match['path'] in videos_by_path]
+            for i, (video, score) in enumerate(matched):
+                mapping = WorkoutVideoMapping(
+                    exercise_id=exercise.id,
+                    video_id=video.id,
+                    mapping_type='instruction',
+                    is_primary=(i == 0),
+                    sort_order=i,
+                    notes=f"Matched by name (score {score})"
+                )
+                db.session.add(mapping)
+                created_mappings.append(mapping)
+        print(f"Matched {len(unmapped)} exercises without curated videos against the video index")
     
     return created_mappings
 
@@ -398,7 +433,7 @@ def seed_video_library():
 if __name__ == "__main__":
     from main import create_app
     
-    app = create_app()
+    app = create_app(start_background=False)
     with app.app_context():
         success = seed_video_library()
         sys.exit(0 if success else 1)
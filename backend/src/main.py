@@ -3,7 +3,12 @@ from flask import Flask
 from flask_cors import CORS
 from .models import db
 
-def create_app():
+def create_app(start_background=True):
+    """
+    Build the app. start_background starts the transcode workers and the video
+    match materializer; migrations and CLI scripts pass False so short-lived
+    processes don't claim jobs or touch tables that may not exist yet.
+    """
     app = Flask(__name__)
     
     # Database configuration
@@ -53,10 +58,20 @@ def create_app():
     CORS(app, resources={r"/*": {"origins": "*"}})
     
     with app.app_context():
+        # WAL, busy timeout, cache and mmap pragmas on every connection (SQLITE_* env overrides)
+        from .utils.sqlite_tuning import configure_sqlite_engine, report_sqlite_settings
+        if configure_sqlite_engine(db.engine):
+            app.config['SQLITE_SETTINGS'] = report_sqlite_settings(db.engine)
+        
         db.create_all()  # Create tables if they don't exist
     
-    # Start background transcode worker
-    from .utils.transcode_manager import start_worker
-    start_worker(app)
+    if start_background:
+        # Start background transcode worker
+        from .utils.transcode_manager import start_worker
+        start_worker(app)
+        
+        # Keep materialized exercise video matches in step with the video index
+        from .services.exercise_video_matches import start_materializer
+        start_materializer(app)
     
     return app
\ No newline at end of file
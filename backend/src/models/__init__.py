@@ -6,7 +6,7 @@ from .models import (
     WorkoutSession, ExerciseCompletion,
     VideoPlaylist, VideoPlaylistItem,
     Supplement, SupplementLog, DailyMetrics, DiaryEntry, TranscodeJob,
-    VideoSession, VideoFavorite
+    VideoSession, VideoFavorite, ExerciseVideoMatch
 )
 
 __all__ = [
@@ -16,5 +16,5 @@ __all__ = [
     'WorkoutSession', 'ExerciseCompletion',
     'VideoPlaylist', 'VideoPlaylistItem',
     'Supplement', 'SupplementLog', 'DailyMetrics', 'DiaryEntry', 'TranscodeJob',
-    'VideoSession', 'VideoFavorite'
+    'VideoSession', 'VideoFavorite', 'ExerciseVideoMatch'
 ]
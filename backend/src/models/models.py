@@ -175,6 +175,12 @@ class Video(db.Model):
     file_path = db.Column(db.String(1000), nullable=False)
     filename = db.Column(db.String(500))
     category_id = db.Column(db.Integer, db.ForeignKey('video_categories.id'))
+    
+    # Probed media metadata (filled by scripts/warm_video_library.py)
+    duration_seconds = db.Column(db.Integer, nullable=True)
+    resolution = db.Column(db.String(20), nullable=True)  # e.g. "1920x1080"
+    codec = db.Column(db.String(20), nullable=True)  # video codec, e.g. "h264", "hevc"
+    file_size = db.Column(db.BigInteger, nullable=True)  # bytes
     exercise_mappings = db.relationship('WorkoutVideoMapping', backref='video', lazy=True)
 
 class WorkoutVideoMapping(db.Model):
@@ -458,27 +464,81 @@ class DiaryEntry(db.Model):
 class TranscodeJob(db.Model):
     """Track video transcoding jobs"""
     __tablename__ = 'transcode_jobs'
-    id = db.Column(db.String(64), primary_key=True)  # SHA-256 hash (first 32 chars) of input file path
+    __table_args__ = (
+        db.Index('ix_transcode_jobs_claim', 'status', 'priority', 'created_at'),
+    )
+    id = db.Column(db.String(64), primary_key=True)  # SHA-256 hash (first 32 chars) of the content-addressed cache key
     input_path = db.Column(db.String(512), nullable=False)
     output_path = db.Column(db.String(512), nullable=False)
-    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, complete, failed
+    segment_index = db.Column(db.Integer, nullable=True)  # HLS segment number, None for a full-file transcode
+    profile = db.Column(db.String(20), nullable=True, default='source')  # encode profile: source, 720p, 480p
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, paused, complete, failed, cancelled
+    priority = db.Column(db.Integer, nullable=False, default=1)  # 0 = viewer waiting, 1 = background pre-cache
     progress = db.Column(db.Integer, default=0)  # 0-100
+    eta_seconds = db.Column(db.Integer, nullable=True)  # estimated seconds remaining while processing
     error_message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     
+    # Queue lease: the claiming worker renews lease_expires_at via heartbeats;
+    # expired processing rows are reclaimed back to pending
+    worker_id = db.Column(db.String(200), nullable=True)  # host:pid:thread of the claiming worker
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)  # retry backoff: not claimable before this
+    
     def to_dict(self):
         return {
             'id': self.id,
             'input_path': self.input_path,
             'output_path': self.output_path,
+            'segment_index': self.segment_index,
+            'profile': self.profile or 'source',
             'status': self.status,
+            'priority': self.priority,
             'progress': self.progress,
+            'eta_seconds': self.eta_seconds,
             'error_message': self.error_message,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'worker_id': self.worker_id,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'attempts': self.attempts or 0,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None
+        }
+
+class ExerciseVideoMatch(db.Model):
+    """Materialized top video matches per exercise name, recomputed when the video index changes"""
+    __tablename__ = 'exercise_video_matches'
+    __table_args__ = (
+        db.Index('ix_exercise_video_matches_lookup', 'exercise_name', 'category_hint', 'rank', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    exercise_name = db.Column(db.String(200), nullable=False)  # lowercased, whitespace collapsed
+    category_hint = db.Column(db.String(200), nullable=False, default='')  # '' when matched across all categories
+    rank = db.Column(db.Integer, nullable=False, default=0)  # 0 = best match
+    # Matched video; all None on a single rank-0 row when the name matched nothing
+    video_key = db.Column(db.String(20), nullable=True)  # video_index.json id
+    video_path = db.Column(db.String(1000), nullable=True)
+    filename = db.Column(db.String(500), nullable=True)
+    category = db.Column(db.String(200), nullable=True)
+    subcategory = db.Column(db.String(200), nullable=True)
+    match_score = db.Column(db.Float, nullable=True)
+    index_version = db.Column(db.String(300), nullable=False)  # video index file the match was computed from
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_match(self):
+        """The match in VideoMatcher's result format"""
+        return {
+            'id': self.video_key,
+            'filename': self.filename,
+            'path': self.video_path,
+            'category': self.category,
+            'subcategory': self.subcategory,
+            'match_score': self.match_score
         }
 
 class VideoSession(db.Model):
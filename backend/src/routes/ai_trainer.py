@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify
 from openai import OpenAI
 from datetime import datetime, timedelta
 from ..models.models import db, VideoSession, DailyMetrics, TrainerSession
-from ..services.video_matcher import enhance_workout_with_videos
+from ..services.exercise_video_matches import enhance_workout_with_videos
+from ..utils.prefetch import schedule_prefetch, workout_video_paths
 import json
 import os
 import logging
@@ -269,6 +270,9 @@ def generate_workout():
         
         logger.info(f"Saved trainer session {trainer_session.id} for user {user_id}")
         
+        # Get the first videos of the session transcoded/cached before they're played
+        schedule_prefetch(workout_video_paths(enhanced_workout))
+        
         # Return the enhanced workout
         return jsonify({
             'success': True,
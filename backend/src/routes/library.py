@@ -2,22 +2,10 @@ from flask import Blueprint, jsonify, request
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
 from ..models import db, VideoSession, VideoFavorite
-import json
-import os
+from ..services.video_index import get_video_index
 
 library_bp = Blueprint('library', __name__)
 
-# Load video index
-VIDEO_INDEX_PATH = os.path.join(os.path.dirname(__file__), '../data/video_index.json')
-
-def load_video_index():
-    """Load and return video index"""
-    try:
-        with open(VIDEO_INDEX_PATH, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {'videos': []}
-
 def get_category_icon(category_name):
     """Return emoji icon for category"""
     icons = {
@@ -39,69 +27,48 @@ def get_category_icon(category_name):
 @library_bp.route('/library/categories', methods=['GET'])
 def get_categories():
     """Get all video categories with counts"""
-    index = load_video_index()
-    videos = index.get('videos', [])
-    
-    # Group videos by category
-    categories_dict = {}
-    for video in videos:
-        category = video.get('category', 'Uncategorized')
-        if category not in categories_dict:
-            categories_dict[category] = []
-        categories_dict[category].append(video)
-    
-    # Convert to list format
-    categories = []
-    for cat_name, cat_videos in categories_dict.items():
-        categories.append({
+    # Grouping and counts are memoized on the index snapshot
+    categories = [
+        {
             'name': cat_name,
-            'video_count': len(cat_videos),
+            'video_count': video_count,
             'icon': get_category_icon(cat_name)
-        })
-    
-    # Sort by name
-    categories.sort(key=lambda x: x['name'])
+        }
+        for cat_name, video_count in get_video_index().category_counts
+    ]
     
     return jsonify(categories)
 
 @library_bp.route('/library/category/<path:category_name>', methods=['GET'])
 def get_category_videos(category_name):
     """Get all videos in a category"""
-    index = load_video_index()
-    videos = index.get('videos', [])
-    
-    # Filter videos by category
-    category_videos = [
-        video for video in videos 
-        if video.get('category', '') == category_name
-    ]
-    
     return jsonify({
         'category': category_name,
-        'videos': category_videos
+        'videos': get_video_index().by_category.get(category_name, [])
     })
 
 @library_bp.route('/library/search', methods=['GET'])
 def search_videos():
     """Search videos by name, category, or instructor"""
     query = request.args.get('q', '').lower().strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 100, type=int), 1), 500)
     
     if not query:
         return jsonify({'videos': []})
     
-    index = load_video_index()
-    videos = index.get('videos', [])
-    
-    # Search in searchable field (which includes filename, path, category, subcategory)
-    matching_videos = [
-        video for video in videos
-        if query in video.get('searchable', '').lower()
-    ]
+    # Every word must match (filename, category or path); filename hits rank first
+    total, matching_videos = get_video_index().search(
+        query, offset=(page - 1) * per_page, limit=per_page,
+        category=request.args.get('category') or None
+    )
     
-    # Limit results to 100 for performance
     return jsonify({
         'query': query,
-        'videos': matching_videos[:100]
+        'videos': matching_videos,
+        'total': total,
+        'page': page,
+        'per_page': per_page
     })
 
 @library_bp.route('/library/sessions', methods=['POST'])
@@ -3,26 +3,59 @@ Video Server Routes for Enhanced Fitness Tracker
 Handles video streaming, library management, and workout-video integration
 """
 
-from flask import Blueprint, request, jsonify, send_file, Response
+from flask import Blueprint, request, jsonify, redirect, Response
 from werkzeug.utils import secure_filename
-from urllib.parse import unquote
+from urllib.parse import quote, unquote
 import os
-import mimetypes
-import json
+import time
 from datetime import datetime
-import subprocess
-import re
 import logging
 
 from ..models import db, VideoCategory, Video, WorkoutVideoMapping, VideoPlaylist, VideoPlaylistItem
 from ..models import Exercise, TranscodeJob
+from ..services.video_index import get_video_index, has_video_index
+from ..services.library_indexer import LibraryScanRefused, update_library_index
+from ..services.match_cache import get_match_cache
+from ..services.video_matcher import match_many
+from ..services.exercise_video_matches import materialize_matches, get_materializer_stats
 from ..utils.video_transcoder import (
     needs_transcoding,
     get_cache_path,
     get_playable_path,
-    get_video_codec
+    get_video_codec,
+    get_playback_strategy,
+    get_partial_path,
+    is_progressive_output,
+    probe_video,
+    resolve_profile,
+    available_profiles,
+    pick_profile,
+    ENCODE_PROFILES,
+    DEFAULT_PROFILE
+)
+from ..utils.transcode_manager import (
+    create_or_get_job,
+    enqueue_job,
+    get_job_status,
+    get_job_id,
+    get_queue_stats,
+    cancel_job,
+    pause_job,
+    resume_job,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BACKGROUND
+)
+from ..utils.range_streaming import send_file_range, send_growing_file
+from ..utils.cache_manager import record_access, get_cache_stats
+from ..utils.prefetch import schedule_prefetch, playlist_video_paths
+from ..utils.hls import (
+    build_playlist,
+    build_master_playlist,
+    segment_count,
+    get_segment_path,
+    HLS_PREFETCH_SEGMENTS,
+    HLS_SEGMENT_WAIT
 )
-from ..utils.transcode_manager import create_or_get_job, enqueue_job, get_job_status, get_job_id
 
 logger = logging.getLogger(__name__)
 
@@ -33,90 +66,40 @@ video_bp = Blueprint('video', __name__, url_prefix='/api/videos')
 VIDEO_ROOT_PATH = os.environ.get('VIDEO_ROOT_PATH', '/path/to/video/library')
 ALLOWED_NETWORKS = ['192.168.0.0/16', '10.0.0.0/8', '172.16.0.0/12', '127.0.0.1/32']
 SUPPORTED_FORMATS = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']
+# Seconds a play request waits for the first fragments of a progressive transcode before answering 202
+PROGRESSIVE_START_WAIT = float(os.environ.get('TRANSCODE_PROGRESSIVE_START_WAIT', 5))
+# Client hints that pick a rendition when the request has no ?profile=
+CLIENT_HINT_HEADERS = ['Save-Data', 'ECT', 'Downlink', 'Sec-CH-Viewport-Width', 'Viewport-Width', 'Sec-CH-DPR', 'DPR']
+# Rough downlink (Mbps) of the slow Network Information effective connection types
+ECT_DOWNLINK_MBPS = {'slow-2g': 0.05, '2g': 0.07, '3g': 0.7}
 
 def is_video_file(filename):
     """Check if file is a supported video format."""
     return any(filename.lower().endswith(ext) for ext in SUPPORTED_FORMATS)
 
-def send_file_partial(file_path):
-    """Send file with range request support for video seeking."""
-    file_size = os.path.getsize(file_path)
-    
-    # Handle range requests for video seeking
-    range_header = request.headers.get('Range', None)
-    if range_header:
-        byte_start = 0
-        byte_end = file_size - 1
-        
-        range_match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-        if range_match:
-            byte_start = int(range_match.group(1))
-            if range_match.group(2):
-                byte_end = int(range_match.group(2))
-        
-        content_length = byte_end - byte_start + 1
-        
-        def generate():
-            # Use context manager to ensure file descriptor is properly closed
-            f = None
-            try:
-                f = open(file_path, 'rb')
-                f.seek(byte_start)
-                remaining = content_length
-                while remaining:
-                    chunk_size = min(8192, remaining)
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-                    remaining -= len(chunk)
-                    yield chunk
-            finally:
-                # Explicitly close file descriptor to prevent leaks
-                if f is not None:
-                    f.close()
-        
-        response = Response(
-            generate(),
-            206,  # Partial Content
-            headers={
-                'Content-Range': f'bytes {byte_start}-{byte_end}/{file_size}',
-                'Accept-Ranges': 'bytes',
-                'Content-Length': str(content_length),
-                'Content-Type': mimetypes.guess_type(file_path)[0] or 'video/mp4'
-            }
-        )
-        return response
-    else:
-        # Full file response
-        return send_file(
-            file_path,
-            mimetype=mimetypes.guess_type(file_path)[0] or 'video/mp4',
-            as_attachment=False
-        )
+def wait_for_partial_output(partial_path, timeout):
+    """Wait until a transcode has written its first bytes; False on timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if os.path.getsize(partial_path) > 0:
+                return True
+        except OSError:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.25)
 
 def get_video_info(file_path):
-    """Extract video metadata using ffprobe."""
-    try:
-        cmd = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams',
-            file_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            
-            # Extract video stream info
-            video_stream = next((s for s in data.get('streams', []) if s.get('codec_type') == 'video'), None)
-            format_info = data.get('format', {})
-            
-            return {
-                'duration': float(format_info.get('duration', 0)),
-                'size': int(format_info.get('size', 0)),
-                'format': format_info.get('format_name', '').split(',')[0],
-                'resolution': f"{video_stream.get('width', 0)}x{video_stream.get('height', 0)}" if video_stream else None
-            }
-    except Exception as e:
-        print(f"Error extracting video info: {e}")
+    """Extract video metadata using the shared ffprobe cache."""
+    info = probe_video(file_path)
+    if info:
+        return {
+            'duration': info.get('duration', 0),
+            'size': os.path.getsize(file_path),
+            'format': (info.get('format_name') or '').split(',')[0] or None,
+            'resolution': info.get('resolution')
+        }
     
     return {'duration': 0, 'size': 0, 'format': None, 'resolution': None}
 
@@ -180,17 +163,14 @@ def get_category_videos(category_id):
 def list_videos():
     """List all available videos from video index or database."""
     try:
-        # Try to load from video index JSON first
-        video_index_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'video_index.json')
-        
-        if os.path.exists(video_index_path):
-            with open(video_index_path, 'r') as f:
-                index_data = json.load(f)
-                return jsonify({
-                    'videos': index_data.get('videos', []),
-                    'categories': index_data.get('categories', []),
-                    'total': len(index_data.get('videos', []))
-                })
+        # Try the shared snapshot of the video index JSON first
+        if has_video_index():
+            index = get_video_index()
+            return jsonify({
+                'videos': index.videos,
+                'categories': index.categories,
+                'total': len(index)
+            })
         
         # Fallback to database
         videos = Video.query.all()
@@ -211,26 +191,30 @@ def search_videos():
     """Search videos by filename/path."""
     try:
         query = request.args.get('q', '').lower()
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 100, type=int), 1), 500)
         
         if not query:
             return jsonify({'videos': [], 'total': 0, 'query': ''})
         
-        # Try to load from video index JSON first
-        video_index_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'video_index.json')
-        
-        if os.path.exists(video_index_path):
-            with open(video_index_path, 'r') as f:
-                index_data = json.load(f)
-                videos = index_data.get('videos', [])
-                # Filter by searchable text
-                filtered = [v for v in videos if query in v.get('searchable', '').lower() or 
-                           query in v.get('filename', '').lower() or 
-                           query in v.get('path', '').lower()]
-                return jsonify({
-                    'videos': filtered,
-                    'total': len(filtered),
-                    'query': query
-                })
+        # Try the shared snapshot of video_index.json first
+        if has_video_index():
+            total, videos = get_video_index().search(
+                query, offset=(page - 1) * per_page, limit=per_page
+            )
+            return jsonify({
+                'videos': videos,
+                'total': total,
+                'query': query,
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': total,
+                    'pages': -(-total // per_page),
+                    'has_next': page * per_page < total,
+                    'has_prev': page > 1
+                }
+            })
         
         # Fallback to database search
         videos = Video.query.filter(
@@ -254,6 +238,134 @@ def search_videos():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@video_bp.route('/match', methods=['POST'])
+def match_exercise_videos():
+    """
+    Match many exercise names to library videos in one pass.
+    Body: {"exercises": ["Pushups", {"name": "Jab", "category_hint": "Boxing Training"}], "max_results": 3}
+    """
+    try:
+        data = request.get_json() or {}
+        exercises = data.get('exercises')
+        if not isinstance(exercises, list) or not exercises:
+            return jsonify({'error': 'exercises must be a non-empty list'}), 400
+        if len(exercises) > 1000:
+            return jsonify({'error': 'At most 1000 exercises per request'}), 400
+        if not all(isinstance(exercise, str) or (isinstance(exercise, dict) and isinstance(exercise.get('name'), str))
+                   for exercise in exercises):
+            return jsonify({'error': 'Each exercise must be a name or an object with a name'}), 400
+        max_results = min(max(int(data.get('max_results', 3)), 1), 20)
+        
+        exercises = [
+            {'name': exercise, 'category_hint': None} if isinstance(exercise, str)
+            else {'name': exercise['name'], 'category_hint': exercise.get('category_hint') or None}
+            for exercise in exercises
+        ]
+        all_matches = match_many(exercises, max_results=max_results)
+        return jsonify({
+            'matches': [dict(exercise, videos=videos) for exercise, videos in zip(exercises, all_matches)],
+            'total': len(exercises)
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error matching exercise videos: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/match/materialize', methods=['POST'])
+def materialize_exercise_video_matches():
+    """Recompute the materialized exercise video matches now (they also follow index changes on their own)."""
+    try:
+        result = materialize_matches(force=True)
+        return jsonify(dict(result, materializer=get_materializer_stats()))
+    except Exception as e:
+        logger.error(f"Error materializing exercise video matches: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def resolve_library_video(filename):
+    """
+    Map a /stream-style relative path to a video under VIDEO_ROOT_PATH.
+    Returns (file_path, None) or (None, error response).
+    """
+    # Flask's <path:filename> already URL-decodes, but handle any edge cases
+    # Properly decode URL-encoded characters (handles %2F, %20, %26, etc.)
+    video_path = unquote(filename)
+    
+    # Remove leading ./ if present
+    if video_path.startswith('./'):
+        video_path = video_path[2:]
+    
+    file_path = os.path.join(VIDEO_ROOT_PATH, video_path)
+    
+    # Security check: prevent path traversal attacks
+    # Normalize paths to handle .. and . components
+    abs_video_root = os.path.abspath(os.path.normpath(VIDEO_ROOT_PATH))
+    abs_file_path = os.path.abspath(os.path.normpath(file_path))
+    
+    # Ensure the resolved path is within VIDEO_ROOT_PATH
+    # Use os.path.commonpath to prevent directory traversal
+    try:
+        common_path = os.path.commonpath([abs_video_root, abs_file_path])
+        if common_path != abs_video_root:
+            logger.warning(f"Path traversal attempt detected: {video_path}")
+            return None, (jsonify({'error': 'Invalid video path'}), 403)
+    except ValueError:
+        # Paths don't share a common base (shouldn't happen, but be safe)
+        logger.warning(f"Path traversal attempt detected: {video_path}")
+        return None, (jsonify({'error': 'Invalid video path'}), 403)
+    
+    if not os.path.exists(file_path):
+        return None, (jsonify({'error': 'Video file not found'}), 404)
+    
+    if not is_video_file(file_path):
+        return None, (jsonify({'error': 'File is not a supported video format'}), 400)
+    
+    return file_path, None
+
+def _float_header(name):
+    """Numeric request header, or None if missing or malformed."""
+    try:
+        return float(request.headers.get(name, ''))
+    except ValueError:
+        return None
+
+def requested_profile(info=None):
+    """
+    Rendition asked for by this request as (profile, explicit): ?profile= when
+    given, otherwise picked from client hints (Save-Data, Downlink or ECT,
+    viewport width x DPR). Callers still resolve it against the source.
+    """
+    profile = request.args.get('profile')
+    if profile:
+        return profile, True
+    
+    downlink = _float_header('Downlink')
+    if downlink is None:
+        downlink = ECT_DOWNLINK_MBPS.get(request.headers.get('ECT', '').lower())
+    width = _float_header('Sec-CH-Viewport-Width') or _float_header('Viewport-Width')
+    dpr = _float_header('Sec-CH-DPR') or _float_header('DPR') or 1.0
+    return pick_profile(
+        info,
+        downlink_mbps=downlink,
+        viewport_pixels=width * dpr if width else None,
+        save_data=request.headers.get('Save-Data', '').lower() == 'on'
+    ), False
+
+def invalid_profile_response():
+    """400 response when ?profile= names an unknown rendition, else None."""
+    profile = request.args.get('profile')
+    if profile and profile not in ENCODE_PROFILES:
+        return jsonify({'error': f'Unknown profile {profile}', 'profiles': list(ENCODE_PROFILES)}), 400
+    return None
+
+def with_rendition_headers(response, profile):
+    """Label the rendition served and tell caches and browsers which hints it depends on."""
+    response.headers['X-Video-Profile'] = profile
+    response.headers['Accept-CH'] = ', '.join(CLIENT_HINT_HEADERS[1:])
+    if not request.args.get('profile'):
+        response.headers['Vary'] = ', '.join(CLIENT_HINT_HEADERS)
+    return response
+
 @video_bp.route('/stream/<path:filename>', methods=['GET'])
 def stream_video_by_path(filename):
     """Stream video file, transcoding if necessary for browser compatibility."""
@@ -261,61 +373,77 @@ def stream_video_by_path(filename):
         if not VIDEO_ROOT_PATH:
             return jsonify({'error': 'VIDEO_ROOT_PATH not configured'}), 500
         
-        # Flask's <path:filename> already URL-decodes, but handle any edge cases
-        # Properly decode URL-encoded characters (handles %2F, %20, %26, etc.)
-        video_path = unquote(filename)
-        
-        # Remove leading ./ if present
-        if video_path.startswith('./'):
-            video_path = video_path[2:]
-        
-        file_path = os.path.join(VIDEO_ROOT_PATH, video_path)
-        
-        # Security check: prevent path traversal attacks
-        # Normalize paths to handle .. and . components
-        abs_video_root = os.path.abspath(os.path.normpath(VIDEO_ROOT_PATH))
-        abs_file_path = os.path.abspath(os.path.normpath(file_path))
-        
-        # Ensure the resolved path is within VIDEO_ROOT_PATH
-        # Use os.path.commonpath to prevent directory traversal
-        try:
-            common_path = os.path.commonpath([abs_video_root, abs_file_path])
-            if common_path != abs_video_root:
-                logger.warning(f"Path traversal attempt detected: {video_path}")
-                return jsonify({'error': 'Invalid video path'}), 403
-        except ValueError:
-            # Paths don't share a common base (shouldn't happen, but be safe)
-            logger.warning(f"Path traversal attempt detected: {video_path}")
-            return jsonify({'error': 'Invalid video path'}), 403
-        
-        if not os.path.exists(file_path):
-            return jsonify({'error': 'Video file not found'}), 404
-        
-        if not is_video_file(file_path):
-            return jsonify({'error': 'File is not a supported video format'}), 400
+        file_path, error = resolve_library_video(filename)
+        if error:
+            return error
+        error = invalid_profile_response()
+        if error:
+            return error
+        
+        hls_url = f'/api/videos/hls/{quote(filename)}/master.m3u8'
+        if request.args.get('format') == 'hls':
+            return redirect(hls_url)
+        
+        # Pick the rendition; a cap at or above the source's height is the source itself
+        info = probe_video(file_path)
+        profile, explicit = requested_profile(info)
+        profile = resolve_profile(file_path, profile, info)
+        if (profile != DEFAULT_PROFILE and not explicit and not needs_transcoding(file_path)
+                and not os.path.exists(get_cache_path(file_path, profile))):
+            # Hints alone don't make a viewer wait on an encode of a file that plays as-is:
+            # serve the source now and have the smaller rendition ready for next time
+            job, should_enqueue = create_or_get_job(
+                file_path, get_cache_path(file_path, profile), priority=PRIORITY_BACKGROUND, profile=profile
+            )
+            if should_enqueue:
+                enqueue_job(job.id, priority=PRIORITY_BACKGROUND)
+            profile = DEFAULT_PROFILE
         
         # Check if we need transcoding
-        playable_path = get_playable_path(file_path)
+        playable_path = get_playable_path(file_path, profile)
         
         if playable_path:
             # Already playable (H.264 or cached transcode)
-            logger.debug(f"Serving playable video: {playable_path}")
-            return send_file_partial(playable_path)
+            logger.debug(f"Serving playable video ({profile}): {playable_path}")
+            if playable_path != file_path:
+                record_access(playable_path)
+            return with_rendition_headers(send_file_range(playable_path), profile)
         
         # Need to transcode - create/get job and return job ID
-        cache_path = get_cache_path(file_path)
-        job, should_enqueue = create_or_get_job(file_path, cache_path)
+        # A viewer is waiting, so this jumps ahead of background pre-caching
+        cache_path = get_cache_path(file_path, profile)
+        record_access(cache_path, hit=False)
+        job, should_enqueue = create_or_get_job(
+            file_path, cache_path, priority=PRIORITY_INTERACTIVE, profile=profile
+        )
         
         if should_enqueue:
-            enqueue_job(job.id)
+            enqueue_job(job.id, priority=PRIORITY_INTERACTIVE)
+        
+        # Fragmented output is playable while it is written, so start serving it right away
+        partial_path = get_partial_path(cache_path)
+        if is_progressive_output() and wait_for_partial_output(partial_path, PROGRESSIVE_START_WAIT):
+            logger.debug(f"Serving in-progress transcode: {partial_path}")
+            try:
+                return with_rendition_headers(send_growing_file(
+                    partial_path,
+                    is_finished=lambda: not os.path.exists(partial_path),
+                    mimetype='video/mp4'
+                ), profile)
+            except FileNotFoundError:
+                # Finished (or failed) between the check and the open
+                if os.path.exists(cache_path):
+                    return with_rendition_headers(send_file_range(cache_path), profile)
         
         # Return 202 Accepted with job ID for polling
-        return jsonify({
+        return with_rendition_headers(jsonify({
             'status': 'transcoding',
             'message': 'Video is being prepared for playback',
             'job_id': job.id,
-            'poll_url': f'/api/videos/transcode-job/{job.id}'
-        }), 202
+            'profile': profile,
+            'poll_url': f'/api/videos/transcode-job/{job.id}',
+            'hls_url': hls_url
+        }), profile), 202
         # Check if cache is being created (temp file exists)
         tmp_path = cache_path + '.tmp'
         if os.path.exists(tmp_path):
@@ -356,7 +484,7 @@ def stream_video_by_path(filename):
         logger.info(f"Starting transcoding for: {file_path}")
         if transcode_to_h264(file_path, cache_path):
             logger.info(f"Transcoding complete, serving: {cache_path}")
-            return send_file_partial(cache_path)
+            return send_file_range(cache_path)
         else:
             logger.error(f"Transcoding failed for: {file_path}")
             return jsonify({
@@ -378,55 +506,118 @@ def stream_video(video_id):
         if not os.path.exists(file_path):
             return jsonify({'error': 'Video file not found'}), 404
         
-        # Get file info
-        file_size = os.path.getsize(file_path)
-        
-        # Handle range requests for video seeking
-        range_header = request.headers.get('Range', None)
-        if range_header:
-            byte_start = 0
-            byte_end = file_size - 1
-            
-            range_match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-            if range_match:
-                byte_start = int(range_match.group(1))
-                if range_match.group(2):
-                    byte_end = int(range_match.group(2))
-            
-            content_length = byte_end - byte_start + 1
-            
-            def generate():
-                with open(file_path, 'rb') as f:
-                    f.seek(byte_start)
-                    remaining = content_length
-                    while remaining:
-                        chunk_size = min(8192, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-            
-            response = Response(
-                generate(),
-                206,  # Partial Content
-                headers={
-                    'Content-Range': f'bytes {byte_start}-{byte_end}/{file_size}',
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': str(content_length),
-                    'Content-Type': mimetypes.guess_type(file_path)[0] or 'video/mp4'
-                }
+        return send_file_range(file_path)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/hls/<path:filename>/master.m3u8', methods=['GET'])
+def hls_master_playlist(filename):
+    """HLS multivariant playlist listing every rendition no larger than the source."""
+    try:
+        file_path, error = resolve_library_video(filename)
+        if error:
+            return error
+        
+        info = probe_video(file_path)
+        if not info or not info.get('duration'):
+            return jsonify({'error': 'Unable to determine video duration'}), 500
+        
+        return Response(
+            build_master_playlist(info, available_profiles(file_path, info)),
+            mimetype='application/vnd.apple.mpegurl'
+        )
+    
+    except Exception as e:
+        logger.error(f"Error building HLS master playlist: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/hls/<path:filename>/index.m3u8', methods=['GET'])
+def hls_playlist(filename):
+    """HLS playlist for one rendition (?profile=) of a library video; segments are transcoded when first requested."""
+    try:
+        file_path, error = resolve_library_video(filename)
+        if error:
+            return error
+        error = invalid_profile_response()
+        if error:
+            return error
+        
+        info = probe_video(file_path)
+        if not info or not info.get('duration'):
+            return jsonify({'error': 'Unable to determine video duration'}), 500
+        profile = resolve_profile(file_path, request.args.get('profile'), info)
+        
+        return Response(build_playlist(info['duration'], profile), mimetype='application/vnd.apple.mpegurl')
+    
+    except Exception as e:
+        logger.error(f"Error building HLS playlist: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/hls/<path:filename>/seg<int:index>.ts', methods=['GET'])
+def hls_segment(filename, index):
+    """
+    Serve one HLS segment. One that isn't cached is queued at interactive
+    priority and waited on for up to HLS_SEGMENT_WAIT seconds, then 503 + Retry-After.
+    """
+    try:
+        file_path, error = resolve_library_video(filename)
+        if error:
+            return error
+        error = invalid_profile_response()
+        if error:
+            return error
+        
+        info = probe_video(file_path)
+        if not info or not info.get('duration'):
+            return jsonify({'error': 'Unable to determine video duration'}), 500
+        total = segment_count(info['duration'])
+        if index >= total:
+            return jsonify({'error': 'Segment not found'}), 404
+        profile = resolve_profile(file_path, request.args.get('profile'), info)
+        
+        segment_path = get_segment_path(file_path, index, profile)
+        cached = os.path.exists(segment_path)
+        record_access(segment_path, hit=cached)
+        job = None
+        if not cached:
+            # The viewer is waiting on this one: queue it ahead of everything else
+            # instead of encoding in the request thread
+            job, should_enqueue = create_or_get_job(
+                file_path, segment_path, priority=PRIORITY_INTERACTIVE, segment_index=index, profile=profile
             )
-            return response
-        else:
-            # Full file response
-            return send_file(
-                file_path,
-                mimetype=mimetypes.guess_type(file_path)[0] or 'video/mp4',
-                as_attachment=False
+            if should_enqueue:
+                enqueue_job(job.id, priority=PRIORITY_INTERACTIVE)
+        
+        # Queue the next few segments so playback doesn't stall at each boundary
+        for next_index in range(index + 1, min(index + 1 + HLS_PREFETCH_SEGMENTS, total)):
+            next_path = get_segment_path(file_path, next_index, profile)
+            if os.path.exists(next_path):
+                continue
+            next_job, should_enqueue = create_or_get_job(
+                file_path, next_path, priority=PRIORITY_BACKGROUND, segment_index=next_index, profile=profile
             )
+            if should_enqueue:
+                enqueue_job(next_job.id, priority=PRIORITY_BACKGROUND)
+        
+        # Segments are renamed into place once complete, so any bytes mean it's ready
+        if not cached and not wait_for_partial_output(segment_path, HLS_SEGMENT_WAIT):
+            db.session.refresh(job)
+            if job.status == 'failed':
+                return jsonify({'error': 'Segment transcoding failed', 'job_id': job.id}), 500
+            response = jsonify({
+                'status': 'transcoding',
+                'message': 'Segment is being prepared',
+                'job_id': job.id,
+                'poll_url': f'/api/videos/transcode-job/{job.id}'
+            })
+            response.headers['Retry-After'] = '2'
+            return response, 503
+        
+        return send_file_range(segment_path, mimetype='video/mp2t')
     
     except Exception as e:
+        logger.error(f"Error serving HLS segment: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @video_bp.route('/transcode-status/<path:filename>', methods=['GET'])
@@ -445,21 +636,30 @@ def transcode_status(filename):
         if not os.path.exists(file_path):
             return jsonify({'error': 'Video file not found'}), 404
         
-        needs_tc = needs_transcoding(file_path)
-        cache_path = get_cache_path(file_path)
+        error = invalid_profile_response()
+        if error:
+            return error
+        
+        profile = resolve_profile(file_path, request.args.get('profile'))
+        strategy = get_playback_strategy(file_path) if profile == DEFAULT_PROFILE else 'transcode'
+        needs_tc = strategy != 'direct'
+        cache_path = get_cache_path(file_path, profile)
         cache_exists = os.path.exists(cache_path)
         
         # Check if there's an active job for this file
-        job_id = get_job_id(file_path)
+        job_id = get_job_id(file_path, profile=profile)
         job_status = get_job_status(job_id)
         transcoding_in_progress = job_status and job_status['status'] in ['pending', 'processing']
         
         return jsonify({
             'needs_transcoding': needs_tc,
+            'strategy': strategy,
+            'profile': profile,
+            'profiles': available_profiles(file_path),
             'cache_exists': cache_exists,
             'transcoding_in_progress': transcoding_in_progress,
             'ready': not needs_tc or cache_exists,
-            'codec': get_video_codec(file_path) if needs_tc else 'h264',
+            'codec': get_video_codec(file_path),
             'job_id': job_id if transcoding_in_progress else None
         })
     except Exception as e:
@@ -475,11 +675,108 @@ def get_transcode_job_status(job_id):
         if not job_status:
             return jsonify({'error': 'Job not found'}), 404
         
-        return jsonify(job_status)
+        response = jsonify(job_status)
+        # Tell pollers when another check is worthwhile instead of hammering the endpoint
+        if job_status['status'] == 'processing' and job_status.get('eta_seconds'):
+            response.headers['Retry-After'] = str(min(max(job_status['eta_seconds'] // 4, 1), 15))
+        elif job_status['status'] == 'pending' and job_status.get('next_attempt_at'):
+            # Backing off after a failure: nothing changes before the retry
+            wait = (datetime.fromisoformat(job_status['next_attempt_at']) - datetime.utcnow()).total_seconds()
+            response.headers['Retry-After'] = str(min(max(int(wait), 2), 60))
+        elif job_status['status'] in ('pending', 'processing'):
+            response.headers['Retry-After'] = '2'
+        return response
     except Exception as e:
         logger.error(f"Error getting job status: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _job_action_response(job, error, action):
+    """Shared response for the cancel/pause/resume job routes"""
+    if error == 'not_found':
+        return jsonify({'error': 'Job not found'}), 404
+    if error == 'invalid_state':
+        return jsonify({'error': f'Cannot {action} a job that is {job.status}', 'job': job.to_dict()}), 409
+    return jsonify(job.to_dict())
+
+@video_bp.route('/transcode-job/<job_id>/cancel', methods=['POST'])
+def cancel_transcode_job(job_id):
+    """Cancel a queued, paused or running transcode; a running ffmpeg is stopped."""
+    try:
+        job, error = cancel_job(job_id)
+        return _job_action_response(job, error, 'cancel')
+    except Exception as e:
+        logger.error(f"Error cancelling job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/transcode-job/<job_id>/pause', methods=['POST'])
+def pause_transcode_job(job_id):
+    """Hold a queued or running transcode until it is resumed."""
+    try:
+        job, error = pause_job(job_id)
+        return _job_action_response(job, error, 'pause')
+    except Exception as e:
+        logger.error(f"Error pausing job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/transcode-job/<job_id>/resume', methods=['POST'])
+def resume_transcode_job(job_id):
+    """Re-queue a paused, cancelled or failed transcode."""
+    try:
+        job, error = resume_job(job_id)
+        return _job_action_response(job, error, 'resume')
+    except Exception as e:
+        logger.error(f"Error resuming job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/transcode-queue', methods=['GET'])
+def get_transcode_queue():
+    """Get transcode worker pool size, queue depth and throughput."""
+    try:
+        return jsonify(get_queue_stats())
+    except Exception as e:
+        logger.error(f"Error getting queue stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/cache-stats', methods=['GET'])
+def get_transcode_cache_stats():
+    """Transcode cache size, budget, pinned entries and hit rate."""
+    try:
+        return jsonify(get_cache_stats())
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/match-cache', methods=['GET'])
+def get_match_cache_stats():
+    """Exercise-to-video match cache size, hit rate and index version."""
+    try:
+        return jsonify(get_match_cache().stats())
+    except Exception as e:
+        logger.error(f"Error getting match cache stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@video_bp.route('/prefetch', methods=['POST'])
+def prefetch_upcoming_videos():
+    """Prepare the next videos of a session or playlist (paths or playlist_id, plus optional start index)."""
+    try:
+        data = request.get_json() or {}
+        
+        if data.get('playlist_id'):
+            paths = playlist_video_paths(data['playlist_id'])
+        else:
+            paths = data.get('paths') or []
+        
+        if not isinstance(paths, list):
+            return jsonify({'error': 'paths must be a list'}), 400
+        
+        paths = paths[int(data.get('start', 0)):]
+        scheduled = schedule_prefetch(paths, limit=int(data['count']) if data.get('count') else None)
+        
+        return jsonify({'status': 'scheduled' if scheduled else 'nothing_to_prefetch'}), 202
+    except Exception as e:
+        logger.error(f"Error scheduling prefetch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @video_bp.route('/transcode', methods=['POST'])
 def trigger_transcode():
     """Trigger transcoding of a video (for pre-caching)."""
@@ -502,13 +799,18 @@ def trigger_transcode():
         if not os.path.exists(file_path):
             return jsonify({'error': 'Video file not found'}), 404
         
-        if not needs_transcoding(file_path):
+        requested = data.get('profile') or DEFAULT_PROFILE
+        if requested not in ENCODE_PROFILES:
+            return jsonify({'error': f'Unknown profile {requested}', 'profiles': list(ENCODE_PROFILES)}), 400
+        profile = resolve_profile(file_path, requested)
+        
+        if profile == DEFAULT_PROFILE and not needs_transcoding(file_path):
             return jsonify({
                 'status': 'not_needed',
-                'message': 'Already H.264, no transcoding needed'
+                'message': 'Already browser-playable, no transcoding needed'
             })
         
-        cache_path = get_cache_path(file_path)
+        cache_path = get_cache_path(file_path, profile)
         if os.path.exists(cache_path):
             return jsonify({
                 'status': 'cached',
@@ -517,17 +819,21 @@ def trigger_transcode():
             })
         
         # Create/get job and enqueue for async processing
-        job, should_enqueue = create_or_get_job(file_path, cache_path)
+        job, should_enqueue = create_or_get_job(
+            file_path, cache_path, priority=PRIORITY_BACKGROUND, profile=profile
+        )
         
         if should_enqueue:
-            enqueue_job(job.id)
-            logger.info(f"Enqueued transcoding job {job.id} for: {file_path}")
+            enqueue_job(job.id, priority=PRIORITY_BACKGROUND)
+            logger.info(f"Enqueued transcoding job {job.id} ({profile}) for: {file_path}")
         
         return jsonify({
             'status': job.status,
             'message': 'Transcoding job created' if should_enqueue else 'Transcoding job already exists',
             'job_id': job.id,
-            'poll_url': f'/api/videos/transcode-job/{job.id}'
+            'profile': profile,
+            'poll_url': f'/api/videos/transcode-job/{job.id}',
+            'hls_url': f'/api/videos/hls/{quote(filename)}/master.m3u8'
         }), 202
     
     except Exception as e:
@@ -711,28 +1017,29 @@ def add_video_to_playlist(playlist_id):
 
 @video_bp.route('/scan', methods=['POST'])
 def scan_video_library():
-    """Scans the video directory and populates the database."""
+    """
+    Incrementally rescans the video directory: unchanged directories are not
+    relisted, the video index is rewritten only when files were added, removed
+    or renamed, and the videos table is synced in batches. ?full=1 relists everything.
+    A scan that would remove all (or most) of the library is refused with 409
+    unless ?force=1 is passed.
+    """
     if not VIDEO_ROOT_PATH or not os.path.exists(VIDEO_ROOT_PATH):
         return jsonify({"error": "VIDEO_ROOT_PATH is not configured or does not exist."}), 500
 
-    video_files = []
-    for root, dirs, files in os.walk(VIDEO_ROOT_PATH):
-        for file in files:
-            if file.lower().endswith(('.mp4', '.avi', '.mov')):
-                video_files.append(os.path.join(root, file))
-
-    for video_path in video_files:
-        relative_path = os.path.relpath(video_path, VIDEO_ROOT_PATH)
-        if not Video.query.filter_by(file_path=relative_path).first():
-            new_video = Video(
-                title=os.path.splitext(os.path.basename(video_path))[0],
-                file_path=relative_path,
-                filename=os.path.basename(video_path)
-            )
-            db.session.add(new_video)
-    
-    db.session.commit()
-    return jsonify({"message": f"Scan complete. Found {len(video_files)} videos."})
+    try:
+        full = request.args.get('full', '').lower() in ('1', 'true', 'yes')
+        force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+        stats = update_library_index(VIDEO_ROOT_PATH, full=full, force=force, sync_db=True)['stats']
+        return jsonify({"message": f"Scan complete. Found {stats['videos']} videos.", "stats": stats})
+    except LibraryScanRefused as e:
+        db.session.rollback()
+        logger.warning(f"Library scan refused: {str(e)}")
+        return jsonify({'error': str(e), 'stats': e.stats}), 409
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Library scan failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 def get_or_create_category_from_path(folder_parts):
     """Get or create video category from folder path."""
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from ..models import db, User, WorkoutTemplate, Exercise, WorkoutSession, ExerciseCompletion  # Updated import
+from ..utils.prefetch import schedule_prefetch, exercise_video_paths
 from datetime import datetime, date
 
 workouts_bp = Blueprint('workouts', __name__)
@@ -168,9 +169,11 @@ def generate_workout(user_id):
         ]
     
     # Add exercises to workout
+    session_exercises = []
     for i, ex_config in enumerate(exercises_config):
         exercise = Exercise.query.filter_by(name=ex_config['name']).first()
         if exercise:
+            session_exercises.append(exercise)
             workout_exercise = ExerciseCompletion(
                 workout_session_id=workout_session.id,
                 exercise_id=exercise.id,
@@ -183,6 +186,9 @@ def generate_workout(user_id):
             db.session.add(workout_exercise)
     
     db.session.commit()
+    
+    # Prepare the session's first videos so they play without waiting on a transcode
+    schedule_prefetch(exercise_video_paths(session_exercises))
     return jsonify(workout_session.to_dict()), 201
 
 @workouts_bp.route('/users/<int:user_id>/workouts/today', methods=['GET'])
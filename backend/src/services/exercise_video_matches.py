@@ -0,0 +1,260 @@
+"""
+Exercise Video Matches Service
+Materialized exercise-to-video matches. A background thread recomputes the
+top matches of every Exercise and of every distinct exercise name the AI
+trainer has generated (TrainerSession.workout_json) whenever the video
+index version changes, and stores them in exercise_video_matches. Request
+time enhancement is then one indexed lookup; names not materialized yet
+(or from an older index) are matched live and added to the table.
+
+A full run also writes a marker row (empty name and category hint) for its
+index version. A process that finds the marker for the current index, and
+no rows from older ones, leaves the table alone instead of recomputing it
+at startup. Runs are serialized across processes with a file lock.
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import tuple_
+from sqlalchemy.exc import SQLAlchemyError
+
+from .video_index import get_video_index
+from .match_cache import normalize_exercise_name
+from .video_matcher import get_video_matcher
+from ..utils.video_transcoder import TRANSCODE_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Matches materialized per exercise name (requests for more are matched live)
+EXERCISE_VIDEO_MATCH_COUNT = int(os.environ.get('EXERCISE_VIDEO_MATCH_COUNT', 5))
+# Seconds between checks of the video index version by the background thread
+EXERCISE_VIDEO_MATCH_CHECK_SECONDS = float(os.environ.get('EXERCISE_VIDEO_MATCH_CHECK_SECONDS', 30))
+
+# Held (non-blocking) by the process materializing; others skip and re-check later
+MATERIALIZE_LOCK_PATH = os.path.join(TRANSCODE_CACHE_DIR, 'exercise_video_matches.lock')
+# (name, category hint) of the row marking a completed run for its index version
+MATERIALIZED_MARKER = ('', '')
+
+_materialize_lock = threading.Lock()
+_materializer_thread = None
+_stats = {'runs': 0, 'names': 0, 'last_run_at': None, 'last_run_ms': None, 'index_version': None}
+
+def _key(exercise):
+    """(normalized name, category hint or '') of an exercise name or dict"""
+    if isinstance(exercise, str):
+        return normalize_exercise_name(exercise), ''
+    return normalize_exercise_name(exercise.get('name')), exercise.get('category_hint') or ''
+
+def collect_exercise_keys():
+    """Distinct (name, category hint) of every Exercise and every AI-generated workout exercise"""
+    from ..models import db, Exercise
+    from ..models.models import TrainerSession
+
+    keys = {(normalize_exercise_name(name), '') for (name,) in db.session.query(Exercise.name)}
+    for (workout_json,) in db.session.query(TrainerSession.workout_json):
+        try:
+            workout = json.loads(workout_json or '{}')
+        except (TypeError, ValueError):
+            continue
+        for section in ['warmup', 'main', 'cooldown']:
+            for exercise in workout.get(section) or []:
+                if isinstance(exercise, dict) and exercise.get('name'):
+                    keys.add(_key(exercise))
+    keys.discard(MATERIALIZED_MARKER)
+    return sorted(keys)
+
+def _rows(keys, all_matches, version, computed_at):
+    rows = []
+    for (name, category_hint), matches in zip(keys, all_matches):
+        if not matches:
+            rows.append({'exercise_name': name, 'category_hint': category_hint, 'rank': 0,
+                         'index_version': version, 'computed_at': computed_at})
+        for rank, match in enumerate(matches):
+            rows.append({
+                'exercise_name': name,
+                'category_hint': category_hint,
+                'rank': rank,
+                'video_key': match['id'],
+                'video_path': match['path'],
+                'filename': match['filename'],
+                'category': match['category'],
+                'subcategory': match.get('subcategory'),
+                'match_score': match['match_score'],
+                'index_version': version,
+                'computed_at': computed_at
+            })
+    return rows
+
+def _is_materialized(version):
+    """True if a completed run for version is in the table and no older rows remain"""
+    from ..models import ExerciseVideoMatch
+
+    name, category_hint = MATERIALIZED_MARKER
+    marker = ExerciseVideoMatch.query.filter_by(
+        exercise_name=name, category_hint=category_hint, index_version=version
+    ).first()
+    if marker is None:
+        return False
+    return ExerciseVideoMatch.query.filter(ExerciseVideoMatch.index_version != version).first() is None
+
+def _live_keys(version):
+    """Names matched live (and written back) for version, which a rerun must keep"""
+    from ..models import db, ExerciseVideoMatch
+
+    return {
+        key for key in db.session.query(ExerciseVideoMatch.exercise_name, ExerciseVideoMatch.category_hint)
+        .filter(ExerciseVideoMatch.index_version == version).distinct()
+    } - {MATERIALIZED_MARKER}
+
+def materialize_matches(force=False):
+    """
+    Recompute the table from the current index in one transaction, unless it
+    already holds a completed run for that index. Skips while another process
+    is materializing. Needs an app context. Returns run stats.
+    """
+    from ..models import db, ExerciseVideoMatch
+
+    with _materialize_lock:
+        index = get_video_index()
+        version = index.version_key
+        if not version or not len(index):
+            return {'status': 'no_index'}
+        if not force and _stats['index_version'] == version:
+            return {'status': 'up_to_date', 'index_version': version}
+
+        os.makedirs(os.path.dirname(MATERIALIZE_LOCK_PATH), exist_ok=True)
+        with open(MATERIALIZE_LOCK_PATH, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                logger.info("Video matches are being materialized by another process")
+                return {'status': 'busy', 'index_version': version}
+            try:
+                if not force and _is_materialized(version):
+                    _stats['index_version'] = version
+                    return {'status': 'up_to_date', 'index_version': version}
+
+                start = time.perf_counter()
+                keys = sorted(set(collect_exercise_keys()) | _live_keys(version))
+                all_matches = get_video_matcher().match_many(
+                    [{'name': name, 'category_hint': category_hint} for name, category_hint in keys],
+                    max_results=EXERCISE_VIDEO_MATCH_COUNT
+                )
+                computed_at = datetime.utcnow()
+                rows = _rows(keys, all_matches, version, computed_at)
+                rows += _rows([MATERIALIZED_MARKER], [[]], version, computed_at)
+                try:
+                    db.session.query(ExerciseVideoMatch).delete(synchronize_session=False)
+                    db.session.bulk_insert_mappings(ExerciseVideoMatch, rows)
+                    db.session.commit()
+                except SQLAlchemyError:
+                    db.session.rollback()
+                    raise
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        _stats.update(runs=_stats['runs'] + 1, names=len(keys), last_run_at=datetime.utcnow().isoformat(),
+                      last_run_ms=elapsed_ms, index_version=version)
+        logger.info(f"Materialized video matches for {len(keys)} exercise names ({len(rows)} rows) "
+                    f"in {elapsed_ms} ms for index {version}")
+        return {'status': 'materialized', 'names': len(keys), 'rows': len(rows),
+                'elapsed_ms': elapsed_ms, 'index_version': version}
+
+def lookup_matches(exercises, max_results=3):
+    """
+    Matches for many exercises (names or dicts with name/category_hint), in
+    order: one indexed query against the table, live matching (written back)
+    for names it doesn't cover for the current index. Needs an app context.
+    """
+    from ..models import ExerciseVideoMatch
+
+    keys = [_key(exercise) for exercise in exercises]
+    version = get_video_index().version_key
+    found = {}
+    if version and max_results <= EXERCISE_VIDEO_MATCH_COUNT:
+        distinct_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(distinct_keys), 400):
+            rows = ExerciseVideoMatch.query.filter(
+                tuple_(ExerciseVideoMatch.exercise_name, ExerciseVideoMatch.category_hint).in_(
+                    distinct_keys[start:start + 400]
+                ),
+                ExerciseVideoMatch.rank < max_results,
+                ExerciseVideoMatch.index_version == version
+            ).order_by(ExerciseVideoMatch.rank)
+            for row in rows:
+                matches = found.setdefault((row.exercise_name, row.category_hint), [])
+                if row.video_path is not None:
+                    matches.append(row.to_match())
+
+    # Nameless exercises match nothing (and must not overwrite the marker row)
+    found[MATERIALIZED_MARKER] = []
+    missing = [key for key in dict.fromkeys(keys) if key not in found]
+    if missing:
+        live = get_video_matcher().match_many(
+            [{'name': name, 'category_hint': category_hint} for name, category_hint in missing],
+            max_results=max(max_results, EXERCISE_VIDEO_MATCH_COUNT)
+        )
+        for key, matches in zip(missing, live):
+            found[key] = matches[:max_results]
+        if version:
+            _store_live_matches(missing, live, version)
+        logger.info(f"Matched {len(missing)} exercise names live (not materialized for the current index)")
+
+    return [[dict(match) for match in found[key]] for key in keys]
+
+def _store_live_matches(keys, all_matches, version):
+    """Add live matches to the table so the next request finds them"""
+    from ..models import db, ExerciseVideoMatch
+
+    try:
+        for start in range(0, len(keys), 400):
+            ExerciseVideoMatch.query.filter(
+                tuple_(ExerciseVideoMatch.exercise_name, ExerciseVideoMatch.category_hint).in_(keys[start:start + 400])
+            ).delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(ExerciseVideoMatch, _rows(
+            keys, [matches[:EXERCISE_VIDEO_MATCH_COUNT] for matches in all_matches], version, datetime.utcnow()
+        ))
+        db.session.commit()
+    except SQLAlchemyError as e:
+        # Another request or the materializer wrote them first
+        db.session.rollback()
+        logger.debug(f"Could not store live video matches: {e}")
+
+def enhance_workout_with_videos(workout_data):
+    """VideoMatcher.enhance_workout_with_videos, served from the materialized matches"""
+    return get_video_matcher().enhance_workout_with_videos(workout_data, match_many=lookup_matches)
+
+def get_materializer_stats():
+    return dict(_stats, running=bool(_materializer_thread and _materializer_thread.is_alive()),
+                match_count=EXERCISE_VIDEO_MATCH_COUNT)
+
+def _materializer_loop(app):
+    while True:
+        with app.app_context():
+            try:
+                materialize_matches()
+            except Exception as e:
+                logger.error(f"Video match materialization failed: {str(e)}")
+            finally:
+                from ..models import db
+                db.session.remove()
+        time.sleep(EXERCISE_VIDEO_MATCH_CHECK_SECONDS)
+
+def start_materializer(app):
+    """Start the background thread that re-materializes matches when the index changes"""
+    global _materializer_thread
+
+    if _materializer_thread and _materializer_thread.is_alive():
+        return
+    _materializer_thread = threading.Thread(
+        target=_materializer_loop, args=(app,), daemon=True, name="VideoMatchMaterializer"
+    )
+    _materializer_thread.start()
+    logger.info(f"Started video match materializer (checking every {EXERCISE_VIDEO_MATCH_CHECK_SECONDS:g}s)")
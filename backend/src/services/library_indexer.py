@@ -0,0 +1,301 @@
+"""
+Library Indexer Service
+Incremental scan of VIDEO_ROOT_PATH that keeps video_index.json/.db and the
+videos table in step with the files on disk.
+
+Each directory's mtime is remembered in a small SQLite sidecar together with
+the video files (size, mtime) and subdirectories it held. A directory whose
+mtime is unchanged is not listed again, so a rescan costs one stat per
+directory rather than per file. Directories are still descended into, since
+a change deep in the tree doesn't touch the mtimes of its ancestors.
+
+The scan is diffed against the current index by path. A removed path and an
+added path with the same unique (size, mtime) are a rename: the entry keeps
+its index id and the video row is updated in place rather than replaced.
+
+A scan that finds no files, or would drop more than LIBRARY_SCAN_MAX_REMOVED
+of a non-empty index (an unmounted share looks exactly like a deleted
+library), is refused with LibraryScanRefused unless forced.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from .video_index import (
+    category_for_path, current_index_file, has_video_index, load_video_index,
+    video_entry, video_key, write_video_index
+)
+from ..utils.video_transcoder import TRANSCODE_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm')
+
+# Directory mtimes and listings from the previous scan
+LIBRARY_SCAN_STATE_PATH = os.environ.get(
+    'LIBRARY_SCAN_STATE_PATH', os.path.join(TRANSCODE_CACHE_DIR, 'library_scan.db')
+)
+# Video rows inserted/updated/deleted per statement batch
+LIBRARY_SCAN_BATCH_SIZE = int(os.environ.get('LIBRARY_SCAN_BATCH_SIZE', 500))
+# Largest share of indexed videos a scan may remove without force=True
+LIBRARY_SCAN_MAX_REMOVED = float(os.environ.get('LIBRARY_SCAN_MAX_REMOVED', 0.5))
+
+# One scan at a time per process; the state file and index are rewritten whole
+_scan_lock = threading.Lock()
+
+class LibraryScanRefused(RuntimeError):
+    """A scan would remove too much of the library; nothing was changed"""
+
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+def check_removals(total, removed, found, force=False):
+    """Raise LibraryScanRefused if removing `removed` of `total` known videos looks like a missing library"""
+    if force or not total or not removed:
+        return
+    stats = {'videos': found, 'indexed': total, 'removed': removed}
+    if not found:
+        raise LibraryScanRefused(
+            f"Scan found no videos but {total} are indexed; is the library mounted? "
+            f"Rescan with force to remove them", stats
+        )
+    if removed > total * LIBRARY_SCAN_MAX_REMOVED:
+        raise LibraryScanRefused(
+            f"Scan would remove {removed} of {total} indexed videos "
+            f"(more than {LIBRARY_SCAN_MAX_REMOVED:.0%}); rescan with force to apply", stats
+        )
+
+class ScanState:
+    """Per-directory listings of the last scan of one library root"""
+
+    def __init__(self, path=None):
+        self.path = path or LIBRARY_SCAN_STATE_PATH
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                files TEXT NOT NULL,
+                subdirs TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def load(self, root):
+        """{dir: (mtime_ns, {filename: [size, mtime_ns]}, [subdir names])}, empty if root changed"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+        if not row or row[0] != os.path.abspath(root):
+            return {}
+        return {
+            path: (mtime_ns, json.loads(files), json.loads(subdirs))
+            for path, mtime_ns, files, subdirs in self.conn.execute("SELECT path, mtime_ns, files, subdirs FROM dirs")
+        }
+
+    def save(self, root, changed, removed, reset=False):
+        """Write the directories that were relisted and drop the ones that are gone"""
+        with self.conn:
+            if reset:
+                self.conn.execute("DELETE FROM dirs")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('root', ?)",
+                              (os.path.abspath(root),))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO dirs (path, mtime_ns, files, subdirs) VALUES (?, ?, ?, ?)",
+                [(path, mtime_ns, json.dumps(files), json.dumps(subdirs))
+                 for path, (mtime_ns, files, subdirs) in changed.items()]
+            )
+            self.conn.executemany("DELETE FROM dirs WHERE path = ?", [(path,) for path in removed])
+
+    def close(self):
+        self.conn.close()
+
+def is_video_file(name):
+    return name.lower().endswith(VIDEO_EXTENSIONS)
+
+def list_directory(path):
+    """Video files ({name: [size, mtime_ns]}) and subdirectory names of one directory"""
+    files, subdirs = {}, []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                # Symlinked directories aren't followed, as with os.walk
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif is_video_file(entry.name) and entry.is_file():
+                    stat_result = entry.stat()
+                    files[entry.name] = [stat_result.st_size, stat_result.st_mtime_ns]
+            except OSError as e:
+                logger.warning(f"Skipping {entry.path}: {e}")
+    return files, sorted(subdirs)
+
+def walk_library(root, previous, full=False):
+    """
+    Walk root, relisting only directories whose mtime changed since `previous`.
+    Returns ({relative path: [size, mtime_ns]}, relisted dirs, vanished dirs, stats)
+    """
+    files, changed, seen = {}, {}, set()
+    stats = {'dirs_listed': 0, 'dirs_reused': 0}
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            mtime_ns = os.stat(os.path.join(root, rel_dir) if rel_dir else root).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Skipping {rel_dir or root}: {e}")
+            continue
+        seen.add(rel_dir)
+
+        cached = previous.get(rel_dir)
+        if cached and not full and cached[0] == mtime_ns:
+            _, dir_files, subdirs = cached
+            stats['dirs_reused'] += 1
+        else:
+            try:
+                dir_files, subdirs = list_directory(os.path.join(root, rel_dir) if rel_dir else root)
+            except OSError as e:
+                logger.warning(f"Skipping {rel_dir or root}: {e}")
+                continue
+            changed[rel_dir] = (mtime_ns, dir_files, subdirs)
+            stats['dirs_listed'] += 1
+
+        prefix = f'{rel_dir}/' if rel_dir else ''
+        for name, info in dir_files.items():
+            files[prefix + name] = info
+        stack.extend(prefix + name for name in reversed(subdirs))
+
+    removed = [path for path in previous if path not in seen]
+    return files, changed, removed, stats
+
+def previous_files(previous):
+    """{relative path: [size, mtime_ns]} as of the previous scan"""
+    files = {}
+    for rel_dir, (_, dir_files, _) in previous.items():
+        prefix = f'{rel_dir}/' if rel_dir else ''
+        for name, info in dir_files.items():
+            files[prefix + name] = info
+    return files
+
+def match_renames(removed, added, old_files, new_files):
+    """Pair removed and added paths whose (size, mtime) is unique on both sides"""
+    def by_signature(paths, stats):
+        signatures = {}
+        for path in paths:
+            info = stats.get(path)
+            if info:
+                signatures.setdefault(tuple(info), []).append(path)
+        return {signature: paths[0] for signature, paths in signatures.items() if len(paths) == 1}
+
+    removed_by_signature = by_signature(removed, old_files)
+    return {
+        removed_by_signature[signature]: path
+        for signature, path in by_signature(added, new_files).items()
+        if signature in removed_by_signature
+    }
+
+def update_library_index(root, full=False, state_path=None, force=False, sync_db=False):
+    """
+    Scan root incrementally and rewrite the video index if anything changed.
+    With sync_db (needs an app context) the videos table is synced first, so
+    its removal check also runs before the index or scan state are written.
+    Returns a summary with the current files, the renames found and scan stats.
+    Raises LibraryScanRefused, leaving index, scan state and table untouched,
+    when the scan would remove (nearly) everything and force is not set.
+    """
+    if not root or not os.path.isdir(root):
+        raise FileNotFoundError(f"Video library root {root!r} does not exist")
+
+    with _scan_lock:
+        start = time.perf_counter()
+        state = ScanState(state_path)
+        try:
+            previous = state.load(root)
+            files, changed, removed_dirs, stats = walk_library(root, previous, full)
+
+            index_data = load_video_index(current_index_file()) if has_video_index() else {'videos': []}
+            indexed = {video['path']: video for video in index_data.get('videos', [])}
+            added = [path for path in files if path not in indexed]
+            removed = [path for path in indexed if path not in files]
+            renamed = match_renames(removed, added, previous_files(previous), files)
+            check_removals(len(indexed), len(removed) - len(renamed), len(files), force)
+            # Synced before anything is written: if the table refuses the scan, the
+            # next incremental scan still sees the same changes
+            table_stats = sync_video_table(files, renamed, force=force) if sync_db else {}
+
+            index_written = bool(added or removed) or not has_video_index()
+            if index_written:
+                keys = {new: indexed[old]['id'] for old, new in renamed.items()}
+                videos = []
+                for path in sorted(files):
+                    key = indexed[path]['id'] if path in indexed else keys.get(path) or video_key(path)
+                    videos.append(video_entry(key, path, category_for_path(path)))
+                write_video_index({
+                    'videos': videos,
+                    'categories': sorted({video['category'] for video in videos})
+                })
+
+            # The state is only advanced once the index reflects it
+            state.save(root, changed, removed_dirs, reset=not previous)
+        finally:
+            state.close()
+
+        stats.update({
+            'videos': len(files),
+            'added': len(added) - len(renamed),
+            'removed': len(removed) - len(renamed),
+            'renamed': len(renamed),
+            'index_written': index_written,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+        }, **table_stats)
+        logger.info(f"Library scan of {root}: {stats}")
+        return {'files': files, 'renamed': renamed, 'stats': stats}
+
+def sync_video_table(files, renamed=None, batch_size=None, force=False):
+    """
+    Bring the videos table in line with a scan: insert rows for new paths,
+    repoint renamed ones and delete rows for files that are gone. Rows still
+    referenced by a workout mapping or playlist are kept and counted as missing.
+    Refuses (LibraryScanRefused) to drop most of the table unless forced.
+    Needs an app context.
+    """
+    from ..models import db, Video, WorkoutVideoMapping, VideoPlaylistItem
+
+    batch_size = batch_size or LIBRARY_SCAN_BATCH_SIZE
+    existing = dict(db.session.query(Video.file_path, Video.id).all())
+
+    updates = []
+    for old_path, new_path in (renamed or {}).items():
+        if old_path in existing and new_path not in existing:
+            updates.append({'id': existing[old_path], 'file_path': new_path,
+                            'filename': os.path.basename(new_path), 'file_size': files[new_path][0]})
+            existing[new_path] = existing.pop(old_path)
+
+    inserts = []
+    for path in files:
+        if path not in existing:
+            filename = os.path.basename(path)
+            inserts.append({'title': os.path.splitext(filename)[0], 'file_path': path,
+                            'filename': filename, 'file_size': files[path][0]})
+
+    gone = {video_id for path, video_id in existing.items() if path not in files}
+    check_removals(len(existing), len(gone), len(files), force)
+    referenced = set()
+    if gone:
+        referenced = {video_id for (video_id,) in db.session.query(WorkoutVideoMapping.video_id).distinct()}
+        referenced.update(video_id for (video_id,) in db.session.query(VideoPlaylistItem.video_id).distinct())
+    deletes = sorted(gone - referenced)
+
+    for i in range(0, len(inserts), batch_size):
+        db.session.bulk_insert_mappings(Video, inserts[i:i + batch_size])
+    for i in range(0, len(updates), batch_size):
+        db.session.bulk_update_mappings(Video, updates[i:i + batch_size])
+    for i in range(0, len(deletes), batch_size):
+        Video.query.filter(Video.id.in_(deletes[i:i + batch_size])).delete(synchronize_session=False)
+    db.session.commit()
+
+    return {'inserted': len(inserts), 'updated': len(updates),
+            'deleted': len(deletes), 'missing': len(gone) - len(deletes)}
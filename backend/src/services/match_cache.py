@@ -0,0 +1,172 @@
+"""
+Match Cache Service
+Memoized exercise-to-video matches. AI trainer exercise names repeat
+constantly, so results are kept in an in-process LRU keyed on
+(index version, normalized name, category hint, max results) and written
+through to a small SQLite file so warm results survive restarts.
+
+The index version is part of every key, so a changed video index never
+serves stale matches; the first lookup against a new version also drops
+the entries of older ones, in memory and on disk.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from ..utils.video_transcoder import TRANSCODE_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Matches kept in memory (least recently used are dropped first)
+MATCH_CACHE_SIZE = int(os.environ.get('MATCH_CACHE_SIZE', 4096))
+# Persistent copy of the cache; empty to keep it in memory only
+MATCH_CACHE_PATH = os.environ.get('MATCH_CACHE_PATH', os.path.join(TRANSCODE_CACHE_DIR, 'match_cache.db'))
+
+def normalize_exercise_name(name):
+    """Lowercased name with whitespace collapsed, as matched and cached"""
+    return ' '.join((name or '').lower().split())
+
+class MatchCache:
+    def __init__(self, max_entries=None, path=None):
+        self.max_entries = MATCH_CACHE_SIZE if max_entries is None else max_entries
+        self.path = MATCH_CACHE_PATH if path is None else path
+        self.entries = OrderedDict()  # (version, name, category, max_results) -> matches
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _db(self):
+        """Per-thread connection to the persistent cache, or None if persistence is off"""
+        if not self.path:
+            return None
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS match_cache (
+                    version TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    max_results INTEGER NOT NULL,
+                    matches TEXT NOT NULL,
+                    PRIMARY KEY (version, name, category, max_results)
+                )
+            """)
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _use_version(self, version):
+        """Drop entries of other index versions the first time a new one is seen"""
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self.entries.clear()
+        try:
+            conn = self._db()
+            if conn:
+                conn.execute("DELETE FROM match_cache WHERE version != ?", (version,))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not prune match cache: {e}")
+        logger.info(f"Match cache reset for video index version {version}")
+
+    def get(self, version, name, category_hint, max_results):
+        """Cached matches (copies) or None"""
+        self._use_version(version)
+        key = (version, name, category_hint or '', max_results)
+        with self._lock:
+            matches = self.entries.get(key)
+            if matches is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return [dict(match) for match in matches]
+
+        try:
+            conn = self._db()
+            row = conn.execute(
+                "SELECT matches FROM match_cache WHERE version = ? AND name = ? AND category = ? AND max_results = ?",
+                key
+            ).fetchone() if conn else None
+        except sqlite3.Error as e:
+            logger.warning(f"Match cache lookup failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            matches = json.loads(row[0])
+            self._remember(key, matches)
+        return [dict(match) for match in matches]
+
+    def put(self, version, name, category_hint, max_results, matches):
+        self._use_version(version)
+        key = (version, name, category_hint or '', max_results)
+        matches = [dict(match) for match in matches]
+        with self._lock:
+            self._remember(key, matches)
+        try:
+            conn = self._db()
+            if conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO match_cache (version, name, category, max_results, matches) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    key + (json.dumps(matches),)
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist match: {e}")
+
+    def _remember(self, key, matches):
+        """Insert into the LRU (caller holds the lock)"""
+        self.entries[key] = matches
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+        try:
+            conn = self._db()
+            if conn:
+                conn.execute("DELETE FROM match_cache")
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not clear match cache: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'persistent': bool(self.path),
+                'index_version': self.version
+            }
+
+# Global instance
+_cache = None
+
+def get_match_cache():
+    """Get or create the global match cache"""
+    global _cache
+    if _cache is None:
+        _cache = MatchCache()
+    return _cache
@@ -0,0 +1,390 @@
+"""
+Video Index Service
+Process-wide snapshot of video_index.json: an inverted index shared by the
+library routes, the video server and the video matcher, plus memoized views
+(by id, by category, category counts). The file's mtime is checked at most
+every VIDEO_INDEX_CHECK_SECONDS and a changed file is parsed into a new
+snapshot that replaces the old one in a single assignment, so readers never
+see a half-built index.
+
+scripts/index_videos.py also writes video_index.db, a compact SQLite form
+with interned category and folder strings and no derived fields (about a
+fifth the size of the JSON). When it is at least as new as the JSON it is
+read instead; it is only an alternative file format, loaded in full into
+the same per-process snapshot at about the cost of parsing the JSON.
+
+Search queries are tokenized and every term must match (AND) as a whole
+token, a token prefix or a substring found through trigram postings; hits
+are ranked by the field they matched in (filename > category > path)
+"""
+
+import os
+import re
+import json
+import time
+import heapq
+import hashlib
+import bisect
+import sqlite3
+import logging
+import threading
+from functools import cached_property
+
+logger = logging.getLogger(__name__)
+
+VIDEO_INDEX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'video_index.json'
+)
+VIDEO_INDEX_DB_PATH = os.path.splitext(VIDEO_INDEX_PATH)[0] + '.db'
+# Layout version of video_index.db; loaders reject files they don't understand
+COMPACT_FORMAT_VERSION = 1
+
+# Seconds between checks of video_index.json for changes
+VIDEO_INDEX_CHECK_SECONDS = float(os.environ.get('VIDEO_INDEX_CHECK_SECONDS', 2))
+
+# Score of a term matching in each field
+FIELD_WEIGHTS = {'filename': 3.0, 'category': 2.0, 'path': 1.0}
+# Multiplier by how well a term matched a token
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.75
+SUBSTRING_MATCH = 0.5
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens of text"""
+    return _TOKEN_RE.findall((text or '').lower())
+
+def trigrams(token):
+    """Set of 3-character substrings of a token"""
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+def video_key(path):
+    """Index id of a library-relative path"""
+    return hashlib.md5(path.encode()).hexdigest()[:12]
+
+def category_for_path(path):
+    """Category of a library-relative path: its top-level folder without the leading !"""
+    return path.split('/')[0].lstrip('!')
+
+def video_entry(key, path, category, filename=None):
+    """
+    Index entry for a library-relative path. subcategory and searchable are
+    derived from the path, so the compact index doesn't store them
+    """
+    filename = filename or path.rpartition('/')[2]
+    parts = path.split('/', 2)
+    subcategory = parts[1].lstrip('!') if len(parts) > 1 else None
+    searchable_parts = [filename.lower(), path.lower()]
+    if category:
+        searchable_parts.append(category.lower())
+    if subcategory:
+        searchable_parts.append(subcategory.lower())
+    return {
+        'id': key,
+        'filename': filename,
+        'path': path,
+        'category': category,
+        'subcategory': subcategory,
+        'searchable': ' '.join(searchable_parts)
+    }
+
+def load_video_index(path=None):
+    """Parse video_index.json (or a compact .db index); a missing file is an empty library"""
+    path = path or VIDEO_INDEX_PATH
+    if path.endswith('.db'):
+        return load_compact_index(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'videos': [], 'categories': []}
+
+def write_video_index(index_data, json_path=None, db_path=None):
+    """
+    Write video_index.json and its compact form, each through a temp file
+    renamed into place so running servers never load a half-written index
+    """
+    json_path = json_path or VIDEO_INDEX_PATH
+    temp_path = json_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index_data, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, json_path)
+    # Written second, so it is never older than the JSON and is what gets loaded
+    return json_path, write_compact_index(index_data, db_path or os.path.splitext(json_path)[0] + '.db')
+
+def write_compact_index(index_data, path=None):
+    """Write the compact SQLite form of an index, replacing any previous file atomically"""
+    path = path or VIDEO_INDEX_DB_PATH
+    temp_path = path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    
+    category_ids = {}
+    folder_ids = {}
+    for name in index_data.get('categories') or []:
+        category_ids.setdefault(name, len(category_ids) + 1)
+    rows = []
+    for video in index_data.get('videos', []):
+        folder, filename = os.path.split(video['path'])
+        category = video.get('category')
+        category_id = category_ids.setdefault(category, len(category_ids) + 1) if category else None
+        rows.append((video['id'], folder_ids.setdefault(folder, len(folder_ids) + 1), filename, category_id))
+    
+    conn = sqlite3.connect(temp_path)
+    try:
+        conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+            CREATE TABLE folders (id INTEGER PRIMARY KEY, path TEXT NOT NULL);
+            CREATE TABLE videos (
+                key TEXT NOT NULL,
+                folder_id INTEGER NOT NULL REFERENCES folders(id),
+                filename TEXT NOT NULL,
+                category_id INTEGER REFERENCES categories(id)
+            );
+            CREATE INDEX idx_videos_category ON videos(category_id);
+        """)
+        conn.executemany("INSERT INTO categories (id, name) VALUES (?, ?)",
+                         [(category_id, name) for name, category_id in category_ids.items()])
+        conn.executemany("INSERT INTO folders (id, path) VALUES (?, ?)",
+                         [(folder_id, folder) for folder, folder_id in folder_ids.items()])
+        conn.executemany("INSERT INTO videos (key, folder_id, filename, category_id) VALUES (?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ('format', str(COMPACT_FORMAT_VERSION)),
+            ('video_count', str(len(rows))),
+            ('built_at', str(int(time.time())))
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(temp_path, path)
+    return path
+
+def load_compact_index(path=None):
+    """Read a compact .db index back into video_index.json's structure"""
+    path = path or VIDEO_INDEX_DB_PATH
+    if not os.path.exists(path):
+        return {'videos': [], 'categories': []}
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        if meta.get('format') != str(COMPACT_FORMAT_VERSION):
+            raise ValueError(f"Unsupported video index format {meta.get('format')} in {path}")
+        categories = dict(conn.execute("SELECT id, name FROM categories"))
+        folders = dict(conn.execute("SELECT id, path FROM folders"))
+        videos = [
+            video_entry(key, f'{folders[folder_id]}/{filename}' if folders[folder_id] else filename,
+                        categories.get(category_id), filename)
+            for key, folder_id, filename, category_id in
+            conn.execute("SELECT key, folder_id, filename, category_id FROM videos ORDER BY rowid")
+        ]
+    except sqlite3.Error as e:
+        raise ValueError(f"Unreadable video index {path}: {e}")
+    finally:
+        conn.close()
+    return {'videos': videos, 'categories': sorted(categories.values())}
+
+def index_file_version(path=None):
+    """(path, mtime_ns, size) of an index file, or None if it doesn't exist"""
+    path = path or VIDEO_INDEX_PATH
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return path, stat_result.st_mtime_ns, stat_result.st_size
+
+def current_index_file():
+    """The compact index when it is at least as new as the JSON, otherwise the JSON"""
+    json_version = index_file_version(VIDEO_INDEX_PATH)
+    db_version = index_file_version(VIDEO_INDEX_DB_PATH)
+    if db_version and (json_version is None or db_version[1] >= json_version[1]):
+        return VIDEO_INDEX_DB_PATH
+    return VIDEO_INDEX_PATH
+
+def has_video_index():
+    """Whether an index file exists at all (routes fall back to the database otherwise)"""
+    return os.path.exists(VIDEO_INDEX_PATH) or os.path.exists(VIDEO_INDEX_DB_PATH)
+
+class VideoSearchIndex:
+    """
+    Immutable snapshot of the library: token postings plus a sorted vocabulary
+    (prefixes) and trigram postings (substrings). version identifies the file
+    it was built from; derived views are computed on first use
+    """
+
+    def __init__(self, videos, categories=None, version=None):
+        self.videos = videos
+        self.version = version
+        self.categories = categories if categories is not None else sorted(
+            {video.get('category') for video in videos if video.get('category')}
+        )
+        # Lowercased text of each video, for callers that still do substring checks
+        self.search_text = []
+        self.postings = {}  # token -> {video position: best field weight}
+
+        for position, video in enumerate(videos):
+            path = video.get('path') or ''
+            filename = video.get('filename') or os.path.basename(path)
+            self.search_text.append(
+                (video.get('searchable') or f"{filename} {path} {video.get('category') or ''}").lower()
+            )
+            fields = (
+                ('filename', os.path.splitext(filename)[0]),
+                ('category', video.get('category')),
+                ('path', os.path.dirname(path))
+            )
+            for field, text in fields:
+                weight = FIELD_WEIGHTS[field]
+                for token in tokenize(text):
+                    docs = self.postings.setdefault(token, {})
+                    if docs.get(position, 0) < weight:
+                        docs[position] = weight
+
+        self.vocabulary = sorted(self.postings)
+        self.trigram_postings = {}  # trigram -> tokens containing it
+        for token in self.vocabulary:
+            for gram in trigrams(token):
+                self.trigram_postings.setdefault(gram, []).append(token)
+
+    @classmethod
+    def from_file(cls, path=None):
+        path = path or current_index_file()
+        # Stat first: if the file changes while we parse, the next check rebuilds again
+        version = index_file_version(path)
+        data = load_video_index(path)
+        return cls(data.get('videos', []), data.get('categories'), version)
+
+    def __len__(self):
+        return len(self.videos)
+
+    @cached_property
+    def version_key(self):
+        """version as a string for caches and tables keyed on it (None for in-memory indexes)"""
+        return ':'.join(str(part) for part in self.version) if self.version else None
+
+    @cached_property
+    def by_id(self):
+        """Video entry by index id"""
+        return {video.get('id'): video for video in self.videos}
+
+    @cached_property
+    def by_category(self):
+        """Video entries grouped by category, in index order"""
+        groups = {}
+        for video in self.videos:
+            groups.setdefault(video.get('category', 'Uncategorized'), []).append(video)
+        return groups
+
+    @cached_property
+    def category_counts(self):
+        """[(category, video count)] sorted by category name"""
+        return sorted((name, len(videos)) for name, videos in self.by_category.items())
+
+    def matching_tokens(self, term):
+        """Vocabulary tokens a query term matches, with their match quality"""
+        matches = {}
+        # Prefixes sit right after the term itself in the sorted vocabulary
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches[token] = EXACT_MATCH if token == term else PREFIX_MATCH
+
+        if len(term) >= 3:
+            # Substrings: intersect the tokens holding each trigram, rarest first, then verify
+            grams = sorted(trigrams(term), key=lambda gram: len(self.trigram_postings.get(gram, ())))
+            candidates = set(self.trigram_postings.get(grams[0], ()))
+            for gram in grams[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(self.trigram_postings.get(gram, ()))
+            for token in candidates:
+                if token not in matches and term in token:
+                    matches[token] = SUBSTRING_MATCH
+        return matches
+
+    def term_scores(self, term):
+        """{video position: score} for one query term"""
+        scores = {}
+        for token, quality in self.matching_tokens(term).items():
+            for position, weight in self.postings[token].items():
+                score = weight * quality
+                if scores.get(position, 0) < score:
+                    scores[position] = score
+        return scores
+
+    def search(self, query, offset=0, limit=None, category=None):
+        """
+        Videos matching every term of query, best first.
+        Returns (total matches, videos in the offset/limit window).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+
+        per_term = sorted((self.term_scores(term) for term in terms), key=len)
+        totals = dict(per_term[0])
+        for scores in per_term[1:]:
+            if not totals:
+                break
+            totals = {position: total + scores[position]
+                      for position, total in totals.items() if position in scores}
+
+        if category:
+            totals = {position: total for position, total in totals.items()
+                      if self.videos[position].get('category') == category}
+
+        def rank(position):
+            video = self.videos[position]
+            return -totals[position], (video.get('filename') or '').lower(), video.get('path') or ''
+
+        if limit is None:
+            ordered = sorted(totals, key=rank)[offset:]
+        else:
+            ordered = heapq.nsmallest(offset + limit, totals, key=rank)[offset:]
+        return len(totals), [self.videos[position] for position in ordered]
+
+# Global snapshot
+_index = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+def _build_snapshot():
+    global _index
+    started = time.perf_counter()
+    snapshot = VideoSearchIndex.from_file()
+    _index = snapshot  # Atomic swap: requests holding the old snapshot finish with it
+    logger.info(f"Loaded video index snapshot from {os.path.basename(snapshot.version[0]) if snapshot.version else 'nothing'}: "
+                f"{len(snapshot)} videos, {len(snapshot.vocabulary)} tokens "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return snapshot
+
+def get_video_index():
+    """
+    Current snapshot of video_index.json, rebuilt when the file changes.
+    Only one thread rebuilds; the others keep serving the previous snapshot.
+    """
+    global _index_checked_at
+    snapshot = _index
+    if snapshot is None:
+        with _index_lock:
+            if _index is None:
+                _index_checked_at = time.monotonic()
+                return _build_snapshot()
+            return _index
+
+    now = time.monotonic()
+    if now - _index_checked_at < VIDEO_INDEX_CHECK_SECONDS or not _index_lock.acquire(blocking=False):
+        return snapshot
+    try:
+        _index_checked_at = now
+        if index_file_version(current_index_file()) != _index.version:
+            try:
+                return _build_snapshot()
+            except (OSError, ValueError) as e:
+                # Caught mid-write or corrupt: keep serving what we have and retry on the next check
+                logger.warning(f"Could not reload video index, keeping previous snapshot: {e}")
+        return _index
+    finally:
+        _index_lock.release()
@@ -1,37 +1,224 @@
 """
 Video Matcher Service
 Matches exercise names to videos in the library using fuzzy matching
+
+A video's score is its best SequenceMatcher ratio against the exercise name
+(filename, searchable text or subcategory) plus 0.1 per name keyword found
+in its text. Rather than computing every ratio for every video, candidates
+are ranked by upper bounds of that score and refined best-first: first the
+characters each field shares with the name, computed for every candidate at
+once from per-character count columns built when the index loads, then the
+longest common subsequence (bit-parallel, a few integer operations per
+character), which a ratio's matching blocks can never exceed. Exact ratios
+are only computed until the top results are known, so the ranking is the
+same as scoring every video.
+
+Results for indexes loaded from a file are memoized in the match cache,
+keyed on the file's version, so repeated names skip matching entirely.
 """
 
-import json
-import os
+from array import array
+from collections import Counter
 from difflib import SequenceMatcher
+from itertools import repeat
+from operator import add, contains
+import heapq
 import logging
 
+from .video_index import VideoSearchIndex, get_video_index
+from .match_cache import get_match_cache, normalize_exercise_name
+
 logger = logging.getLogger(__name__)
 
+# Video fields compared with the exercise name
+MATCH_FIELDS = ('filename', 'searchable', 'subcategory')
+# Score added per exercise keyword found in the video's text
+KEYWORD_BOOST = 0.1
+# Matches must score above this
+MIN_MATCH_SCORE = 0.3
+
+def _ratio_bound(matches, length):
+    """SequenceMatcher's ratio formula, for bounds computed from a match count"""
+    return 2.0 * matches / length if length else 1.0
+
+def _lcs_length(char_masks, length, text):
+    """
+    Longest common subsequence of a name and text, from the name's per-character
+    position bitmasks (Allison-Dix bit-parallel LCS)
+    """
+    full = (1 << length) - 1
+    row = full
+    for char in text:
+        mask = char_masks.get(char)
+        if mask:
+            matched = row & mask
+            row = ((row + matched) | (row - matched)) & full
+    return length - bin(row).count('1')
+
+class MatchFeatures:
+    """
+    Lowercased match fields of one index snapshot, plus per-field columns
+    (lengths, and counts of every character per video) for all videos or one
+    category, built once per snapshot so bounds are computed column-wise
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.fields = [
+            tuple((video.get(field) or '').lower() for field in MATCH_FIELDS)
+            for video in index.videos
+        ]
+        self.by_category = {}
+        for position, video in enumerate(index.videos):
+            self.by_category.setdefault(video.get('category'), []).append(position)
+        self._columns = {}
+
+    def columns(self, category=None):
+        """(positions, search texts, per-field lengths, per-field {char: counts}) of all videos or a category"""
+        if category and category not in self.by_category:
+            return [], [], [], []
+        columns = self._columns.get(category)
+        if columns is None:
+            positions = self.by_category.get(category, []) if category else range(len(self.fields))
+            texts = [self.index.search_text[position] for position in positions]
+            lengths, char_counts = [], []
+            for field in range(len(MATCH_FIELDS)):
+                field_texts = [self.fields[position][field] for position in positions]
+                counts = {}
+                for row, text in enumerate(field_texts):
+                    for char, count in Counter(text).items():
+                        column = counts.get(char)
+                        if column is None:
+                            column = counts[char] = array('H', [0]) * len(field_texts)
+                        column[row] = min(count, 0xFFFF)
+                lengths.append([len(text) for text in field_texts])
+                char_counts.append(counts)
+            columns = self._columns[category] = (positions, texts, lengths, char_counts)
+        return columns
+
+    def top_matches(self, exercise_name, category, max_results, shared_columns=None):
+        """
+        [(score, position)] of the best-scoring videos (of a category, if given)
+        above MIN_MATCH_SCORE, best first with ties in index order, plus the
+        number of candidates and of exact rescorings. shared_columns memoizes
+        keyword and character columns across the names of one batch
+        """
+        memo = shared_columns if shared_columns is not None else {}
+        positions, texts, lengths, char_counts = self.columns(category)
+        if max_results <= 0 or not positions:
+            return [], len(positions), 0
+        name = exercise_name.lower()
+        name_length = len(name)
+        name_counts = Counter(name)
+        char_masks = {}
+        for offset, char in enumerate(name):
+            char_masks[char] = char_masks.get(char, 0) | (1 << offset)
+
+        # Keyword boosts of every candidate
+        keyword_matches = [0] * len(positions)
+        for keyword in name.split():
+            column = memo.get((category, keyword))
+            if column is None:
+                column = memo[(category, keyword)] = list(map(contains, texts, repeat(keyword)))
+            keyword_matches = list(map(add, keyword_matches, column))
+        boosts = [matches * KEYWORD_BOOST for matches in keyword_matches]
+
+        # Stage 0 bounds, per field for every candidate: a ratio can't exceed the
+        # characters both strings share
+        field_bounds = []
+        for field in range(len(MATCH_FIELDS)):
+            shared = [0] * len(positions)
+            for char, count in name_counts.items():
+                key = (category, field, char, count)
+                column = memo.get(key)
+                if column is None:
+                    counts = char_counts[field].get(char)
+                    column = memo[key] = list(map(min, counts, repeat(count))) if counts is not None else ()
+                if column:
+                    shared = list(map(add, shared, column))
+            field_bounds.append(list(map(_ratio_bound, shared, map(add, lengths[field], repeat(name_length)))))
+        queue = [
+            (-min(max(bounds) + boost, 1.0), row, 0, bounds)
+            for row, (boost, bounds) in enumerate(zip(boosts, zip(*field_bounds)))
+            if max(bounds) + boost > MIN_MATCH_SCORE
+        ]
+        heapq.heapify(queue)
+
+        best = []  # min-heap of (score, -row): the weakest kept match on top
+        rescored = 0
+        while queue:
+            neg_bound, row, stage, bounds = heapq.heappop(queue)
+            bound = -neg_bound
+            if bound <= MIN_MATCH_SCORE or (len(best) >= max_results and bound < best[0][0]):
+                break
+
+            fields = self.fields[positions[row]]
+            if stage == 0:
+                # Stage 1 bounds: a ratio can't exceed the longest common subsequence.
+                # Fields whose bound is already beaten keep it
+                bounds = list(bounds)
+                lcs_best = 0.0
+                for field in sorted(range(len(fields)), key=bounds.__getitem__, reverse=True):
+                    if bounds[field] > lcs_best:
+                        text = fields[field]
+                        bounds[field] = _ratio_bound(_lcs_length(char_masks, name_length, text),
+                                                     name_length + len(text))
+                        lcs_best = max(lcs_best, bounds[field])
+                heapq.heappush(queue, (-min(max(bounds) + boosts[row], 1.0), row, 1, bounds))
+                continue
+
+            ratio = 0.0
+            for field_bound, text in sorted(zip(bounds, fields), reverse=True):
+                if field_bound <= ratio:
+                    break
+                ratio = max(ratio, SequenceMatcher(None, name, text).ratio())
+            rescored += 1
+
+            score = min(ratio + boosts[row], 1.0)
+            if score > MIN_MATCH_SCORE:
+                if len(best) < max_results:
+                    heapq.heappush(best, (score, -row))
+                elif (score, -row) > best[0]:
+                    heapq.heapreplace(best, (score, -row))
+
+        top = [(score, positions[-neg_row]) for score, neg_row in sorted(best, reverse=True)]
+        return top, len(positions), rescored
+
 class VideoMatcher:
     def __init__(self, video_index_path=None):
-        """Initialize the video matcher with video index"""
-        if video_index_path is None:
-            # Default path relative to this file
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            video_index_path = os.path.join(base_dir, 'data', 'video_index.json')
-        
+        """Initialize the video matcher with video index (the shared one by default)"""
         self.video_index_path = video_index_path
-        self.videos = []
+        self._own_index = None
+        self._features = None
+        self.match_cache = get_match_cache()
         self.load_video_index()
     
     def load_video_index(self):
-        """Load the video index from JSON file"""
+        """Build a private index for an explicit index path; otherwise follow the shared snapshot"""
         try:
-            with open(self.video_index_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.videos = data.get('videos', [])
+            if self.video_index_path is not None:
+                self._own_index = VideoSearchIndex.from_file(self.video_index_path)
             logger.info(f"Loaded {len(self.videos)} videos from index")
         except Exception as e:
             logger.error(f"Failed to load video index: {e}")
-            self.videos = []
+            self._own_index = VideoSearchIndex([])
+    
+    @property
+    def index(self):
+        """Current index snapshot; the shared one is swapped when video_index.json changes"""
+        return self._own_index if self._own_index is not None else get_video_index()
+    
+    @property
+    def videos(self):
+        return self.index.videos
+    
+    def match_features(self, index):
+        """Precomputed match fields for an index snapshot, rebuilt when the snapshot changes"""
+        features = self._features
+        if features is None or features.index is not index:
+            features = MatchFeatures(index)
+            self._features = features
+        return features
     
     def similarity_score(self, str1, str2):
         """Calculate similarity between two strings (0-1)"""
@@ -49,94 +236,115 @@ class VideoMatcher:
         Returns:
             List of matching videos with scores
         """
-        if not self.videos:
+        return self.match_many(
+            [{'name': exercise_name, 'category_hint': category_hint}], max_results=max_results
+        )[0]
+    
+    def match_many(self, exercises, max_results=3):
+        """
+        Match many exercises against one index snapshot in a single pass
+        
+        Args:
+            exercises: Exercise names, or dicts with 'name' and optional
+                'category_hint' and 'max_results'
+            max_results: Maximum number of results per exercise (default)
+        
+        Returns:
+            List of match lists, in the order of exercises
+        """
+        index = self.index  # One snapshot for the whole batch, even if a reload lands meanwhile
+        videos = index.videos
+        if not videos:
             logger.warning("No videos loaded in index")
-            return []
+            return [[] for _ in exercises]
         
-        # Filter by category if provided
-        candidate_videos = self.videos
-        if category_hint:
-            candidate_videos = [v for v in self.videos if v.get('category') == category_hint]
-            logger.info(f"Filtered to {len(candidate_videos)} videos in category '{category_hint}'")
+        # Same name, hint and limit are matched once per batch
+        keys = []
+        for exercise in exercises:
+            if isinstance(exercise, str):
+                exercise = {'name': exercise}
+            keys.append((
+                normalize_exercise_name(exercise.get('name')),
+                exercise.get('category_hint') or None,
+                int(exercise.get('max_results') or max_results)
+            ))
         
-        # Calculate similarity scores
-        matches = []
-        for video in candidate_videos:
-            # Check against filename, searchable text, and subcategory
-            filename_score = self.similarity_score(exercise_name, video.get('filename', ''))
-            searchable_score = self.similarity_score(exercise_name, video.get('searchable', ''))
-            subcategory_score = self.similarity_score(exercise_name, video.get('subcategory', ''))
-            
-            # Use the best score
-            best_score = max(filename_score, searchable_score, subcategory_score)
-            
-            # Boost score if exercise keywords are in video name
-            exercise_keywords = exercise_name.lower().split()
-            video_text = (video.get('filename', '') + ' ' + video.get('searchable', '')).lower()
-            keyword_matches = sum(1 for kw in exercise_keywords if kw in video_text)
-            keyword_boost = keyword_matches * 0.1
-            
-            final_score = min(best_score + keyword_boost, 1.0)
-            
-            if final_score > 0.3:  # Minimum threshold
-                matches.append({
-                    'video': video,
-                    'score': final_score
-                })
+        # Indexes built in memory have no version to key the cache on
+        cache = self.match_cache if index.version_key else None
+        version = index.version_key
         
-        # Sort by score and return top matches
-        matches.sort(key=lambda x: x['score'], reverse=True)
-        top_matches = matches[:max_results]
+        results = {}
+        for key in dict.fromkeys(keys):
+            cached = cache.get(version, *key) if cache else None
+            if cached is not None:
+                results[key] = cached
         
-        logger.info(f"Found {len(top_matches)} matches for '{exercise_name}' (from {len(matches)} candidates)")
+        features = self.match_features(index)
+        shared_columns = {}
+        for key in dict.fromkeys(keys):
+            if key in results:
+                continue
+            name, category_hint, limit = key
+            top_matches, candidates, rescored = features.top_matches(name, category_hint, limit, shared_columns)
+            logger.info(f"Found {len(top_matches)} matches for '{name}'"
+                        f"{f' in {category_hint}' if category_hint else ''} "
+                        f"({rescored} of {candidates} candidates rescored)")
+            
+            results[key] = [
+                {
+                    'id': videos[position]['id'],
+                    'filename': videos[position]['filename'],
+                    'path': videos[position]['path'],
+                    'category': videos[position]['category'],
+                    'subcategory': videos[position].get('subcategory'),
+                    'match_score': round(score, 2)
+                }
+                for score, position in top_matches
+            ]
+            if cache:
+                cache.put(version, name, category_hint, limit, results[key])
         
-        return [
-            {
-                'id': m['video']['id'],
-                'filename': m['video']['filename'],
-                'path': m['video']['path'],
-                'category': m['video']['category'],
-                'subcategory': m['video'].get('subcategory'),
-                'match_score': round(m['score'], 2)
-            }
-            for m in top_matches
-        ]
+        if len(keys) > 1:
+            logger.info(f"Matched {len(keys)} exercises ({len(results)} distinct) in one pass")
+        # Every exercise gets its own copies so callers can annotate them
+        return [[dict(match) for match in results[key]] for key in keys]
     
-    def enhance_workout_with_videos(self, workout_data):
+    def enhance_workout_with_videos(self, workout_data, match_many=None):
         """
         Enhance a workout by adding video matches to each exercise
         
         Args:
             workout_data: Workout dict with warmup, main, cooldown sections
+            match_many: Batch matching function to use instead of self.match_many
+                (e.g. the materialized matches lookup)
         
         Returns:
             Enhanced workout with videos array added to each exercise
         """
         enhanced = workout_data.copy()
         
-        for section in ['warmup', 'main', 'cooldown']:
-            if section not in enhanced:
-                continue
+        exercises = [
+            exercise
+            for section in ['warmup', 'main', 'cooldown']
+            for exercise in enhanced.get(section) or []
+        ]
+        
+        # Find matching videos for the whole workout at once
+        all_matches = (match_many or self.match_many)(
+            [{'name': exercise.get('name', ''), 'category_hint': exercise.get('category_hint')}
+             for exercise in exercises],
+            max_results=3
+        )
+        
+        for exercise, matches in zip(exercises, all_matches):
+            # Add videos to exercise
+            exercise['videos'] = matches
             
-            for exercise in enhanced[section]:
-                exercise_name = exercise.get('name', '')
-                category_hint = exercise.get('category_hint')
-                
-                # Find matching videos
-                matches = self.find_matching_videos(
-                    exercise_name,
-                    category_hint=category_hint,
-                    max_results=3
-                )
-                
-                # Add videos to exercise
-                exercise['videos'] = matches
-                
-                # Log the match
-                if matches:
-                    logger.info(f"Matched '{exercise_name}' to {len(matches)} videos (best: {matches[0]['filename']})")
-                else:
-                    logger.info(f"No video matches found for '{exercise_name}'")
+            # Log the match
+            if matches:
+                logger.info(f"Matched '{exercise.get('name', '')}' to {len(matches)} videos (best: {matches[0]['filename']})")
+            else:
+                logger.info(f"No video matches found for '{exercise.get('name', '')}'")
         
         return enhanced
 
@@ -155,6 +363,11 @@ def find_matching_videos(exercise_name, category_hint=None, max_results=3):
     matcher = get_video_matcher()
     return matcher.find_matching_videos(exercise_name, category_hint, max_results)
 
+def match_many(exercises, max_results=3):
+    """Convenience function to match many exercises in one pass"""
+    matcher = get_video_matcher()
+    return matcher.match_many(exercises, max_results)
+
 def enhance_workout_with_videos(workout_data):
     """Convenience function to enhance workout with videos"""
     matcher = get_video_matcher()
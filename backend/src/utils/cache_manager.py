@@ -0,0 +1,265 @@
+"""
+Transcode cache manager
+Keeps TRANSCODE_CACHE_DIR under a byte budget by evicting the entries that
+were streamed least recently. Entries belonging to favorites or playlists,
+or still being written by a transcode, are never evicted, and TranscodeJob
+rows are kept in step with what is actually on disk
+"""
+import os
+import time
+import shutil
+import sqlite3
+import logging
+import threading
+from flask import has_app_context
+
+from .video_transcoder import (
+    TRANSCODE_CACHE_DIR, ENCODE_PROFILES, cache_key_for_fingerprint, get_content_fingerprint
+)
+
+logger = logging.getLogger(__name__)
+
+# Total bytes of transcodes and HLS segments to keep
+TRANSCODE_CACHE_MAX_BYTES = int(os.environ.get('TRANSCODE_CACHE_MAX_BYTES', 50 * 1024 ** 3))
+# Eviction frees space down to this fraction of the budget so it doesn't run after every job
+TRANSCODE_CACHE_LOW_WATER = float(os.environ.get('TRANSCODE_CACHE_LOW_WATER', 0.9))
+# Also evict when the cache filesystem has less than this much free space
+TRANSCODE_CACHE_MIN_FREE_BYTES = int(os.environ.get('TRANSCODE_CACHE_MIN_FREE_BYTES', 2 * 1024 ** 3))
+# Last-access times shared by every app process
+CACHE_INDEX_PATH = os.path.join(TRANSCODE_CACHE_DIR, 'cache_index.db')
+# An entry's access time is written at most this often
+ACCESS_WRITE_INTERVAL = 60
+
+_INTERNAL_SUFFIXES = ('.db', '.db-journal', '.db-wal', '.db-shm', '.tmp', '.lock')
+
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}
+_last_written = {}  # entry name -> monotonic time of the last access write
+_evict_lock = threading.Lock()
+_index_local = threading.local()
+
+def _index_db():
+    """Per-thread connection to the access-time index"""
+    conn = getattr(_index_local, 'conn', None)
+    if conn is None:
+        os.makedirs(TRANSCODE_CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(CACHE_INDEX_PATH, timeout=10)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_access (
+                entry TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.commit()
+        _index_local.conn = conn
+    return conn
+
+def entry_name(path):
+    """Top-level cache entry (transcode file or HLS directory) that path belongs to"""
+    relative = os.path.relpath(os.path.abspath(path), os.path.abspath(TRANSCODE_CACHE_DIR))
+    if relative.startswith('..'):
+        return None
+    return relative.split(os.sep)[0]
+
+def record_access(path, hit=True):
+    """Note that a cached file was requested; hit=False counts a cache miss"""
+    _stats['hits' if hit else 'misses'] += 1
+    name = entry_name(path)
+    if not name:
+        return
+    now = time.monotonic()
+    if now - _last_written.get(name, 0) < ACCESS_WRITE_INTERVAL:
+        return
+    _last_written[name] = now
+    try:
+        conn = _index_db()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_access (entry, last_access) VALUES (?, ?)",
+            (name, time.time())
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not record cache access for {name}: {e}")
+
+def _entry_size(path):
+    """Bytes used by a file or an HLS segment directory"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+def _entry_busy(path):
+    """True while a transcode is still writing into this entry"""
+    if os.path.isdir(path):
+        return any(name.endswith(('.tmp', '.lock')) for name in os.listdir(path))
+    return os.path.exists(path + '.tmp') or os.path.exists(path + '.lock')
+
+def list_entries():
+    """Every cache entry with its size, last access time and busy flag"""
+    if not os.path.isdir(TRANSCODE_CACHE_DIR):
+        return []
+    try:
+        last_access = dict(_index_db().execute("SELECT entry, last_access FROM cache_access"))
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read cache access index: {e}")
+        last_access = {}
+
+    entries = []
+    for item in os.scandir(TRANSCODE_CACHE_DIR):
+        if item.name.endswith(_INTERNAL_SUFFIXES):
+            continue
+        try:
+            entries.append({
+                'name': item.name,
+                'path': item.path,
+                'bytes': _entry_size(item.path),
+                # Entries never streamed since they were written age from their mtime
+                'last_access': last_access.get(item.name, item.stat().st_mtime),
+                'busy': _entry_busy(item.path)
+            })
+        except OSError:
+            continue  # Removed while we were scanning
+    return entries
+
+def pinned_entries():
+    """
+    Cache entries (every rendition) of videos that are favorited or in a playlist.
+    Only fingerprints that are already cached are used: a video that was never
+    fingerprinted has nothing in the cache, and no source file is read here.
+    """
+    if not has_app_context():
+        return set()
+    from ..models import db, Video, VideoFavorite, VideoPlaylistItem
+
+    video_root = os.environ.get('VIDEO_ROOT_PATH', '')
+    relative_paths = {path for (path,) in db.session.query(VideoFavorite.video_path)}
+    relative_paths.update(
+        path for (path,) in db.session.query(Video.file_path)
+        .join(VideoPlaylistItem, VideoPlaylistItem.video_id == Video.id)
+    )
+
+    pinned = set()
+    for relative_path in relative_paths:
+        if relative_path.startswith('./'):
+            relative_path = relative_path[2:]
+        # Same path the stream routes build, so the cache names line up
+        fingerprint = get_content_fingerprint(os.path.join(video_root, relative_path), compute=False)
+        if fingerprint is None:
+            continue
+        for profile in ENCODE_PROFILES:
+            # Names of get_cache_path / get_segment_dir
+            key = cache_key_for_fingerprint(fingerprint, profile)
+            pinned.update((f'{key}.mp4', f'{key}.hls'))
+    return pinned
+
+def _forget_jobs(paths):
+    """Drop finished TranscodeJob rows whose output was evicted so the file can be re-queued"""
+    if not paths or not has_app_context():
+        return
+    from ..models import db, TranscodeJob
+
+    for path in paths:
+        TranscodeJob.query.filter(
+            TranscodeJob.status != 'processing',
+            db.or_(TranscodeJob.output_path == path,
+                   TranscodeJob.output_path.like(path + os.sep + '%'))
+        ).delete(synchronize_session=False)
+    db.session.commit()
+
+def reconcile_jobs():
+    """Remove 'complete' job rows whose output no longer exists on disk"""
+    from ..models import db, TranscodeJob
+
+    stale = [
+        job_id for job_id, output_path in
+        db.session.query(TranscodeJob.id, TranscodeJob.output_path).filter_by(status='complete')
+        if not os.path.exists(output_path)
+    ]
+    if stale:
+        TranscodeJob.query.filter(TranscodeJob.id.in_(stale)).delete(synchronize_session=False)
+        db.session.commit()
+        logger.info(f"Removed {len(stale)} transcode jobs whose cache files are gone")
+    return len(stale)
+
+def enforce_budget(max_bytes=None):
+    """
+    Evict least recently used entries until the cache is back under its
+    low-water mark and the filesystem has TRANSCODE_CACHE_MIN_FREE_BYTES free.
+    Returns the evicted paths.
+    """
+    max_bytes = max_bytes or TRANSCODE_CACHE_MAX_BYTES
+    with _evict_lock:
+        entries = list_entries()
+        total = sum(entry['bytes'] for entry in entries)
+        free = shutil.disk_usage(TRANSCODE_CACHE_DIR).free if entries else TRANSCODE_CACHE_MIN_FREE_BYTES
+        if total <= max_bytes and free >= TRANSCODE_CACHE_MIN_FREE_BYTES:
+            return []
+
+        target = int(max_bytes * TRANSCODE_CACHE_LOW_WATER)
+        if free < TRANSCODE_CACHE_MIN_FREE_BYTES:
+            target = min(target, total - (TRANSCODE_CACHE_MIN_FREE_BYTES - free))
+
+        pinned = pinned_entries()
+        candidates = sorted(
+            (entry for entry in entries if not entry['busy'] and entry['name'] not in pinned),
+            key=lambda entry: entry['last_access']
+        )
+        evicted = []
+        for entry in candidates:
+            if total <= target:
+                break
+            try:
+                if os.path.isdir(entry['path']):
+                    shutil.rmtree(entry['path'])
+                else:
+                    os.remove(entry['path'])
+            except OSError as e:
+                logger.warning(f"Could not evict {entry['path']}: {e}")
+                continue
+            total -= entry['bytes']
+            evicted.append(entry['path'])
+            _stats['evictions'] += 1
+            _stats['evicted_bytes'] += entry['bytes']
+            _last_written.pop(entry['name'], None)
+
+        if evicted:
+            try:
+                conn = _index_db()
+                conn.executemany(
+                    "DELETE FROM cache_access WHERE entry = ?",
+                    [(os.path.basename(path),) for path in evicted]
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not update cache access index: {e}")
+            _forget_jobs(evicted)
+            logger.info(f"Evicted {len(evicted)} cache entries, cache now {total / 1024 ** 3:.2f} GiB")
+        elif total > target:
+            logger.warning("Transcode cache is over budget but every entry is pinned or in use")
+        return evicted
+
+def get_cache_stats():
+    """Size, entry counts and hit rate for the transcode cache"""
+    entries = list_entries()
+    total = sum(entry['bytes'] for entry in entries)
+    pinned = pinned_entries()
+    requests = _stats['hits'] + _stats['misses']
+    return {
+        'bytes': total,
+        'max_bytes': TRANSCODE_CACHE_MAX_BYTES,
+        'usage': round(total / TRANSCODE_CACHE_MAX_BYTES, 4) if TRANSCODE_CACHE_MAX_BYTES else None,
+        'free_disk_bytes': shutil.disk_usage(TRANSCODE_CACHE_DIR).free if os.path.isdir(TRANSCODE_CACHE_DIR) else None,
+        'entries': len(entries),
+        'pinned_entries': sum(1 for entry in entries if entry['name'] in pinned),
+        'busy_entries': sum(1 for entry in entries if entry['busy']),
+        'hits': _stats['hits'],
+        'misses': _stats['misses'],
+        'hit_rate': round(_stats['hits'] / requests, 4) if requests else None,
+        'evictions': _stats['evictions'],
+        'evicted_bytes': _stats['evicted_bytes']
+    }
@@ -0,0 +1,149 @@
+"""
+HLS segmenting for the video server
+Builds a VOD playlist from the probed duration and transcodes individual
+MPEG-TS segments on demand, so seeking into a long class only costs the
+segments that are actually watched instead of a full transcode pass
+"""
+import os
+import math
+import time
+import fcntl
+import logging
+
+from .video_transcoder import (
+    get_cache_path,
+    ensure_cache_dir,
+    probe_video,
+    run_ffmpeg,
+    video_encode_args,
+    audio_encode_args,
+    profile_bandwidth,
+    profile_resolution,
+    DEFAULT_PROFILE
+)
+
+logger = logging.getLogger(__name__)
+
+# Target length of each segment in seconds
+HLS_SEGMENT_SECONDS = int(os.environ.get('HLS_SEGMENT_SECONDS', 6))
+# Segments after the one being watched that are queued for background transcoding
+HLS_PREFETCH_SEGMENTS = int(os.environ.get('HLS_PREFETCH_SEGMENTS', 2))
+# Seconds a segment request waits for its queued transcode before answering 503 + Retry-After
+HLS_SEGMENT_WAIT = float(os.environ.get('HLS_SEGMENT_WAIT', 10))
+# Seconds transcode_segment waits for another encoder's lock on the same segment (its ffmpeg timeout)
+HLS_LOCK_TIMEOUT = 600
+
+def segment_count(duration):
+    """Number of segments needed to cover duration seconds"""
+    return max(1, math.ceil(duration / HLS_SEGMENT_SECONDS))
+
+def segment_bounds(duration, index):
+    """(start, length) in seconds of segment index"""
+    start = index * HLS_SEGMENT_SECONDS
+    return start, min(HLS_SEGMENT_SECONDS, duration - start)
+
+def get_segment_dir(original_path, profile=DEFAULT_PROFILE):
+    """Per-video, per-rendition segment directory alongside the full-file transcode cache"""
+    return os.path.splitext(get_cache_path(original_path, profile))[0] + '.hls'
+
+def get_segment_path(original_path, index, profile=DEFAULT_PROFILE):
+    """Cache path of one segment"""
+    return os.path.join(get_segment_dir(original_path, profile), f'seg{index:05d}.ts')
+
+def profile_query(profile):
+    """Query string that selects a rendition in playlist and segment URIs"""
+    return '' if profile == DEFAULT_PROFILE else f'?profile={profile}'
+
+def build_master_playlist(info, profiles):
+    """Multivariant playlist offering each rendition so players switch with bandwidth"""
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for profile in profiles:
+        attributes = f'BANDWIDTH={profile_bandwidth(profile, info)}'
+        resolution = profile_resolution(profile, info)
+        if resolution:
+            attributes += f',RESOLUTION={resolution[0]}x{resolution[1]}'
+        lines.append(f'#EXT-X-STREAM-INF:{attributes}')
+        lines.append(f'index.m3u8{profile_query(profile)}')
+    return '\n'.join(lines) + '\n'
+
+def build_playlist(duration, profile=DEFAULT_PROFILE):
+    """VOD media playlist; segment URIs are relative to the playlist URL"""
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        f'#EXT-X-TARGETDURATION:{HLS_SEGMENT_SECONDS}',
+        '#EXT-X-MEDIA-SEQUENCE:0'
+    ]
+    for index in range(segment_count(duration)):
+        _, length = segment_bounds(duration, index)
+        lines.append(f'#EXTINF:{length:.3f},')
+        lines.append(f'seg{index:05d}.ts{profile_query(profile)}')
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+def _lock_with_timeout(lock_file, timeout):
+    """flock lock_file exclusively, polling; False if it is still held after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.25)
+
+def transcode_segment(input_path, index, output_path, threads=None, cancel_event=None, nice=0,
+                      profile=DEFAULT_PROFILE, lock_timeout=HLS_LOCK_TIMEOUT):
+    """
+    Transcode one segment to H.264/AAC MPEG-TS in the given rendition
+    Concurrent calls for the same segment wait on its lock file (up to
+    lock_timeout seconds) and then reuse the result instead of encoding it twice
+    """
+    info = probe_video(input_path)
+    if not info or not info.get('duration'):
+        logger.error(f"Cannot segment {input_path}: duration unknown")
+        return False
+    start, length = segment_bounds(info['duration'], index)
+    if length <= 0:
+        return False
+    
+    ensure_cache_dir()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = output_path + '.tmp'
+    
+    with open(output_path + '.lock', 'w') as lock_file:
+        if not _lock_with_timeout(lock_file, lock_timeout):
+            logger.error(f"Segment {index} of {input_path} still locked after {lock_timeout}s")
+            return False
+        try:
+            if os.path.exists(output_path):
+                return True
+            
+            thread_args = ['-threads', str(threads)] if threads else []
+            run_ffmpeg([
+                '-ss', f'{start:.3f}',  # Input seek: only decode from the nearest keyframe
+                '-i', input_path,
+                '-t', f'{length:.3f}',
+                '-map', '0:v:0', '-map', '0:a:0?',
+                *video_encode_args(profile, preset='veryfast'),  # A viewer may be waiting on it
+                *audio_encode_args(profile),
+                *thread_args,
+                '-output_ts_offset', f'{start:.3f}',  # Keep timestamps continuous across segments
+                '-f', 'mpegts',
+                '-y',
+                temp_path
+            ], timeout=600, cancel_event=cancel_event, nice=nice)
+            os.rename(temp_path, output_path)
+            return True
+        except Exception as e:
+            logger.error(f"Segment {index} of {input_path} failed: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            # Once the segment exists nobody locks again, so the lock file can go
+            if os.path.exists(output_path) and os.path.exists(output_path + '.lock'):
+                os.remove(output_path + '.lock')
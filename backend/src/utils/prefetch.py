@@ -0,0 +1,137 @@
+"""
+Predictive prefetch for upcoming workout videos
+When a workout, playlist or template session is generated we already know
+which videos play next. For each of the next few we queue a background
+transcode if it isn't browser-playable yet, or ask the kernel to read the
+start of the playable file into the page cache, so exercise transitions
+start instantly instead of answering 202
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+from .video_transcoder import get_cache_path, get_playback_strategy
+from .transcode_manager import create_or_get_job, enqueue_job, PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+# Videos ahead of the viewer that get prepared
+VIDEO_PREFETCH_COUNT = int(os.environ.get('VIDEO_PREFETCH_COUNT', 3))
+# Leading bytes of each playable file pulled into the page cache
+VIDEO_PREFETCH_WARM_BYTES = int(os.environ.get('VIDEO_PREFETCH_WARM_BYTES', 8 * 1024 * 1024))
+
+# Probing and job creation run off the request thread, one batch at a time
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='VideoPrefetch')
+
+def warm_page_cache(file_path, length=None):
+    """Start kernel readahead for the head of a file without blocking on it"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, length or VIDEO_PREFETCH_WARM_BYTES, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+        return True
+    except OSError as e:
+        logger.debug(f"Could not warm {file_path}: {e}")
+        return False
+
+def resolve_video_path(relative_path, video_root=None):
+    """Absolute path of a library-relative video path, or None if it escapes the library"""
+    video_root = video_root or os.environ.get('VIDEO_ROOT_PATH', '')
+    if relative_path.startswith('./'):
+        relative_path = relative_path[2:]
+    # Joined the same way as the stream route so cache keys and job IDs match
+    file_path = os.path.join(video_root, relative_path)
+    abs_root = os.path.abspath(video_root)
+    try:
+        if os.path.commonpath([abs_root, os.path.abspath(file_path)]) != abs_root:
+            return None
+    except ValueError:
+        return None
+    return file_path
+
+def prefetch_videos(relative_paths, limit=None):
+    """
+    Prepare the next videos in play order: queue background transcodes for
+    files that need one and warm the page cache for files that are ready.
+    Needs an app context. Returns counts of what was done.
+    """
+    summary = {'queued': 0, 'warmed': 0, 'skipped': 0}
+    seen = set()
+    for relative_path in relative_paths:
+        if len(seen) >= (limit or VIDEO_PREFETCH_COUNT):
+            break
+        if not relative_path or relative_path in seen:
+            continue
+
+        file_path = resolve_video_path(relative_path)
+        if not file_path or not os.path.exists(file_path):
+            summary['skipped'] += 1
+            continue
+        seen.add(relative_path)
+
+        if get_playback_strategy(file_path) == 'direct':
+            summary['warmed'] += warm_page_cache(file_path)
+            continue
+
+        cache_path = get_cache_path(file_path)
+        if os.path.exists(cache_path):
+            summary['warmed'] += warm_page_cache(cache_path)
+            continue
+
+        job, should_enqueue = create_or_get_job(file_path, cache_path, priority=PRIORITY_BACKGROUND)
+        if should_enqueue and enqueue_job(job.id, priority=PRIORITY_BACKGROUND):
+            summary['queued'] += 1
+
+    logger.info(f"Prefetched upcoming videos: {summary}")
+    return summary
+
+def schedule_prefetch(relative_paths, limit=None):
+    """Run prefetch_videos in the background so the calling request isn't slowed down"""
+    relative_paths = [path for path in relative_paths if path]
+    if not relative_paths:
+        return False
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                prefetch_videos(relative_paths, limit)
+            except Exception as e:
+                logger.error(f"Video prefetch failed: {str(e)}")
+
+    _executor.submit(run)
+    return True
+
+def workout_video_paths(workout):
+    """Best-match video of each exercise in an AI-generated workout, in play order"""
+    paths = []
+    for section in ['warmup', 'main', 'cooldown']:
+        for exercise in workout.get(section) or []:
+            videos = exercise.get('videos') or []
+            if videos:
+                paths.append(videos[0].get('path'))
+    return paths
+
+def exercise_video_paths(exercises):
+    """Primary video of each Exercise, in order"""
+    paths = []
+    for exercise in exercises:
+        if exercise.video_path:
+            paths.append(exercise.video_path)
+        elif exercise.video_paths:
+            paths.append(exercise.video_paths[0])
+    return paths
+
+def playlist_video_paths(playlist_id):
+    """Library paths of a playlist's videos, in playlist order"""
+    from ..models import db, Video, VideoPlaylistItem
+
+    rows = db.session.query(Video.file_path).join(
+        VideoPlaylistItem, VideoPlaylistItem.video_id == Video.id
+    ).filter(VideoPlaylistItem.playlist_id == playlist_id).order_by(VideoPlaylistItem.position)
+    return [file_path for (file_path,) in rows]
@@ -0,0 +1,379 @@
+"""
+Range streaming engine for video files
+Serves whole files and byte ranges through the WSGI server's file wrapper
+(os.sendfile under gunicorn/uWSGI/mod_wsgi) when available, and falls back
+to large unbuffered reads when the server has no zero-copy support
+"""
+import os
+import re
+import time
+import uuid
+import mimetypes
+import logging
+from flask import request, Response
+from werkzeug.http import http_date, parse_date
+
+logger = logging.getLogger(__name__)
+
+# Bytes handed to the server per iteration (buffered path) or per wrapper block
+STREAM_CHUNK_SIZE = int(os.environ.get('VIDEO_STREAM_CHUNK_SIZE', 1024 * 1024))
+# auto: use wsgi.file_wrapper when the server provides one, buffered: never
+STREAM_MODE = os.environ.get('VIDEO_STREAM_MODE', 'auto').lower()
+# Requests asking for more disjoint ranges than this get the full file
+MAX_RANGES = int(os.environ.get('VIDEO_STREAM_MAX_RANGES', 16))
+
+# A growing file that stops growing for this long is assumed abandoned by its writer
+GROWING_STALL_SECONDS = int(os.environ.get('VIDEO_STREAM_GROWING_STALL_SECONDS', 60))
+GROWING_POLL_SECONDS = 0.25
+# A viewer counts as actively streaming for this long after their last request
+STREAM_ACTIVE_WINDOW = int(os.environ.get('VIDEO_STREAM_ACTIVE_WINDOW', 30))
+
+_stream_activity = {}  # client address -> monotonic time of its last video request
+
+_RANGE_SPEC = re.compile(r'^(\d*)\s*-\s*(\d*)$')
+
+
+class RangeFile:
+    """
+    File-like view over [start, start + length) of an open file.
+    Exposes fileno() so sendfile-capable servers hand the descriptor straight
+    to the kernel (they start at the current offset and stop at Content-Length),
+    while read() is capped so plain iterating wrappers stop at the range end.
+    """
+
+    def __init__(self, f, start, length):
+        self._file = f
+        self._remaining = length
+        f.seek(start)
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def note_stream_activity():
+    """Record that the current client is streaming video"""
+    _stream_activity[request.remote_addr] = time.monotonic()
+
+
+def active_stream_count():
+    """Clients that requested video within STREAM_ACTIVE_WINDOW in this process"""
+    cutoff = time.monotonic() - STREAM_ACTIVE_WINDOW
+    for key, seen in list(_stream_activity.items()):
+        if seen < cutoff:
+            _stream_activity.pop(key, None)
+    return len(_stream_activity)
+
+
+def open_for_streaming(file_path):
+    """Open a file unbuffered and hint the kernel that reads are sequential"""
+    f = open(file_path, 'rb', buffering=0)
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+    return f
+
+
+def iter_file_range(f, start, length, chunk_size=None, close=True):
+    """
+    Yield [start, start + length) of an open file in large blocks.
+    WSGI requires each block to be a fresh bytes object, so instead of handing
+    out a shared buffer we read big blocks straight from the unbuffered file,
+    which costs one syscall and one allocation per block.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        if close:
+            f.close()
+
+
+def stream_body(f, start, length, chunk_size=None):
+    """Return the best available response iterable for a byte range"""
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None and STREAM_MODE != 'buffered':
+        return file_wrapper(RangeFile(f, start, length), chunk_size)
+    return iter_file_range(f, start, length, chunk_size)
+
+
+def parse_range_header(range_header, file_size):
+    """
+    Parse an RFC 7233 byte Range header into inclusive (start, end) pairs.
+    Handles bytes=N-M, open-ended bytes=N- and suffix bytes=-N ranges, clamps
+    ends past EOF and coalesces overlapping or adjacent ranges.
+    Returns None when the header is malformed (serve the full file) and an
+    empty list when no range is satisfiable (416).
+    """
+    units, _, spec = range_header.partition('=')
+    if units.strip().lower() != 'bytes' or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        match = _RANGE_SPEC.match(part.strip())
+        if not match:
+            return None
+        first, last = match.group(1), match.group(2)
+        if not first and not last:
+            return None
+        if not first:
+            # Suffix range: the final N bytes
+            suffix_length = int(last)
+            if suffix_length == 0 or file_size == 0:
+                continue
+            ranges.append((max(file_size - suffix_length, 0), file_size - 1))
+            continue
+        start = int(first)
+        end = int(last) if last else file_size - 1
+        if last and end < start:
+            return None
+        if start >= file_size:
+            continue
+        ranges.append((start, min(end, file_size - 1)))
+
+    ranges.sort()
+    coalesced = []
+    for start, end in ranges:
+        if coalesced and start <= coalesced[-1][1] + 1:
+            coalesced[-1] = (coalesced[-1][0], max(coalesced[-1][1], end))
+        else:
+            coalesced.append((start, end))
+    return coalesced
+
+
+def make_etag(stat_result):
+    """Strong validator derived from size and modification time"""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _etag_matches(header_value, etag, weak=True):
+    if header_value.strip() == '*':
+        return True
+    for candidate in header_value.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def is_not_modified(etag, mtime):
+    """Evaluate If-None-Match / If-Modified-Since for a GET or HEAD"""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = parse_date(request.headers.get('If-Modified-Since'))
+    if if_modified_since is not None:
+        return int(mtime) <= int(if_modified_since.timestamp())
+    return False
+
+
+def if_range_matches(etag, mtime):
+    """An If-Range validator must match exactly for the Range to apply"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # If-Range requires strong comparison, so weak tags never match
+        return _etag_matches(if_range, etag, weak=False)
+    if_range_date = parse_date(if_range)
+    return if_range_date is not None and int(if_range_date.timestamp()) == int(mtime)
+
+
+def iter_multipart_ranges(f, ranges, part_headers, closing, chunk_size=None):
+    """Yield a multipart/byteranges body: each part header followed by its bytes"""
+    try:
+        for (start, end), part_header in zip(ranges, part_headers):
+            yield part_header
+            yield from iter_file_range(f, start, end - start + 1, chunk_size, close=False)
+            yield b'\r\n'
+        yield closing
+    finally:
+        f.close()
+
+
+def send_file_range(file_path, mimetype=None, chunk_size=None):
+    """
+    Send a file honouring the request's conditional and Range headers:
+    304 on a validator match, 206 for one range, multipart/byteranges for
+    several, 416 when nothing is satisfiable, otherwise the full file.
+    """
+    stat_result = os.stat(file_path)
+    file_size = stat_result.st_size
+    mimetype = mimetype or mimetypes.guess_type(file_path)[0] or 'video/mp4'
+    note_stream_activity()
+    etag = make_etag(stat_result)
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': http_date(stat_result.st_mtime)
+    }
+
+    if is_not_modified(etag, stat_result.st_mtime):
+        return Response(status=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get('Range', None)
+    if range_header and if_range_matches(etag, stat_result.st_mtime):
+        ranges = parse_range_header(range_header, file_size)
+        if ranges is not None and len(ranges) > MAX_RANGES:
+            # Too many disjoint ranges is cheaper (and safer) to answer in full
+            ranges = None
+
+    if ranges == []:
+        headers['Content-Range'] = f'bytes */{file_size}'
+        return Response(status=416, headers=headers)
+
+    f = open_for_streaming(file_path)
+
+    if ranges and len(ranges) > 1:
+        boundary = uuid.uuid4().hex
+        part_headers = [
+            (f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+             f'Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n').encode()
+            for start, end in ranges
+        ]
+        closing = f'--{boundary}--\r\n'.encode()
+        # Each part is its header, its bytes and a trailing CRLF
+        content_length = len(closing) + sum(
+            len(part_header) + (end - start + 1) + 2
+            for part_header, (start, end) in zip(part_headers, ranges)
+        )
+        headers['Content-Length'] = str(content_length)
+        body = iter_multipart_ranges(f, ranges, part_headers, closing, chunk_size)
+        response = Response(
+            body, 206, headers=headers,
+            mimetype=f'multipart/byteranges; boundary={boundary}',
+            direct_passthrough=True
+        )
+    else:
+        status = 200
+        byte_start, byte_end = 0, file_size - 1
+        if ranges:
+            status = 206  # Partial Content
+            byte_start, byte_end = ranges[0]
+            headers['Content-Range'] = f'bytes {byte_start}-{byte_end}/{file_size}'
+        content_length = byte_end - byte_start + 1
+        headers['Content-Length'] = str(content_length)
+        response = Response(
+            stream_body(f, byte_start, content_length, chunk_size),
+            status,
+            headers=headers,
+            mimetype=mimetype,
+            direct_passthrough=True
+        )
+
+    # HEAD responses never start the body iterator, so close the file explicitly
+    response.call_on_close(f.close)
+    return response
+
+
+def iter_growing_file(f, start, is_finished, chunk_size=None):
+    """
+    Yield a file from start while another process is still appending to it.
+    At EOF we wait for more data until is_finished() reports the writer is done
+    (then drain what is left) or nothing new arrives for GROWING_STALL_SECONDS.
+    A file that shrinks under us was restarted by its writer, so we stop.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    try:
+        f.seek(start)
+        position = start
+        idle_since = time.monotonic()
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                position += len(chunk)
+                idle_since = time.monotonic()
+                yield chunk
+                continue
+            if is_finished():
+                # The writer may have flushed more after our last read
+                chunk = f.read(chunk_size)
+                while chunk:
+                    yield chunk
+                    chunk = f.read(chunk_size)
+                return
+            if os.fstat(f.fileno()).st_size < position:
+                logger.warning("Growing file was truncated mid-stream, ending response")
+                return
+            if time.monotonic() - idle_since > GROWING_STALL_SECONDS:
+                logger.warning("Growing file stalled, ending response")
+                return
+            time.sleep(GROWING_POLL_SECONDS)
+    finally:
+        f.close()
+
+
+def send_growing_file(file_path, is_finished, mimetype=None, chunk_size=None):
+    """
+    Send a file that is still being written (progressive transcode output).
+    The final length is unknown, so a request from byte 0 gets a 200 that
+    follows the file until the writer finishes, and a range request gets a
+    206 for whatever part of the range has already been written, reported
+    against an unknown complete length (bytes a-b/*).
+    """
+    mimetype = mimetype or mimetypes.guess_type(file_path)[0] or 'video/mp4'
+    note_stream_activity()
+    # Contents change underneath us, so no validators and no caching
+    headers = {'Accept-Ranges': 'bytes', 'Cache-Control': 'no-store'}
+
+    ranges = None
+    range_header = request.headers.get('Range', None)
+    if range_header:
+        ranges = parse_range_header(range_header, float('inf'))
+
+    f = open_for_streaming(file_path)
+    available = os.fstat(f.fileno()).st_size
+
+    if ranges and ranges[0] != (0, float('inf')):
+        # Multiple ranges are answered with the first one only
+        start, end = ranges[0]
+        if start >= available:
+            # Not written yet; the complete length is unknown so no Content-Range
+            f.close()
+            headers['Retry-After'] = '2'
+            return Response(status=416, headers=headers)
+        end = int(min(end, available - 1))
+        start = int(start)
+        headers['Content-Range'] = f'bytes {start}-{end}/*'
+        headers['Content-Length'] = str(end - start + 1)
+        response = Response(
+            stream_body(f, start, end - start + 1, chunk_size), 206,
+            headers=headers, mimetype=mimetype, direct_passthrough=True
+        )
+    else:
+        response = Response(
+            iter_growing_file(f, 0, is_finished, chunk_size), 200,
+            headers=headers, mimetype=mimetype, direct_passthrough=True
+        )
+
+    response.call_on_close(f.close)
+    return response
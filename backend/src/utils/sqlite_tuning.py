@@ -0,0 +1,76 @@
+"""
+SQLite connection tuning
+Applies production pragmas to every new SQLite connection: WAL journaling
+(readers don't block on the writer), synchronous=NORMAL (safe with WAL, one
+fsync per checkpoint instead of per commit), a busy timeout so competing
+writers wait instead of failing with "database is locked", plus a larger
+page cache, memory-mapped reads and in-memory temp tables.
+
+Each pragma can be overridden through its SQLITE_* environment variable;
+an empty value leaves SQLite's default in place.
+"""
+import os
+import logging
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+# pragma -> (environment variable, default)
+SQLITE_PRAGMAS = {
+    'journal_mode': ('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': ('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': ('SQLITE_BUSY_TIMEOUT_MS', '5000'),
+    'mmap_size': ('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)),
+    'cache_size': ('SQLITE_CACHE_SIZE', str(-64 * 1024)),  # negative = KiB, so 64 MiB
+    'temp_store': ('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+def sqlite_pragmas():
+    """{pragma: value} to apply, after environment overrides"""
+    pragmas = {}
+    for pragma, (env_var, default) in SQLITE_PRAGMAS.items():
+        value = os.environ.get(env_var, default).strip()
+        if value:
+            pragmas[pragma] = value
+    return pragmas
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
+def configure_sqlite_engine(engine, pragmas=None):
+    """Apply pragmas on every new connection of a SQLite engine (no-op for other databases)"""
+    if engine.dialect.name != 'sqlite':
+        return False
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    return True
+
+def sqlite_settings(engine):
+    """Effective values of the tuned pragmas on a fresh connection"""
+    with engine.connect() as conn:
+        settings = {pragma: conn.execute(text(f"PRAGMA {pragma}")).scalar() for pragma in SQLITE_PRAGMAS}
+        settings['sqlite_version'] = conn.execute(text("SELECT sqlite_version()")).scalar()
+    return settings
+
+def report_sqlite_settings(engine):
+    """Log the effective settings once at startup, warning when WAL couldn't be enabled"""
+    try:
+        settings = sqlite_settings(engine)
+    except Exception as e:
+        logger.warning(f"Could not read SQLite settings: {str(e)}")
+        return None
+    logger.info("SQLite settings: " + ', '.join(f"{name}={value}" for name, value in settings.items()))
+    requested = sqlite_pragmas().get('journal_mode', '').lower()
+    if requested and str(settings.get('journal_mode')).lower() != requested:
+        logger.warning(f"SQLite journal_mode is {settings.get('journal_mode')}, not {requested} "
+                       f"(in-memory database or unsupported filesystem?)")
+    return settings
@@ -2,169 +2,659 @@
 Background task manager for video transcoding jobs
 Uses threading to process transcode jobs without blocking HTTP requests
 
-Note: This implementation uses in-memory queues which work for single-process
-deployments (e.g., Flask development server, single Gunicorn worker).
-For multi-process production deployments, consider using a proper task queue
-like Celery, Redis Queue, or similar distributed task systems.
+The transcode_jobs table is the queue: workers claim a pending row with a
+conditional UPDATE, hold a lease on it that a heartbeat keeps extending, and
+any worker reclaims rows whose lease expired (crashed process, restart).
+This makes the queue safe to share between Gunicorn worker processes and
+keeps pending jobs across restarts. A claim only succeeds while fewer than
+TRANSCODE_WORKERS jobs hold a live lease, so the cap (and the ffmpeg
+thread sizing derived from it) holds for the whole host, however many
+processes run workers. The in-memory queue only holds hints
+for jobs enqueued by this process so they are claimed first.
 """
+import os
+import socket
 import threading
 import logging
 import hashlib
 import time
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
 from flask import current_app
 
 logger = logging.getLogger(__name__)
 
-# Global job queue and worker thread
-_job_queue = []
+def _default_worker_count():
+    """Half the cores: each encode gets ~2 threads, which scales better than one wide encode"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+# Number of concurrent ffmpeg processes across all processes sharing the database
+# (TRANSCODE_WORKERS=0 or unset sizes from CPU count); enforced when claiming jobs
+TRANSCODE_WORKERS = int(os.environ.get('TRANSCODE_WORKERS', 0)) or _default_worker_count()
+# Threads per ffmpeg job; defaults to an even share of the cores so workers don't oversubscribe
+TRANSCODE_FFMPEG_THREADS = int(os.environ.get('TRANSCODE_FFMPEG_THREADS', 0))
+# A claimed job is reclaimed by other workers if its lease is not renewed within this window
+TRANSCODE_LEASE_SECONDS = int(os.environ.get('TRANSCODE_LEASE_SECONDS', 120))
+HEARTBEAT_INTERVAL = max(1, TRANSCODE_LEASE_SECONDS // 4)
+# Minimum seconds between progress writes to a job row
+TRANSCODE_PROGRESS_INTERVAL = float(os.environ.get('TRANSCODE_PROGRESS_INTERVAL', 5.0))
+# How often idle workers look for jobs enqueued by other processes; local enqueues wake them instantly
+TRANSCODE_POLL_SECONDS = float(os.environ.get('TRANSCODE_POLL_SECONDS', 2.0))
+# Failed jobs are retried with exponential backoff until they've used up their attempts
+TRANSCODE_MAX_ATTEMPTS = int(os.environ.get('TRANSCODE_MAX_ATTEMPTS', 5))
+TRANSCODE_RETRY_BASE_SECONDS = int(os.environ.get('TRANSCODE_RETRY_BASE_SECONDS', 30))
+TRANSCODE_RETRY_MAX_SECONDS = int(os.environ.get('TRANSCODE_RETRY_MAX_SECONDS', 3600))
+# While viewers are streaming, at most this many workers run background jobs
+# (interactive jobs always run) and new encodes start at this nice level
+TRANSCODE_WORKERS_WHEN_STREAMING = int(os.environ.get('TRANSCODE_WORKERS_WHEN_STREAMING', 1))
+TRANSCODE_NICE_WHEN_STREAMING = int(os.environ.get('TRANSCODE_NICE_WHEN_STREAMING', 10))
+
+# Priority lanes: lower runs first
+PRIORITY_INTERACTIVE = 0  # a viewer is waiting on /stream
+PRIORITY_BACKGROUND = 1  # pre-caching via /transcode
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+class JobQueue:
+    """
+    Deduplicating multi-lane FIFO with condition-variable wakeups.
+    Each lane is a deque; a dict maps queued job IDs to their current lane
+    for O(1) membership. Promoting a job to a higher-priority lane leaves a
+    stale entry behind in the old lane, which get() skips.
+    """
+    
+    def __init__(self, lanes=2):
+        self._lanes = [deque() for _ in range(lanes)]
+        self._members = {}  # job_id -> lane index
+        self._cond = threading.Condition()
+    
+    def put(self, job_id, priority=PRIORITY_BACKGROUND):
+        """Queue a job or promote it to a higher lane. Returns False if it was already queued there."""
+        priority = min(max(priority, 0), len(self._lanes) - 1)
+        with self._cond:
+            current = self._members.get(job_id)
+            if current is not None and current <= priority:
+                return False
+            self._members[job_id] = priority
+            self._lanes[priority].append(job_id)
+            self._cond.notify()
+            return True
+    
+    def get(self, timeout=None):
+        """Pop the highest-priority job, waiting up to timeout seconds. Returns None on timeout."""
+        with self._cond:
+            job_id = self._pop()
+            if job_id is None and timeout != 0:
+                self._cond.wait(timeout)
+                job_id = self._pop()
+            return job_id
+    
+    def _pop(self):
+        for index, lane in enumerate(self._lanes):
+            while lane:
+                job_id = lane.popleft()
+                if self._members.get(job_id) == index:
+                    del self._members[job_id]
+                    return job_id
+        return None
+    
+    def wake_all(self):
+        """Release every waiting worker (used on shutdown)"""
+        with self._cond:
+            self._cond.notify_all()
+    
+    def depth_by_lane(self):
+        with self._cond:
+            depths = [0] * len(self._lanes)
+            for lane in self._members.values():
+                depths[lane] += 1
+            return depths
+    
+    def __contains__(self, job_id):
+        with self._cond:
+            return job_id in self._members
+    
+    def __len__(self):
+        with self._cond:
+            return len(self._members)
+
+# Global job queue and worker threads
+_job_queue = JobQueue(lanes=len(PRIORITY_NAMES))
+_active_jobs = set()
+_cancel_events = {}  # job_id -> Event that stops the ffmpeg run of a job this process is working on
 _queue_lock = threading.Lock()
-_worker_thread = None
+_worker_threads = []
 _worker_running = False
-_shutdown_event = threading.Event()
+_stats = {'completed': 0, 'failed': 0, 'started_at': None}
+_last_reclaim = 0.0
+
+def ffmpeg_threads_per_job(num_workers=None):
+    """Threads each ffmpeg process may use given the configured worker count"""
+    if TRANSCODE_FFMPEG_THREADS:
+        return TRANSCODE_FFMPEG_THREADS
+    return max(1, (os.cpu_count() or 1) // (num_workers or TRANSCODE_WORKERS))
 
-def get_job_id(file_path):
-    """Generate consistent job ID from file path using SHA-256"""
-    return hashlib.sha256(file_path.encode()).hexdigest()[:32]  # Use first 32 chars for readability
+def get_job_id(file_path, segment_index=None, profile=None):
+    """
+    Generate consistent job ID (SHA-256) from the file's content-addressed
+    cache key for the rendition, so a moved file maps to its existing job
+    """
+    from .video_transcoder import get_cache_key, DEFAULT_PROFILE
+    
+    key = get_cache_key(file_path, profile or DEFAULT_PROFILE)
+    if segment_index is not None:
+        key = f'{key}#segment={segment_index}'
+    return hashlib.sha256(key.encode()).hexdigest()[:32]  # Use first 32 chars for readability
 
-def start_worker(app):
-    """Start the background worker thread"""
-    global _worker_thread, _worker_running, _shutdown_event
+def start_worker(app, num_workers=None):
+    """Start the pool of background worker threads"""
+    global _worker_threads, _worker_running
     
-    if _worker_thread is not None and _worker_thread.is_alive():
-        logger.info("Worker thread already running")
+    if any(t.is_alive() for t in _worker_threads):
+        logger.info("Worker threads already running")
         return
     
-    _shutdown_event.clear()
+    num_workers = num_workers or TRANSCODE_WORKERS
+    threads = ffmpeg_threads_per_job(num_workers)
+    
+    # Jobs whose outputs were deleted while we were down must not report 'complete'
+    from .cache_manager import reconcile_jobs
+    with app.app_context():
+        try:
+            reconcile_jobs()
+        except Exception as e:
+            logger.error(f"Could not reconcile transcode jobs with the cache: {str(e)}")
+    
     _worker_running = True
-    _worker_thread = threading.Thread(
-        target=_worker_loop,
-        args=(app,),
-        daemon=True,
-        name="TranscodeWorker"
-    )
-    _worker_thread.start()
-    logger.info("Started transcode worker thread")
+    _stats.update(completed=0, failed=0, started_at=time.time())
+    _worker_threads = []
+    for i in range(num_workers):
+        worker = threading.Thread(
+            target=_worker_loop,
+            args=(app, threads),
+            daemon=True,
+            name=f"TranscodeWorker-{i + 1}"
+        )
+        worker.start()
+        _worker_threads.append(worker)
+    logger.info(f"Started {num_workers} transcode worker threads ({threads} ffmpeg threads each)")
 
 def stop_worker():
-    """Stop the background worker thread gracefully"""
-    global _worker_running, _shutdown_event
+    """Stop the background worker threads gracefully"""
+    global _worker_running
     
-    logger.info("Stopping transcode worker thread...")
+    logger.info("Stopping transcode worker threads...")
     _worker_running = False
-    _shutdown_event.set()
+    _job_queue.wake_all()
     
-    if _worker_thread is not None and _worker_thread.is_alive():
-        _worker_thread.join(timeout=5.0)
-        if _worker_thread.is_alive():
-            logger.warning("Worker thread did not stop gracefully")
-        else:
-            logger.info("Worker thread stopped successfully")
+    deadline = time.time() + 5.0
+    for worker in _worker_threads:
+        if worker.is_alive():
+            worker.join(timeout=max(0.0, deadline - time.time()))
+    alive = [w.name for w in _worker_threads if w.is_alive()]
+    if alive:
+        logger.warning(f"Worker threads did not stop gracefully: {', '.join(alive)}")
+    else:
+        logger.info("Worker threads stopped successfully")
+
+def _worker_id():
+    """Identify the claiming worker as host:pid:thread"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+def _claimable(now, max_priority=None):
+    """Filters for pending jobs that are out of retry backoff (and within max_priority)"""
+    from ..models import db, TranscodeJob
+    
+    filters = [
+        TranscodeJob.status == 'pending',
+        db.or_(TranscodeJob.next_attempt_at.is_(None), TranscodeJob.next_attempt_at <= now)
+    ]
+    if max_priority is not None:
+        filters.append(TranscodeJob.priority <= max_priority)
+    return filters
 
-def _worker_loop(app):
-    """Main worker loop that processes transcode jobs"""
+def claim_job(worker_id, job_id=None, max_priority=None):
+    """
+    Atomically move a pending job to processing for this worker.
+    Tries job_id if given, otherwise the oldest highest-priority pending jobs. The UPDATE only
+    matches while the row is still pending and fewer than TRANSCODE_WORKERS jobs hold a live
+    lease, so exactly one worker wins and no more than TRANSCODE_WORKERS run at once.
+    Jobs waiting out a retry backoff or above max_priority are skipped.
+    Returns the claimed job or None.
+    """
     from ..models import db, TranscodeJob
-    from .video_transcoder import transcode_to_h264
+    from sqlalchemy.orm import aliased
+    
+    if job_id is not None:
+        candidates = [job_id]
+    else:
+        candidates = [
+            row.id for row in TranscodeJob.query.with_entities(TranscodeJob.id)
+            .filter(*_claimable(datetime.utcnow(), max_priority))
+            .order_by(TranscodeJob.priority, TranscodeJob.created_at)
+            .limit(5)
+        ]
     
+    for candidate in candidates:
+        now = datetime.utcnow()
+        # Evaluated inside the UPDATE, so concurrent claims can't both see a free slot
+        running = aliased(TranscodeJob)
+        leased = db.select(db.func.count(running.id)).where(
+            running.status == 'processing', running.lease_expires_at > now
+        ).correlate(None).scalar_subquery()
+        claimed = TranscodeJob.query.filter(
+            TranscodeJob.id == candidate, *_claimable(now, max_priority), leased < TRANSCODE_WORKERS
+        ).update({
+            'status': 'processing',
+            'worker_id': worker_id,
+            'started_at': now,
+            'heartbeat_at': now,
+            'lease_expires_at': now + timedelta(seconds=TRANSCODE_LEASE_SECONDS),
+            'progress': 0,
+            'eta_seconds': None,
+            'attempts': db.func.coalesce(TranscodeJob.attempts, 0) + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return TranscodeJob.query.get(candidate)
+    return None
+
+def renew_lease(job_id, worker_id):
+    """Extend the lease on a job this worker holds. Returns False if it was lost."""
+    from ..models import db, TranscodeJob
+    
+    now = datetime.utcnow()
+    renewed = TranscodeJob.query.filter_by(id=job_id, worker_id=worker_id, status='processing').update({
+        'heartbeat_at': now,
+        'lease_expires_at': now + timedelta(seconds=TRANSCODE_LEASE_SECONDS)
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(renewed)
+
+def reclaim_stale_jobs():
+    """Return processing jobs whose lease expired to pending. Returns the number reclaimed."""
+    from ..models import db, TranscodeJob
+    
+    now = datetime.utcnow()
+    stale_started = now - timedelta(seconds=TRANSCODE_LEASE_SECONDS)
+    reclaimed = TranscodeJob.query.filter(
+        TranscodeJob.status == 'processing',
+        db.or_(
+            TranscodeJob.lease_expires_at < now,
+            # Rows claimed before leases existed
+            db.and_(
+                TranscodeJob.lease_expires_at.is_(None),
+                db.or_(TranscodeJob.started_at.is_(None), TranscodeJob.started_at < stale_started)
+            )
+        )
+    ).update({
+        'status': 'pending',
+        'worker_id': None,
+        'lease_expires_at': None,
+        'progress': 0
+    }, synchronize_session=False)
+    db.session.commit()
+    if reclaimed:
+        logger.warning(f"Reclaimed {reclaimed} transcode job(s) with expired leases")
+    return reclaimed
+
+def _maybe_reclaim_stale_jobs():
+    """Run reclaim_stale_jobs at most once per heartbeat interval per process"""
+    global _last_reclaim
+    with _queue_lock:
+        if time.time() - _last_reclaim < HEARTBEAT_INTERVAL:
+            return
+        _last_reclaim = time.time()
+    try:
+        reclaim_stale_jobs()
+    except Exception as e:
+        logger.error(f"Failed to reclaim stale jobs: {str(e)}")
+
+class _LeaseHeartbeat:
+    """
+    Keeps a claimed job's lease alive from a side thread while ffmpeg runs.
+    If the lease is lost (the job was paused, cancelled or reclaimed) it sets
+    cancel_event so ffmpeg stops instead of doing work nobody will use.
+    """
+    
+    def __init__(self, app, job_id, worker_id, cancel_event):
+        self.app = app
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.cancel_event = cancel_event
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"{worker_id}-heartbeat")
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=5.0)
+    
+    def _run(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            with self.app.app_context():
+                try:
+                    if not renew_lease(self.job_id, self.worker_id):
+                        logger.warning(f"Lost lease on transcode job {self.job_id}")
+                        self.cancel_event.set()
+                        return
+                except Exception as e:
+                    logger.error(f"Heartbeat failed for job {self.job_id}: {str(e)}")
+
+def _worker_loop(app, ffmpeg_threads=None):
+    """Main worker loop that claims and processes transcode jobs"""
     logger.info("Transcode worker loop started")
+    worker_id = _worker_id()
+    hinted_job_id = None
     
     while _worker_running:
-        job_id = None
-        
-        # Get next job from queue
-        with _queue_lock:
-            if _job_queue:
-                job_id = _job_queue.pop(0)
+        # Prefer jobs enqueued by this process, then anything pending in the table
+        if hinted_job_id is None:
+            hinted_job_id = _job_queue.get(timeout=0)
         
-        if job_id is None:
-            # No jobs, sleep briefly or wait for shutdown signal
-            _shutdown_event.wait(timeout=1.0)
-            continue
-        
-        # Process the job with app context
         with app.app_context():
+            # While viewers are streaming, spare workers only take jobs someone is waiting on
+            max_priority = PRIORITY_INTERACTIVE if _background_throttled() else None
             try:
-                job = TranscodeJob.query.get(job_id)
-                if not job:
-                    logger.error(f"Job {job_id} not found in database")
-                    continue
-                
-                if job.status != 'pending':
-                    logger.warning(f"Job {job_id} already processed (status: {job.status})")
-                    continue
-                
-                # Update status to processing
-                job.status = 'processing'
-                job.started_at = datetime.utcnow()
-                job.progress = 0
-                db.session.commit()
-                
-                logger.info(f"Starting transcode job {job_id}: {job.input_path}")
-                
-                # Perform transcoding
-                success = transcode_to_h264(job.input_path, job.output_path)
-                
-                # Update job status
-                if success:
-                    job.status = 'complete'
-                    job.progress = 100
-                    logger.info(f"Transcode job {job_id} completed successfully")
-                else:
-                    job.status = 'failed'
-                    job.error_message = 'Transcoding failed'
-                    logger.error(f"Transcode job {job_id} failed")
-                
-                job.completed_at = datetime.utcnow()
-                db.session.commit()
-                
+                _maybe_reclaim_stale_jobs()
+                job = claim_job(worker_id, hinted_job_id, max_priority)
+                if job is None and hinted_job_id is not None:
+                    job = claim_job(worker_id, max_priority=max_priority)
             except Exception as e:
-                logger.error(f"Error processing job {job_id}: {str(e)}", exc_info=True)
+                logger.error(f"Failed to claim transcode job: {str(e)}")
+                job = None
+            hinted_job_id = None
+            
+            if job is not None:
+                cancel_event = threading.Event()
+                with _queue_lock:
+                    _active_jobs.add(job.id)
+                    _cancel_events[job.id] = cancel_event
                 try:
-                    job = TranscodeJob.query.get(job_id)
-                    if job:
-                        job.status = 'failed'
-                        job.error_message = str(e)
-                        job.completed_at = datetime.utcnow()
-                        db.session.commit()
-                except Exception as db_error:
-                    logger.error(f"Failed to update job status: {str(db_error)}")
-
-def enqueue_job(job_id):
-    """Add a job to the processing queue"""
-    # Using a set for O(1) duplicate checking alongside the list
+                    with _LeaseHeartbeat(app, job.id, worker_id, cancel_event):
+                        _process_job(job, worker_id, ffmpeg_threads, cancel_event)
+                finally:
+                    with _queue_lock:
+                        _active_jobs.discard(job.id)
+                        _cancel_events.pop(job.id, None)
+                continue
+        
+        # Idle: a local enqueue or shutdown wakes us at once, otherwise re-poll the table
+        hinted_job_id = _job_queue.get(timeout=TRANSCODE_POLL_SECONDS)
+
+def _streams_active():
+    """True while any viewer is streaming from this process"""
+    from .range_streaming import active_stream_count
+    
+    return active_stream_count() > 0
+
+def _background_throttled():
+    """Whether this worker should leave background jobs alone right now"""
     with _queue_lock:
-        # Convert to set for faster lookup, then back to list
-        queue_set = set(_job_queue)
-        if job_id not in queue_set:
-            _job_queue.append(job_id)
-            logger.info(f"Enqueued job {job_id}, queue size: {len(_job_queue)}")
-            return True
+        busy = len(_active_jobs)
+    return busy >= TRANSCODE_WORKERS_WHEN_STREAMING and _streams_active()
+
+def retry_delay(attempts):
+    """Backoff before the next try of a job that has failed `attempts` times"""
+    return min(TRANSCODE_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), TRANSCODE_RETRY_MAX_SECONDS)
+
+class _ProgressReporter:
+    """
+    ffmpeg progress callback that writes progress and ETA to the job row at
+    most once per TRANSCODE_PROGRESS_INTERVAL, renewing the lease as it goes.
+    Sets cancel_event when the row is no longer ours to update (paused or cancelled).
+    """
+    
+    def __init__(self, job_id, worker_id, cancel_event=None):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.cancel_event = cancel_event
+        self._last_write = 0.0
+        self._last_progress = 0
+    
+    def __call__(self, percent, eta_seconds):
+        from ..models import db, TranscodeJob
+        
+        progress = int(percent)
+        now = time.monotonic()
+        if progress == self._last_progress or now - self._last_write < TRANSCODE_PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        self._last_progress = progress
+        try:
+            utcnow = datetime.utcnow()
+            updated = TranscodeJob.query.filter_by(
+                id=self.job_id, worker_id=self.worker_id, status='processing'
+            ).update({
+                'progress': progress,
+                'eta_seconds': int(eta_seconds) if eta_seconds is not None else None,
+                'heartbeat_at': utcnow,
+                'lease_expires_at': utcnow + timedelta(seconds=TRANSCODE_LEASE_SECONDS)
+            }, synchronize_session=False)
+            db.session.commit()
+            if not updated and self.cancel_event is not None:
+                self.cancel_event.set()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not record progress for job {self.job_id}: {str(e)}")
+
+def _finish_job(job_id, owner_id, **fields):
+    """Record a job outcome, but only while this worker (owner_id) still holds the lease"""
+    from ..models import db, TranscodeJob
+    
+    fields = {'completed_at': datetime.utcnow(), 'lease_expires_at': None, 'eta_seconds': None, **fields}
+    updated = TranscodeJob.query.filter_by(id=job_id, worker_id=owner_id, status='processing').update(
+        fields, synchronize_session=False
+    )
+    db.session.commit()
+    if not updated:
+        logger.warning(f"Job {job_id} was paused, cancelled or reclaimed; outcome not recorded")
+
+def _record_failure(job, worker_id, error_message):
+    """Schedule a retry with exponential backoff, or fail the job once its attempts are used up"""
+    attempts = job.attempts or 1
+    if attempts < TRANSCODE_MAX_ATTEMPTS:
+        delay = retry_delay(attempts)
+        _finish_job(
+            job.id, worker_id, status='pending', error_message=error_message, worker_id=None,
+            completed_at=None, next_attempt_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        logger.warning(f"Transcode job {job.id} failed (attempt {attempts}/{TRANSCODE_MAX_ATTEMPTS}), retrying in {delay}s")
+    else:
+        # Out of attempts: only a new request after the longest backoff (or /resume) retries it
+        _finish_job(
+            job.id, worker_id, status='failed', error_message=error_message,
+            next_attempt_at=datetime.utcnow() + timedelta(seconds=TRANSCODE_RETRY_MAX_SECONDS)
+        )
+        logger.error(f"Transcode job {job.id} failed after {attempts} attempts")
+
+def _enforce_cache_budget():
+    """Evict old cache entries if needed; cache trouble never fails a job"""
+    from ..models import db
+    from .cache_manager import enforce_budget
+    
+    try:
+        enforce_budget()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Cache eviction failed: {str(e)}")
+
+def _process_job(job, worker_id, ffmpeg_threads=None, cancel_event=None):
+    """Run a single claimed transcode job and record its outcome"""
+    from ..models import db
+    from .video_transcoder import transcode_to_h264, DEFAULT_PROFILE
+    from .hls import transcode_segment
+    
+    job_id = job.id
+    try:
+        logger.info(f"Starting transcode job {job_id}: {job.input_path}")
+        _enforce_cache_budget()  # Make room before writing another output
+        
+        # Yield the CPU to the streaming server while viewers are watching
+        nice = TRANSCODE_NICE_WHEN_STREAMING if _streams_active() else 0
+        
+        # Perform transcoding
+        if job.segment_index is not None:
+            success = transcode_segment(
+                job.input_path, job.segment_index, job.output_path, threads=ffmpeg_threads,
+                cancel_event=cancel_event, nice=nice, profile=job.profile or DEFAULT_PROFILE
+            )
+        else:
+            success = transcode_to_h264(
+                job.input_path, job.output_path,
+                threads=ffmpeg_threads,
+                on_progress=_ProgressReporter(job_id, worker_id, cancel_event),
+                cancel_event=cancel_event, nice=nice,
+                profile=job.profile or DEFAULT_PROFILE
+            )
+        
+        # Update job status
+        if success:
+            _finish_job(job_id, worker_id, status='complete', progress=100)
+            _stats['completed'] += 1
+            logger.info(f"Transcode job {job_id} completed successfully")
+            _enforce_cache_budget()
+        elif cancel_event is not None and cancel_event.is_set():
+            # Paused, cancelled or reclaimed: whoever did that already set the row's status
+            logger.info(f"Transcode job {job_id} stopped before finishing")
         else:
-            logger.info(f"Job {job_id} already in queue")
+            _stats['failed'] += 1
+            _record_failure(job, worker_id, 'Transcoding failed')
+        
+    except Exception as e:
+        logger.error(f"Error processing job {job_id}: {str(e)}", exc_info=True)
+        _stats['failed'] += 1
+        try:
+            db.session.rollback()
+            _record_failure(job, worker_id, str(e))
+        except Exception as db_error:
+            logger.error(f"Failed to update job status: {str(db_error)}")
+
+def enqueue_job(job_id, priority=PRIORITY_BACKGROUND):
+    """Add a job to the processing queue and wake an idle worker"""
+    with _queue_lock:
+        if job_id in _active_jobs:
+            logger.info(f"Job {job_id} is already being processed")
             return False
+    if _job_queue.put(job_id, priority):
+        logger.info(f"Enqueued job {job_id} ({PRIORITY_NAMES.get(priority, priority)}), queue size: {len(_job_queue)}")
+        return True
+    logger.info(f"Job {job_id} already in queue")
+    return False
 
-def create_or_get_job(file_path, cache_path):
-    """Create a new transcoding job or return existing one"""
+def _reset_job(job):
+    """Put a job back to a fresh pending state with a full set of attempts"""
+    job.status = 'pending'
+    job.error_message = None
+    job.started_at = None
+    job.completed_at = None
+    job.worker_id = None
+    job.lease_expires_at = None
+    job.next_attempt_at = None
+    job.attempts = 0
+    job.progress = 0
+
+def _stop_local_run(job_id):
+    """Stop ffmpeg right away if this process is running the job (other processes notice via their lease)"""
+    with _queue_lock:
+        cancel_event = _cancel_events.get(job_id)
+    if cancel_event is not None:
+        cancel_event.set()
+
+def _change_status(job_id, from_statuses, to_status):
+    """
+    Conditionally move a job between states. Returns (job, error) where error
+    is None on success, 'not_found' or 'invalid_state'.
+    """
     from ..models import db, TranscodeJob
     
-    job_id = get_job_id(file_path)
+    fields = {'status': to_status, 'lease_expires_at': None, 'eta_seconds': None}
+    if to_status == 'cancelled':
+        fields['completed_at'] = datetime.utcnow()
+    updated = TranscodeJob.query.filter(
+        TranscodeJob.id == job_id, TranscodeJob.status.in_(from_statuses)
+    ).update(fields, synchronize_session=False)
+    db.session.commit()
+    
+    job = TranscodeJob.query.get(job_id)
+    if job is None:
+        return None, 'not_found'
+    if not updated:
+        return job, 'invalid_state'
+    _stop_local_run(job_id)
+    return job, None
+
+def cancel_job(job_id):
+    """Cancel a pending, paused or running job; a running ffmpeg is killed"""
+    job, error = _change_status(job_id, ('pending', 'processing', 'paused'), 'cancelled')
+    if not error:
+        logger.info(f"Cancelled transcode job {job_id}")
+    return job, error
+
+def pause_job(job_id):
+    """Hold a pending or running job; a running encode is stopped and restarts from scratch on resume"""
+    job, error = _change_status(job_id, ('pending', 'processing'), 'paused')
+    if not error:
+        logger.info(f"Paused transcode job {job_id}")
+    return job, error
+
+def resume_job(job_id):
+    """Re-queue a paused, cancelled or failed job with a fresh set of attempts"""
+    from ..models import db, TranscodeJob
+    
+    job = TranscodeJob.query.get(job_id)
+    if job is None:
+        return None, 'not_found'
+    if job.status not in ('paused', 'cancelled', 'failed'):
+        return job, 'invalid_state'
+    _reset_job(job)
+    db.session.commit()
+    enqueue_job(job.id, priority=job.priority if job.priority is not None else PRIORITY_BACKGROUND)
+    logger.info(f"Resumed transcode job {job_id}")
+    return job, None
+
+def create_or_get_job(file_path, cache_path, priority=PRIORITY_BACKGROUND, segment_index=None, profile=None):
+    """
+    Create a new transcoding job or return existing one
+    A pending job requested at a higher priority (e.g. someone pressed play
+    on a file that was only being pre-cached) is promoted
+    segment_index makes it a job for a single HLS segment written to cache_path
+    profile names the ENCODE_PROFILES rendition (default: source)
+    """
+    from ..models import db, TranscodeJob
+    from .video_transcoder import DEFAULT_PROFILE
+    
+    profile = profile or DEFAULT_PROFILE
+    job_id = get_job_id(file_path, segment_index, profile)
     
     # Check if job already exists
     job = TranscodeJob.query.get(job_id)
     
     if job:
+        if job.status in ('pending', 'failed', 'paused') and (job.priority is None or priority < job.priority):
+            job.priority = priority
+            db.session.commit()
+        
+        if job.status != 'processing' and (job.input_path != file_path or job.output_path != cache_path):
+            # Same content found at a new path (the file was moved or renamed)
+            job.input_path = file_path
+            job.output_path = cache_path
+            db.session.commit()
+        
         # Job exists, check status
-        if job.status == 'complete':
+        if job.status == 'complete' and os.path.exists(job.output_path):
             return job, False  # Job already complete, no need to enqueue
         elif job.status == 'processing':
             return job, False  # Job already being processed
-        elif job.status == 'failed':
-            # Retry failed job
-            job.status = 'pending'
-            job.error_message = None
-            job.started_at = None
-            job.completed_at = None
-            job.progress = 0
+        elif job.status == 'paused':
+            return job, False  # Held until someone resumes it
+        elif job.status == 'failed' and job.next_attempt_at and job.next_attempt_at > datetime.utcnow():
+            return job, False  # Failed repeatedly; don't retry before the backoff runs out
+        elif job.status in ('failed', 'complete', 'cancelled'):
+            # Retry failed job, restart a cancelled one, or redo one whose output was evicted from the cache
+            _reset_job(job)
             db.session.commit()
             return job, True  # Need to enqueue
         else:  # pending
@@ -175,7 +665,10 @@ def create_or_get_job(file_path, cache_path):
         id=job_id,
         input_path=file_path,
         output_path=cache_path,
+        segment_index=segment_index,
+        profile=profile,
         status='pending',
+        priority=priority,
         progress=0
     )
     db.session.add(job)
@@ -189,3 +682,25 @@ def get_job_status(job_id):
     
     job = TranscodeJob.query.get(job_id)
     return job.to_dict() if job else None
+
+def get_queue_stats():
+    """Queue depth, active jobs and throughput since the pool started"""
+    from .range_streaming import active_stream_count
+
+    lane_depths = _job_queue.depth_by_lane()
+    with _queue_lock:
+        active = len(_active_jobs)
+    streaming_clients = active_stream_count()
+    elapsed = time.time() - _stats['started_at'] if _stats['started_at'] else 0
+    return {
+        'workers': sum(1 for t in _worker_threads if t.is_alive()),
+        'ffmpeg_threads_per_job': ffmpeg_threads_per_job(len(_worker_threads) or None),
+        'queue_depth': sum(lane_depths),
+        'queue_depth_by_priority': {PRIORITY_NAMES[i]: depth for i, depth in enumerate(lane_depths)},
+        'active_jobs': active,
+        'streaming_clients': streaming_clients,
+        'background_throttled': _background_throttled(),
+        'completed': _stats['completed'],
+        'failed': _stats['failed'],
+        'jobs_per_hour': round(_stats['completed'] * 3600 / elapsed, 1) if elapsed else 0.0
+    }
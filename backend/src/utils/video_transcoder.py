@@ -3,61 +3,538 @@ Video transcoding utilities using FFmpeg
 """
 import subprocess
 import os
+import json
+import time
 import hashlib
 import logging
+import sqlite3
+import threading
 import fcntl
+from collections import deque
 
 logger = logging.getLogger(__name__)
 
 TRANSCODE_CACHE_DIR = os.environ.get('TRANSCODE_CACHE_DIR', '/tmp/ubermensch_video_cache')
+# Persistent ffprobe results, keyed on (path, size, mtime) so edits invalidate them
+PROBE_CACHE_PATH = os.environ.get('PROBE_CACHE_PATH', os.path.join(TRANSCODE_CACHE_DIR, 'probe_cache.db'))
+# Failed probes are retried after this many seconds instead of on every request
+PROBE_FAILURE_TTL = 60
+# faststart: classic MP4 with the moov atom moved to the front once encoding finishes
+# fragmented: write fragmented MP4 that can be streamed while ffmpeg is still running;
+# the finished file is then remuxed to faststart so later viewers get an indexed MP4
+TRANSCODE_OUTPUT = os.environ.get('TRANSCODE_OUTPUT', 'faststart').lower()
+# Keyframe (and therefore fragment) spacing for fragmented output
+FRAGMENT_SECONDS = 2
 
-def get_video_codec(file_path):
-    """Get the video codec of a file using ffprobe"""
+# Stream combinations browsers play natively
+BROWSER_VIDEO_CODECS = {'h264', 'avc1', 'avc'}
+BROWSER_AUDIO_CODECS = {'aac', 'mp3'}
+BROWSER_PIX_FMTS = {'yuv420p', 'yuvj420p'}  # 10-bit / 4:2:2 H.264 won't decode in browsers
+WEBM_VIDEO_CODECS = {'vp8', 'vp9', 'av1'}
+WEBM_AUDIO_CODECS = {'opus', 'vorbis'}
+
+# Bytes hashed from each end of a file for its content fingerprint
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+# Named renditions: height cap, x264 quality/speed, bitrate ceilings (kbps).
+# cache_tag goes into the cache key; change it when a profile's output changes
+ENCODE_PROFILES = {
+    'source': {'max_height': None, 'crf': 23, 'preset': 'fast', 'max_video_kbps': None,
+               'audio_kbps': 192, 'cache_tag': 'h264'},
+    '720p': {'max_height': 720, 'crf': 23, 'preset': 'faster', 'max_video_kbps': 3000,
+             'audio_kbps': 128, 'cache_tag': 'h264-720p'},
+    '480p': {'max_height': 480, 'crf': 26, 'preset': 'veryfast', 'max_video_kbps': 1200,
+             'audio_kbps': 96, 'cache_tag': 'h264-480p'},
+}
+DEFAULT_PROFILE = 'source'
+# Assumed bitrate of a source rendition whose probe has none
+SOURCE_BANDWIDTH_FALLBACK = 8_000_000
+
+_probe_memo = {}  # path -> (size, mtime_ns, info)
+_probe_failures = {}  # path -> (size, mtime_ns, failed_at)
+_fingerprint_memo = {}  # path -> (size, mtime_ns, fingerprint)
+_probe_lock = threading.Lock()
+_probe_local = threading.local()
+
+def _probe_db():
+    """Per-thread connection to the probe cache database"""
+    conn = getattr(_probe_local, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(PROBE_CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(PROBE_CACHE_PATH, timeout=10)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS probe_cache (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                info TEXT NOT NULL,
+                probed_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS content_fingerprints (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL
+            )
+        """)
+        conn.commit()
+        _probe_local.conn = conn
+    return conn
+
+def run_ffprobe(file_path):
+    """Run ffprobe once and return codec, duration and resolution info (None on failure)"""
     try:
         result = subprocess.run([
-            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
-            '-show_entries', 'stream=codec_name', '-of', 'csv=p=0',
-            file_path
-        ], capture_output=True, text=True, timeout=10)
-        return result.stdout.strip().lower()
+            'ffprobe', '-v', 'error', '-print_format', 'json',
+            '-show_format', '-show_streams', file_path
+        ], capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            logger.error(f"ffprobe failed for {file_path}: {result.stderr.strip()}")
+            return None
+        data = json.loads(result.stdout or '{}')
     except Exception as e:
         logger.error(f"ffprobe failed for {file_path}: {e}")
         return None
 
-def needs_transcoding(file_path):
-    """Check if video needs transcoding for browser playback"""
-    codec = get_video_codec(file_path)
-    if not codec:
+    streams = data.get('streams', [])
+    video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    format_info = data.get('format', {})
+    width = video_stream.get('width') if video_stream else None
+    height = video_stream.get('height') if video_stream else None
+
+    return {
+        'codec': (video_stream.get('codec_name') or '').lower() if video_stream else None,
+        'audio_codec': (audio_stream.get('codec_name') or '').lower() if audio_stream else None,
+        'duration': float(format_info.get('duration') or 0),
+        'width': width,
+        'height': height,
+        'resolution': f"{width}x{height}" if width and height else None,
+        'pix_fmt': video_stream.get('pix_fmt') if video_stream else None,
+        'format_name': format_info.get('format_name', ''),
+        'bit_rate': int(format_info.get('bit_rate') or 0)
+    }
+
+def store_probe_results(results):
+    """
+    Persist probe results in one transaction.
+    results: iterable of (path, size, mtime_ns, info) tuples
+    """
+    rows = []
+    with _probe_lock:
+        for path, size, mtime_ns, info in results:
+            _probe_memo[path] = (size, mtime_ns, info)
+            _probe_failures.pop(path, None)
+            rows.append((path, size, mtime_ns, json.dumps(info), time.time()))
+    if not rows:
+        return
+    try:
+        conn = _probe_db()
+        conn.executemany(
+            "INSERT OR REPLACE INTO probe_cache (path, size, mtime_ns, info, probed_at) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not persist probe results: {e}")
+
+def get_cached_probe(file_path, stat_result=None):
+    """Return cached probe info if it is still valid for the file on disk, else None"""
+    try:
+        stat_result = stat_result or os.stat(file_path)
+    except OSError:
+        return None
+    key = (stat_result.st_size, stat_result.st_mtime_ns)
+
+    memo = _probe_memo.get(file_path)
+    if memo and memo[:2] == key:
+        return memo[2]
+
+    try:
+        row = _probe_db().execute(
+            "SELECT size, mtime_ns, info FROM probe_cache WHERE path = ?", (file_path,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Probe cache lookup failed: {e}")
+        return None
+    if row and (row[0], row[1]) == key:
+        info = json.loads(row[2])
+        with _probe_lock:
+            _probe_memo[file_path] = (row[0], row[1], info)
+        return info
+    return None
+
+def probe_video(file_path):
+    """
+    Get codec, audio codec, duration and resolution for a file.
+    Served from the in-process memo or the persistent probe cache; ffprobe
+    only runs when the file is new or its size/mtime changed.
+    """
+    try:
+        stat_result = os.stat(file_path)
+    except OSError:
+        return None
+
+    info = get_cached_probe(file_path, stat_result)
+    if info is not None:
+        return info
+
+    key = (stat_result.st_size, stat_result.st_mtime_ns)
+    failure = _probe_failures.get(file_path)
+    if failure and failure[:2] == key and time.time() - failure[2] < PROBE_FAILURE_TTL:
+        return None
+
+    info = run_ffprobe(file_path)
+    if info is None:
+        with _probe_lock:
+            _probe_failures[file_path] = (key[0], key[1], time.time())
+        return None
+
+    store_probe_results([(file_path, key[0], key[1], info)])
+    return info
+
+def get_video_codec(file_path):
+    """Get the video codec of a file (cached ffprobe)"""
+    info = probe_video(file_path)
+    return info.get('codec') if info else None
+
+def get_playback_strategy(file_path, info=None):
+    """
+    Cheapest way to make a video browser-playable, from its container and streams:
+    'direct' - serve as-is
+    'remux' - copy the H.264 stream into MP4, re-encoding audio only if needed
+    'transcode' - full H.264/AAC encode
+    """
+    info = info or probe_video(file_path)
+    if not info or not info.get('codec'):
         # If we can't detect codec, assume it needs transcoding to be safe
-        return True
-    # These codecs play natively in browsers
-    browser_compatible = ['h264', 'avc1', 'avc']
-    return codec not in browser_compatible
-
-def get_cache_path(original_path):
-    """Generate cache path for transcoded file using SHA-256 for security"""
-    # Use SHA-256 instead of MD5 for better security
-    path_hash = hashlib.sha256(original_path.encode()).hexdigest()[:16]
-    filename = os.path.basename(original_path)
-    name, _ = os.path.splitext(filename)
-    # Limit filename length for filesystem compatibility
-    safe_name = name[:50].replace('/', '_').replace('\\', '_')
-    return os.path.join(TRANSCODE_CACHE_DIR, f"{path_hash}_{safe_name}.mp4")
+        return 'transcode'
+    
+    formats = (info.get('format_name') or '').split(',')
+    video_codec = info['codec']
+    audio_codec = info.get('audio_codec')
+    pix_fmt = info.get('pix_fmt')
+    
+    if video_codec in BROWSER_VIDEO_CODECS:
+        if pix_fmt and pix_fmt not in BROWSER_PIX_FMTS:
+            return 'transcode'
+        if 'mp4' in formats and (audio_codec is None or audio_codec in BROWSER_AUDIO_CODECS):
+            return 'direct'
+        return 'remux'
+    
+    if ('webm' in formats and file_path.lower().endswith('.webm')
+            and video_codec in WEBM_VIDEO_CODECS
+            and (audio_codec is None or audio_codec in WEBM_AUDIO_CODECS)):
+        return 'direct'
+    
+    return 'transcode'
+
+def needs_transcoding(file_path):
+    """Check if video needs transcoding (or a remux) for browser playback"""
+    return get_playback_strategy(file_path) != 'direct'
+
+def compute_fingerprint(file_path, size):
+    """SHA-256 over the file size and its first and last MiB"""
+    digest = hashlib.sha256(str(size).encode())
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_CHUNK_SIZE))
+        if size > FINGERPRINT_CHUNK_SIZE:
+            f.seek(max(size - FINGERPRINT_CHUNK_SIZE, FINGERPRINT_CHUNK_SIZE))
+            digest.update(f.read(FINGERPRINT_CHUNK_SIZE))
+    return digest.hexdigest()
+
+def get_content_fingerprint(file_path, compute=True):
+    """
+    Cheap content identity for a file that survives moves and renames.
+    Cached next to the probe results, keyed on (path, size, mtime), so each
+    file is only read once. None when the file can't be read, or with
+    compute=False when it isn't cached yet (no file contents are read).
+    """
+    try:
+        stat_result = os.stat(file_path)
+    except OSError:
+        return None
+    key = (stat_result.st_size, stat_result.st_mtime_ns)
+
+    memo = _fingerprint_memo.get(file_path)
+    if memo and memo[:2] == key:
+        return memo[2]
+
+    try:
+        row = _probe_db().execute(
+            "SELECT size, mtime_ns, fingerprint FROM content_fingerprints WHERE path = ?", (file_path,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Fingerprint cache lookup failed: {e}")
+        row = None
+
+    if row and (row[0], row[1]) == key:
+        fingerprint = row[2]
+    elif not compute:
+        return None
+    else:
+        try:
+            fingerprint = compute_fingerprint(file_path, stat_result.st_size)
+        except OSError as e:
+            logger.error(f"Could not fingerprint {file_path}: {e}")
+            return None
+        try:
+            conn = _probe_db()
+            conn.execute(
+                "INSERT OR REPLACE INTO content_fingerprints (path, size, mtime_ns, fingerprint) VALUES (?, ?, ?, ?)",
+                (file_path, key[0], key[1], fingerprint)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist fingerprint: {e}")
+
+    with _probe_lock:
+        _fingerprint_memo[file_path] = (key[0], key[1], fingerprint)
+    return fingerprint
+
+def get_cache_key(original_path, profile=DEFAULT_PROFILE):
+    """
+    Content-addressed key for a source file's transcode in a given profile.
+    Moving or renaming the source keeps its key, so its cache entry and job are reused.
+    """
+    fingerprint = get_content_fingerprint(original_path)
+    if fingerprint is None:
+        # Unreadable file: fall back to the path so callers still get a stable key
+        fingerprint = hashlib.sha256(original_path.encode()).hexdigest()
+    return cache_key_for_fingerprint(fingerprint, profile)
+
+def cache_key_for_fingerprint(fingerprint, profile=DEFAULT_PROFILE):
+    """Cache key of a rendition from an already known content fingerprint"""
+    return f"{fingerprint[:32]}-{ENCODE_PROFILES[profile]['cache_tag']}"
+
+def get_cache_path(original_path, profile=DEFAULT_PROFILE):
+    """Generate cache path for transcoded file from its content fingerprint"""
+    return os.path.join(TRANSCODE_CACHE_DIR, f"{get_cache_key(original_path, profile)}.mp4")
+
+def resolve_profile(file_path, profile=None, info=None):
+    """
+    Profile that is actually encoded for a requested rendition. Unknown names
+    fall back to DEFAULT_PROFILE, and a height cap at or above the source's
+    height is the source rendition, so the same output isn't encoded twice
+    """
+    if profile not in ENCODE_PROFILES:
+        return DEFAULT_PROFILE
+    max_height = ENCODE_PROFILES[profile]['max_height']
+    if max_height:
+        info = info or probe_video(file_path)
+        if info and info.get('height') and info['height'] <= max_height:
+            return DEFAULT_PROFILE
+    return profile
+
+def available_profiles(file_path, info=None):
+    """Renditions worth offering for a source: itself plus every smaller height cap"""
+    info = info or probe_video(file_path)
+    return [name for name in ENCODE_PROFILES if resolve_profile(file_path, name, info) == name]
+
+def profile_bandwidth(profile, info=None):
+    """Peak bits per second of a rendition, for HLS variants and client hints"""
+    settings = ENCODE_PROFILES[profile]
+    if settings['max_video_kbps']:
+        return (settings['max_video_kbps'] + settings['audio_kbps']) * 1000
+    return (info or {}).get('bit_rate') or SOURCE_BANDWIDTH_FALLBACK
+
+def profile_resolution(profile, info):
+    """(width, height) of a rendition of a probed source, or None if unknown"""
+    width, height = (info or {}).get('width'), (info or {}).get('height')
+    if not width or not height:
+        return None
+    max_height = ENCODE_PROFILES[profile]['max_height']
+    if max_height and height > max_height:
+        # Same rounding as scale=-2: keep the aspect ratio with an even width
+        return int(round(width * max_height / height / 2)) * 2, max_height
+    return width, height
+
+def pick_profile(info=None, downlink_mbps=None, viewport_pixels=None, save_data=False):
+    """
+    Largest rendition that suits a client: within ~80% of its downlink, no
+    larger than needed for its viewport width, and the smallest under Save-Data
+    """
+    ordered = sorted(ENCODE_PROFILES, key=lambda name: ENCODE_PROFILES[name]['max_height'] or float('inf'))
+    chosen = ordered[0]
+    if save_data:
+        return chosen
+    for name in ordered:
+        if downlink_mbps is not None and profile_bandwidth(name, info) > downlink_mbps * 800_000:
+            break
+        chosen = name
+        max_height = ENCODE_PROFILES[name]['max_height']
+        if viewport_pixels and max_height and max_height * 16 / 9 >= viewport_pixels:
+            break
+    return chosen
+
+def video_encode_args(profile=DEFAULT_PROFILE, preset=None):
+    """libx264 options for a profile; preset overrides the profile's for latency-bound encodes"""
+    settings = ENCODE_PROFILES[profile]
+    args = ['-c:v', 'libx264', '-preset', preset or settings['preset'],
+            '-crf', str(settings['crf']), '-pix_fmt', 'yuv420p']
+    if settings['max_video_kbps']:
+        # Capped CRF: quality-driven, but never above what the rendition is sized for
+        args += ['-maxrate', f"{settings['max_video_kbps']}k", '-bufsize', f"{settings['max_video_kbps'] * 2}k"]
+    if settings['max_height']:
+        args += ['-vf', f"scale=-2:'min({settings['max_height']},ih)'"]
+    return args
+
+def audio_encode_args(profile=DEFAULT_PROFILE):
+    """AAC options for a profile"""
+    return ['-c:a', 'aac', '-b:a', f"{ENCODE_PROFILES[profile]['audio_kbps']}k"]
 
 def ensure_cache_dir():
     """Create cache directory if it doesn't exist"""
     os.makedirs(TRANSCODE_CACHE_DIR, exist_ok=True)
 
-def transcode_to_h264(input_path, output_path):
+def is_progressive_output():
+    """True when transcodes write fragmented MP4 that is playable while growing"""
+    return TRANSCODE_OUTPUT == 'fragmented'
+
+def container_args(copy_video=False):
+    """ffmpeg MP4 muxer options for the configured output mode"""
+    if is_progressive_output():
+        # An empty moov up front plus a fragment per keyframe lets players start
+        # on the first fragment; forced keyframes keep fragments short
+        # (a copied stream keeps the source's keyframes)
+        keyframe_args = [] if copy_video else [
+            '-force_key_frames', f'expr:gte(t,n_forced*{FRAGMENT_SECONDS})'
+        ]
+        return [*keyframe_args, '-movflags', '+frag_keyframe+empty_moov+default_base_moof']
+    return ['-movflags', '+faststart']  # Enable streaming before complete
+
+def get_partial_path(output_path):
+    """Path ffmpeg writes to before the finished file is renamed into place"""
+    return output_path + '.tmp'
+
+def finalize_output(temp_path, output_path):
+    """
+    Move a finished transcode into place. Fragmented output has no seek index
+    up front, so it is first remuxed (stream copy) into a faststart MP4; the
+    fragmented file stays in place for progressive viewers until then, and is
+    kept as the result if the remux fails.
+    """
+    if is_progressive_output():
+        final_temp = output_path + '.faststart.tmp'
+        try:
+            run_ffmpeg([
+                '-i', temp_path,
+                '-map', '0', '-c', 'copy',
+                '-movflags', '+faststart',
+                '-f', 'mp4', '-y',
+                final_temp
+            ], timeout=600)
+            os.rename(final_temp, output_path)
+            os.remove(temp_path)
+            return
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+            logger.warning(f"Faststart remux failed, keeping fragmented output: {getattr(e, 'stderr', None) or e}")
+            if os.path.exists(final_temp):
+                os.remove(final_temp)
+    os.rename(temp_path, output_path)
+
+def _parse_out_time(fields):
+    """Seconds of output written so far, from an ffmpeg -progress block"""
+    for key in ('out_time_us', 'out_time_ms'):  # both are microseconds
+        value = fields.get(key, '')
+        if value.isdigit():
+            return int(value) / 1_000_000
+    return None
+
+class TranscodeCancelled(Exception):
+    """ffmpeg was stopped because its job was cancelled, paused or lost"""
+
+def run_ffmpeg(args, duration=None, on_progress=None, timeout=3600, cancel_event=None, nice=0):
+    """
+    Run ffmpeg with -progress streamed over stdout.
+    on_progress(percent, eta_seconds) is called once per progress block when
+    the input duration is known. Only the last lines of stderr are kept for
+    error reporting, instead of buffering the whole log in memory.
+    Setting cancel_event kills ffmpeg at its next progress block; nice lowers
+    its CPU priority (set on the child's pid right after it starts).
+    Raises CalledProcessError / TimeoutExpired like subprocess.run(check=True),
+    or TranscodeCancelled.
+    """
+    cmd = ['ffmpeg', '-nostats', '-progress', 'pipe:1', *args]
+    process = subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, bufsize=1
+    )
+    if nice:
+        # Set from the parent: preexec_fn isn't safe in a threaded process
+        try:
+            os.setpriority(os.PRIO_PROCESS, process.pid, nice)
+        except OSError as e:
+            logger.warning(f"Could not lower ffmpeg priority: {str(e)}")
+    stderr_tail = deque(maxlen=40)
+    stderr_reader = threading.Thread(
+        target=lambda: stderr_tail.extend(line.rstrip() for line in process.stderr),
+        daemon=True
+    )
+    stderr_reader.start()
+    timed_out = threading.Event()
+
+    def kill_on_timeout():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill_on_timeout)
+    timer.daemon = True
+    timer.start()
+    started = time.monotonic()
+    try:
+        fields = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            fields[key] = value
+            if key != 'progress':
+                continue
+            if cancel_event is not None and cancel_event.is_set():
+                process.kill()
+                break
+            out_time = _parse_out_time(fields)
+            if on_progress and duration and out_time is not None:
+                percent = min(out_time / duration * 100, 99.0)
+                speed = fields.get('speed', '').rstrip('x')
+                try:
+                    eta = (duration - out_time) / float(speed)
+                except (ValueError, ZeroDivisionError):
+                    elapsed = time.monotonic() - started
+                    eta = elapsed * (100 - percent) / percent if percent > 0 else None
+                on_progress(percent, max(eta, 0) if eta is not None else None)
+            fields = {}
+        process.wait()
+    finally:
+        timer.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_reader.join(timeout=5)
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise TranscodeCancelled(cmd)
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stderr='\n'.join(stderr_tail))
+
+def transcode_to_h264(input_path, output_path, threads=None, on_progress=None, cancel_event=None, nice=0,
+                      profile=DEFAULT_PROFILE):
     """
     Transcode video to H.264/AAC for browser playback
-    Uses 'fast' preset for reasonable speed/quality balance
+    For the source profile, H.264 sources in other containers are remuxed with
+    stream copy and browser-compatible audio is copied; everything else is
+    encoded with the profile's ENCODE_PROFILES settings
     Implements file-based locking to prevent race conditions
+    threads caps ffmpeg's thread count so parallel workers don't oversubscribe
+    on_progress(percent, eta_seconds) receives live progress from ffmpeg
+    cancel_event / nice are passed to run_ffmpeg
     """
     ensure_cache_dir()
     
     # Create temp file first, then rename (atomic operation)
-    temp_path = output_path + '.tmp'
+    temp_path = get_partial_path(output_path)
     lock_path = output_path + '.lock'
     
     # File-based locking to prevent concurrent transcoding of same file
@@ -72,23 +549,46 @@ def transcode_to_h264(input_path, output_path):
             return False
         
         try:
-            logger.info(f"Transcoding: {input_path}")
-            # Remove unused result variable - we only care about success/failure
-            subprocess.run([
-                'ffmpeg', '-i', input_path,
-                '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
-                '-c:a', 'aac', '-b:a', '192k',
-                '-movflags', '+faststart',  # Enable streaming before complete
+            info = probe_video(input_path)
+            full_size = profile == DEFAULT_PROFILE
+            copy_video = full_size and get_playback_strategy(input_path, info) == 'remux'
+            copy_audio = full_size and bool(info) and info.get('audio_codec') in BROWSER_AUDIO_CODECS
+            logger.info(f"{'Remuxing' if copy_video else 'Transcoding'} ({profile}): {input_path}")
+            
+            if copy_video:
+                # AVI/MKV H.264 often lacks proper timestamps, which MP4 requires
+                input_args = ['-fflags', '+genpts']
+                video_args = ['-c:v', 'copy']
+            else:
+                input_args = []
+                video_args = video_encode_args(profile)
+            audio_args = ['-c:a', 'copy'] if copy_audio else audio_encode_args(profile)
+            thread_args = ['-threads', str(threads)] if threads else []
+            run_ffmpeg([
+                *input_args,
+                '-i', input_path,
+                '-map', '0:v:0', '-map', '0:a:0?',  # Skip subtitle/data streams MP4 can't carry
+                *video_args,
+                *audio_args,
+                *thread_args,
+                *container_args(copy_video),
                 '-f', 'mp4',  # Explicitly specify MP4 container format
                 '-y',  # Overwrite
                 temp_path
-            ], check=True, capture_output=True, text=True, timeout=3600)  # 1 hour timeout
+            ], duration=info.get('duration') if info else None,
+                on_progress=on_progress, timeout=3600,  # 1 hour timeout
+                cancel_event=cancel_event, nice=nice)
             
-            # Rename temp to final
-            os.rename(temp_path, output_path)
+            # Rename temp to final (fragmented output is remuxed to faststart first)
+            finalize_output(temp_path, output_path)
             logger.info(f"Transcoding complete: {output_path}")
             return True
             
+        except TranscodeCancelled:
+            logger.info(f"Transcoding stopped: {input_path}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
         except subprocess.TimeoutExpired:
             logger.error(f"Transcoding timed out: {input_path}")
             if os.path.exists(temp_path):
@@ -114,20 +614,20 @@ def transcode_to_h264(input_path, output_path):
         logger.error(f"Lock acquisition failed: {str(e)}");
         return False;
 
-def get_playable_path(original_path):
+def get_playable_path(original_path, profile=DEFAULT_PROFILE):
     """
     Returns path to a browser-playable version of the video.
-    - If already H.264, returns original path
+    - If already H.264 and the source rendition is wanted, returns original path
     - If cached transcode exists, returns cache path
     - Otherwise returns None (caller should trigger transcode)
     """
     if not os.path.exists(original_path):
         return None
     
-    if not needs_transcoding(original_path):
+    if profile == DEFAULT_PROFILE and not needs_transcoding(original_path):
         return original_path
     
-    cache_path = get_cache_path(original_path)
+    cache_path = get_cache_path(original_path, profile)
     if os.path.exists(cache_path):
         return cache_path
     
@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.services import library_indexer
+from src.services.library_indexer import LibraryScanRefused, check_removals, update_library_index
+
+INDEXED = [
+    {'id': 'a', 'path': 'Yoga/sun.mp4', 'category': 'Yoga'},
+    {'id': 'b', 'path': 'Boxing/jab.mp4', 'category': 'Boxing'},
+]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """Point the indexer at an in-memory video index and record rewrites"""
+    written = []
+    monkeypatch.setattr(library_indexer, 'has_video_index', lambda: True)
+    monkeypatch.setattr(library_indexer, 'current_index_file', lambda: 'video_index.json')
+    monkeypatch.setattr(library_indexer, 'load_video_index', lambda path: {'videos': list(INDEXED)})
+    monkeypatch.setattr(library_indexer, 'write_video_index', written.append)
+    return written
+
+
+def test_empty_root_is_refused(tmp_path, index):
+    root = tmp_path / 'library'
+    root.mkdir()
+    state_path = str(tmp_path / 'scan.db')
+
+    with pytest.raises(LibraryScanRefused) as refused:
+        update_library_index(str(root), state_path=state_path)
+
+    assert refused.value.stats == {'videos': 0, 'indexed': 2, 'removed': 2}
+    assert index == []
+    # The scan state isn't advanced either, so the next scan diffs against the same index
+    state = library_indexer.ScanState(state_path)
+    try:
+        assert state.load(str(root)) == {}
+    finally:
+        state.close()
+
+
+def test_empty_root_with_force_clears_index(tmp_path, index):
+    root = tmp_path / 'library'
+    root.mkdir()
+
+    result = update_library_index(str(root), state_path=str(tmp_path / 'scan.db'), force=True)
+
+    assert result['stats']['removed'] == 2
+    assert index == [{'videos': [], 'categories': []}]
+
+
+def test_table_refusal_leaves_index_unchanged(tmp_path, index):
+    root = tmp_path / 'library'
+    for folder, name in [('Yoga', 'sun.mp4'), ('Boxing', 'jab.mp4')]:
+        (root / folder).mkdir(parents=True)
+        (root / folder / name).write_bytes(b'video')
+    state_path = str(tmp_path / 'scan.db')
+
+    from src.models import db, Video
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        # The index matches the disk, but most rows of the table point at files that are gone
+        for path in ['Yoga/sun.mp4', 'Old/a.mp4', 'Old/b.mp4', 'Old/c.mp4']:
+            db.session.add(Video(title=path, filename=os.path.basename(path), file_path=path))
+        db.session.commit()
+
+        with pytest.raises(LibraryScanRefused):
+            update_library_index(str(root), state_path=state_path, sync_db=True)
+
+        assert index == []
+        assert Video.query.count() == 4
+        state = library_indexer.ScanState(state_path)
+        try:
+            assert state.load(str(root)) == {}
+        finally:
+            state.close()
+
+        result = update_library_index(str(root), state_path=state_path, sync_db=True, force=True)
+        assert result['stats']['deleted'] == 3
+        assert sorted(video.file_path for video in Video.query) == ['Boxing/jab.mp4', 'Yoga/sun.mp4']
+
+
+def test_removal_share():
+    check_removals(total=10, removed=5, found=5)
+    with pytest.raises(LibraryScanRefused):
+        check_removals(total=10, removed=6, found=4)
+    check_removals(total=10, removed=6, found=4, force=True)
+    check_removals(total=0, removed=0, found=0)